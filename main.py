@@ -2,6 +2,7 @@ import sys
 import json
 import os
 import logging
+import multiprocessing
 
 # Configura os níveis de logging para bibliotecas externas
 logging.getLogger("PIL").setLevel(logging.WARNING)
@@ -47,6 +48,8 @@ def carregar_configuracoes(path='config.json'):
 
 
 if __name__ == "__main__":
+    # Necessário para o pool de processos da conversão de PDFs no executável do PyInstaller
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
 
     login_window = LoginWindow()
@@ -0,0 +1,76 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger('GabaritoApp.Alinhamento')
+
+# Métodos cujo alinhamento pode ser conferido por verificar_alinhamento
+METODOS_VERIFICAVEIS = ("caracteristicas", "template")
+
+
+class CacheAlinhamento:
+    """
+    Guarda o último alinhamento aceito como hipótese para a página
+    seguinte (do mesmo PDF ou do próximo). Os pontos são guardados
+    normalizados pelo tamanho da página, então a hipótese continua valendo
+    quando o DPI muda entre arquivos.
+    """
+
+    def __init__(self):
+        self._pts_norm = None
+        self._metodo = None
+        self._janelas = None
+        self._reaproveitados = 0
+        self._localizados = 0
+        self._rejeitados = 0
+
+    def hipotese(self, forma):
+        """
+        Retorna a hipótese para uma página de forma (altura, largura), ou
+        None se não houver uma verificável.
+
+        Returns:
+            Dicionário com pts_ref (em pixels da página), metodo e janelas
+        """
+        if self._pts_norm is None or self._metodo not in METODOS_VERIFICAVEIS:
+            return None
+        altura, largura = forma[:2]
+        pts = self._pts_norm * (largura, altura)
+        return {
+            "pts_ref": [(float(x), float(y)) for x, y in pts],
+            "metodo": self._metodo,
+            "janelas": self._janelas,
+        }
+
+    def registrar(self, pts_ref, forma, metodo, janelas=None, reaproveitado=False):
+        """Guarda o alinhamento de uma página como a nova hipótese."""
+        if reaproveitado:
+            self._reaproveitados += 1
+        else:
+            self._localizados += 1
+        if not pts_ref:
+            self.descartar()
+            return
+        altura, largura = forma[:2]
+        self._pts_norm = np.array(pts_ref, dtype=np.float64) / (largura, altura)
+        self._metodo = metodo
+        if not reaproveitado:
+            self._janelas = janelas
+
+    def rejeitar(self):
+        """Registra que a hipótese não valeu para uma página."""
+        self._rejeitados += 1
+
+    def descartar(self):
+        self._pts_norm = None
+        self._metodo = None
+        self._janelas = None
+
+    def estatisticas(self):
+        """Retorna quantas páginas reaproveitaram a hipótese e quantas foram localizadas do zero."""
+        total = self._reaproveitados + self._localizados
+        return {
+            "reaproveitados": self._reaproveitados,
+            "localizados": self._localizados,
+            "rejeitados": self._rejeitados,
+            "taxa_reaproveitamento": self._reaproveitados / total if total else 0.0,
+        }
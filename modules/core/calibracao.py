@@ -0,0 +1,237 @@
+import os
+import json
+import logging
+import argparse
+import cv2
+import numpy as np
+
+from modules.core.detector import imagem_cinza_np, detectar_marcadores, corrigir_perspectiva
+
+logger = logging.getLogger('GabaritoApp.Calibracao')
+
+# Limites para um componente ser considerado o contorno de uma bolha
+PROPORCAO_MIN_BOLHA = 0.75
+PROPORCAO_MAX_BOLHA = 1.33
+PREENCHIMENTO_MAX_BOLHA = 0.6
+TOLERANCIA_TAMANHO_BOLHA = 0.25
+
+
+def _agrupar_1d(valores, tolerancia):
+    """Agrupa valores ordenados cuja distância ao anterior não passa da tolerância."""
+    ordem = np.argsort(valores)
+    grupos = []
+    atual = [ordem[0]]
+    for anterior, i in zip(ordem[:-1], ordem[1:]):
+        if valores[i] - valores[anterior] > tolerancia:
+            grupos.append(atual)
+            atual = []
+        atual.append(i)
+    grupos.append(atual)
+    return grupos
+
+
+def detectar_bolhas(imagem):
+    """
+    Localiza os contornos das bolhas em um gabarito em branco.
+
+    Returns:
+        Array (n x 4) com x, y, largura e altura de cada bolha
+    """
+    img_gray = imagem_cinza_np(imagem)
+    _, img_bin = cv2.threshold(img_gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    n, _, stats, _ = cv2.connectedComponentsWithStats(img_bin, connectivity=8)
+    componentes = stats[1:]
+    x, y, w, h, area = componentes.T
+    proporcao = w / np.maximum(h, 1)
+    preenchimento = area / np.maximum(w * h, 1)
+    candidatas = componentes[
+        (proporcao >= PROPORCAO_MIN_BOLHA) & (proporcao <= PROPORCAO_MAX_BOLHA)
+        & (preenchimento <= PREENCHIMENTO_MAX_BOLHA) & (w >= 8) & (h >= 8)
+    ][:, :4]
+    if not len(candidatas):
+        return candidatas
+
+    # Contornos que envolvem outro componente (a letra da alternativa)
+    # distinguem as bolhas de letras redondas do texto impresso
+    x0, y0 = candidatas[:, 0], candidatas[:, 1]
+    x1, y1 = x0 + candidatas[:, 2], y0 + candidatas[:, 3]
+    envolve = (
+        (x[None, :] > x0[:, None]) & (y[None, :] > y0[:, None])
+        & ((x + w)[None, :] < x1[:, None]) & ((y + h)[None, :] < y1[:, None])
+    ).any(axis=1)
+    if envolve.any():
+        candidatas = candidatas[envolve]
+
+    # As bolhas formam o maior grupo de componentes de mesmo tamanho
+    tamanho = np.median(candidatas[:, 2:], axis=0)
+    desvio = np.abs(candidatas[:, 2:] / tamanho - 1).max(axis=1)
+    return candidatas[desvio <= TOLERANCIA_TAMANHO_BOLHA]
+
+
+def _maior_sequencia_regular(centros, passo):
+    """Maior sequência de linhas consecutivas com espaçamento próximo de passo."""
+    melhor = (0, 1)
+    inicio = 0
+    for i in range(1, len(centros)):
+        if abs(centros[i] - centros[i - 1] - passo) > passo * 0.35:
+            inicio = i
+        if i + 1 - inicio > melhor[1] - melhor[0]:
+            melhor = (inicio, i + 1)
+    return melhor
+
+
+def calibrar_layout(imagem, num_alternativas=None, referencia="template"):
+    """
+    Deriva um layout paramétrico a partir de um gabarito em branco.
+
+    As bolhas são agrupadas em colunas (pela posição x) e as colunas em
+    blocos de questões (separados por um espaçamento maior). Em cada bloco,
+    as linhas completas com espaçamento regular definem a origem, o passo
+    entre linhas, o passo entre alternativas e o tamanho da bolha.
+
+    Args:
+        imagem: Gabarito em branco (PIL ou array NumPy)
+        num_alternativas: Alternativas por questão; se None, usa o número de
+            colunas do primeiro bloco
+        referencia: "template" se a imagem é o recorte usado no alinhamento
+            (o layout passa a valer para a área corrigida), "marcadores" se é
+            o quadro dos marcadores fiduciais (idem, para páginas alinhadas
+            pelos marcadores) ou "pagina" se é a página inteira
+
+    Returns:
+        Dicionário com largura, altura, referencia, alternativas e blocos
+        (origem, passo_linha, passo_coluna, bolha, linhas)
+    """
+    altura, largura = imagem_cinza_np(imagem).shape
+    bolhas = detectar_bolhas(imagem)
+    if len(bolhas) < 4:
+        raise ValueError("Nenhuma grade de bolhas encontrada na imagem")
+    bw, bh = np.median(bolhas[:, 2:], axis=0)
+    cx = bolhas[:, 0] + bolhas[:, 2] / 2
+    cy = bolhas[:, 1] + bolhas[:, 3] / 2
+
+    colunas = [g for g in _agrupar_1d(cx, bw / 2) if len(g) >= 2]
+    colunas.sort(key=lambda g: cx[g].mean())
+    centros_colunas = np.array([cx[g].mean() for g in colunas])
+    intervalos = np.diff(centros_colunas)
+    separa = intervalos > np.median(intervalos) * 1.5 if len(intervalos) else np.array([], dtype=bool)
+    blocos_colunas = [[colunas[0]]]
+    for coluna, nova in zip(colunas[1:], separa):
+        if nova:
+            blocos_colunas.append([])
+        blocos_colunas[-1].append(coluna)
+
+    if num_alternativas is None:
+        num_alternativas = len(blocos_colunas[0])
+
+    blocos = []
+    for cols in blocos_colunas:
+        if len(cols) % num_alternativas:
+            logger.warning(f"Bloco com {len(cols)} colunas ignorado (esperado múltiplo de {num_alternativas})")
+            continue
+        for k in range(0, len(cols), num_alternativas):
+            grupo = cols[k:k + num_alternativas]
+            indices = np.concatenate(grupo)
+            coluna_de = {int(i): c for c, g in enumerate(grupo) for i in g}
+            linhas = [
+                linha for linha in (indices[g] for g in _agrupar_1d(cy[indices], bh / 2))
+                if len({coluna_de[int(i)] for i in linha}) == num_alternativas
+            ]
+            if len(linhas) < 2:
+                continue
+            linhas.sort(key=lambda linha: cy[linha].mean())
+            centros_linhas = np.array([cy[linha].mean() for linha in linhas])
+            passo_linha = float(np.median(np.diff(centros_linhas)))
+            ini, fim = _maior_sequencia_regular(centros_linhas, passo_linha)
+            linhas = linhas[ini:fim]
+            centros_linhas = centros_linhas[ini:fim]
+            if len(linhas) < 2:
+                continue
+            passo_linha = float((centros_linhas[-1] - centros_linhas[0]) / (len(linhas) - 1))
+            centros_cols = np.array([cx[g].mean() for g in grupo])
+            passo_coluna = float((centros_cols[-1] - centros_cols[0]) / (num_alternativas - 1)) if num_alternativas > 1 else float(bw)
+
+            previstos = centros_linhas[0] + passo_linha * np.arange(len(linhas))
+            erro = float(np.abs(centros_linhas - previstos).max())
+            if erro > bh / 4:
+                logger.warning(f"Linhas irregulares no bloco em x={centros_cols[0]:.0f}: erro máximo {erro:.1f}px")
+
+            blocos.append({
+                "origem": [round(float(centros_cols[0] - bw / 2), 1), round(float(centros_linhas[0] - bh / 2), 1)],
+                "passo_linha": round(passo_linha, 2),
+                "passo_coluna": round(passo_coluna, 2),
+                "bolha": [round(float(bw), 1), round(float(bh), 1)],
+                "linhas": len(linhas),
+            })
+
+    if not blocos:
+        raise ValueError("Nenhum bloco de questões regular encontrado na imagem")
+    blocos.sort(key=lambda b: (b["origem"][0], b["origem"][1]))
+    logger.info(
+        f"Layout calibrado: {sum(b['linhas'] for b in blocos)} questões em {len(blocos)} blocos, "
+        f"{num_alternativas} alternativas"
+    )
+    return {
+        "largura": largura,
+        "altura": altura,
+        "referencia": referencia,
+        "alternativas": num_alternativas,
+        "blocos": blocos,
+    }
+
+
+def _carregar_imagem(caminho, dpi):
+    from modules.core.converter import iterar_paginas_arquivo, eh_pdf
+    pdf = eh_pdf(caminho)
+    # Templates são lidos na resolução do arquivo: é nela que o alinhamento os usa
+    _, img = next(iterar_paginas_arquivo(
+        caminho, dpi=dpi, paginas=[0], pre_processar=False, formato="numpy", resolucao_nativa=not pdf
+    ))
+    if not pdf:
+        return img, "template"
+    # Uma folha com marcadores fiduciais é alinhada como na leitura. O
+    # quadro dos marcadores é mantido no tamanho natural (sem distorcer as
+    # bolhas); obter_layout o escala para a área corrigida. Não é o quadro
+    # do template: o layout vale só para páginas alinhadas pelos marcadores
+    pts_ref = detectar_marcadores(img)
+    if pts_ref is None:
+        return img, "pagina"
+    pts = np.array(pts_ref)
+    largura = int(round((np.linalg.norm(pts[1] - pts[0]) + np.linalg.norm(pts[2] - pts[3])) / 2))
+    altura = int(round((np.linalg.norm(pts[3] - pts[0]) + np.linalg.norm(pts[2] - pts[1])) / 2))
+    logger.info(f"Marcadores fiduciais encontrados; calibrando no quadro dos marcadores ({largura}x{altura})")
+    return corrigir_perspectiva(img, pts_ref, largura, altura), "marcadores"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Calibra um layout paramétrico a partir de um gabarito em branco "
+                    "(template_gabarito_*.png ou modelo_gabarito_base.pdf)."
+    )
+    parser.add_argument("arquivo", help="Imagem do template ou PDF do modelo")
+    parser.add_argument("--alternativas", type=int, default=None)
+    parser.add_argument("--dpi", type=int, default=300, help="Resolução de renderização de PDFs")
+    parser.add_argument("--referencia", choices=["template", "marcadores", "pagina"], default=None)
+    parser.add_argument("--questoes", default=None, help="Chave do layout (número de questões)")
+    parser.add_argument("--gravar", metavar="CONFIG", default=None,
+                        help="Grava o layout no config.json indicado (em layouts_marcadores se "
+                             "calibrado no quadro dos marcadores, senão em layouts_parametricos)")
+    args = parser.parse_args(argv)
+
+    img, referencia = _carregar_imagem(args.arquivo, args.dpi)
+    layout = calibrar_layout(img, args.alternativas, args.referencia or referencia)
+    chave = args.questoes or str(sum(b["linhas"] for b in layout["blocos"]))
+
+    if args.gravar:
+        from modules.utils import carregar_configuracoes, salvar_configuracoes
+        config = carregar_configuracoes(args.gravar)
+        secao = "layouts_marcadores" if layout["referencia"] == "marcadores" else "layouts_parametricos"
+        config.setdefault(secao, {})[chave] = layout
+        salvar_configuracoes(args.gravar, config)
+        print(f"Layout '{chave}' gravado em {secao} de {os.path.abspath(args.gravar)}")
+    else:
+        print(json.dumps({chave: layout}, indent=4, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
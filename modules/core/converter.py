@@ -1,44 +1,453 @@
 import io
+import os
+import math
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import fitz  # PyMuPDF
 import numpy as np
 import cv2
 from PIL import Image, ImageEnhance
-from pytesseract import image_to_string
-from pytesseract import Output
 
+from modules.core.page_cache import hash_arquivo
+from modules.core.pdf_inspector import pagina_escaneada
 
+# Identificam o pré-processamento aplicado nas chaves do cache de páginas
+RECEITA_BINARIZADA = "contraste1.5+mediana3+otsu"
+RECEITA_CINZA = "cinza"
 
+EXTENSOES_IMAGEM = (".tif", ".tiff", ".jpg", ".jpeg", ".png")
+# Resolução assumida para scans sem DPI nos metadados
+DPI_SCAN_PADRAO = 300
 
-def converter_pdf_em_imagens(pdf_path, dpi=300):
+# Fatores de redução com decodificação direta (DCT) do libjpeg via OpenCV
+FLAGS_REDUCAO_JPEG = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+
+
+def contar_paginas_pdf(pdf_path):
     """
-    Converte um PDF em uma lista de imagens PIL de alta qualidade.
-    Aplica filtros de contraste, binarização e remoção de ruído.
+    Retorna o número de páginas do PDF sem rasterizar nenhuma delas.
     """
-    imagens = []
+    with fitz.open(pdf_path) as pdf_document:
+        return len(pdf_document)
+
 
-    # Abrir PDF com PyMuPDF
-    pdf_document = fitz.open(pdf_path)
+def renderizar_pagina_cinza(page, dpi):
+    """
+    Renderiza uma página do PDF diretamente no espaço de cor cinza (1 canal),
+    sem passar por PNG.
+    """
     zoom = dpi / 72  # PyMuPDF usa 72dpi como base
     mat = fitz.Matrix(zoom, zoom)
+    return page.get_pixmap(matrix=mat, colorspace=fitz.csGRAY, alpha=False)
+
+
+def pixmap_para_numpy(pix):
+    """
+    Envolve as amostras de um pixmap em escala de cinza como um array NumPy
+    (altura x largura) sem cópia.
+
+    A view só é válida enquanto o pixmap existir; copie-a se precisar
+    mantê-la depois de descartar o pixmap.
+    """
+    buffer = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+    return buffer.reshape(pix.height, pix.stride)[:, :pix.width * pix.n]
+
+
+def _decodificar_imagem_xref(pdf_document, xref, filtro, colorspace, reducao=1):
+    """
+    Decodifica uma imagem embutida direto em cinza. JPEGs são lidos pelo
+    OpenCV, que decodifica só a luminância e já na escala reduzida; os
+    demais formatos (CCITT, JBIG2, Flate...) passam pelo decodificador do MuPDF.
+    """
+    if filtro == "DCTDecode" and colorspace in ("DeviceGray", "DeviceRGB", "ICCBased"):
+        dados = np.frombuffer(pdf_document.xref_stream_raw(xref), dtype=np.uint8)
+        # O PDF desenha o JPEG sem aplicar a orientação EXIF
+        img_np = cv2.imdecode(dados, FLAGS_REDUCAO_JPEG[reducao] | cv2.IMREAD_IGNORE_ORIENTATION)
+        if img_np is not None:
+            return img_np
+
+    pix = fitz.Pixmap(pdf_document, xref)
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    if pix.n != 1:
+        pix = fitz.Pixmap(fitz.csGRAY, pix)
+    if reducao > 1:
+        pix.shrink(int(math.log2(reducao)))
+    return pixmap_para_numpy(pix).copy()
+
+
+def extrair_scan_embutido(page, dpi=None):
+    """
+    Se a página for um scan de copiadora (uma única imagem, sem rotação nem
+    máscara, cobrindo a página e sem conteúdo vetorial por cima), decodifica
+    a imagem embutida em vez de rasterizar a página. Se a imagem não cobre
+    a página inteira, é colada na sua posição sobre uma página branca, como
+    a renderização faria.
+
+    Args:
+        page: Página do fitz
+        dpi: Resolução desejada; a decodificação é reduzida (2x, 4x, 8x) quando
+            o scan tem resolução bem maior e o resultado é ajustado ao tamanho
+            que a renderização teria. None mantém a resolução nativa do scan.
+
+    Returns:
+        Array uint8 em escala de cinza, ou None se a página não for um scan
+        simples (e deve ser renderizada)
+    """
+    if page.rotation or not pagina_escaneada(page):
+        return None
+    xref, smask, largura, altura, _, colorspace, _, _, filtro, _ = page.get_images(full=True)[0]
+    if smask or not colorspace:
+        return None
+    info = page.get_image_info()[0]
+    a, b, c, d, _, _ = info["transform"]
+    if b or c or a <= 0 or d <= 0:
+        return None
+
+    # Quadro da página e da imagem nele, em pixels; sem dpi, na escala nativa do scan
+    bbox = fitz.Rect(info["bbox"])
+    zoom = dpi / 72 if dpi is not None else largura / bbox.width
+    alvo = (page.rect * fitz.Matrix(zoom, zoom)).irect
+    caixa = (bbox * fitz.Matrix(zoom, zoom)).round()
+    pagina_inteira = all(abs(u - v) <= 1 for u, v in zip(caixa, alvo))
+    if pagina_inteira:
+        caixa = alvo
+
+    reducao = 1
+    if dpi is not None:
+        while reducao < 8 and largura // (reducao * 2) >= caixa.width and altura // (reducao * 2) >= caixa.height:
+            reducao *= 2
 
-    for page_num in range(len(pdf_document)):
-        page = pdf_document[page_num]
+    if reducao > 1 and filtro != "DCTDecode":
+        # Sem decodificação reduzida fora do JPEG: o rasterizador já subamostra durante a decodificação
+        return None
 
-        # Renderizar página como imagem
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        img_data = pix.tobytes("png")
-        pil_img = Image.open(io.BytesIO(img_data)).convert("L")  # escala de cinza
+    img_np = _decodificar_imagem_xref(page.parent, xref, filtro, colorspace, reducao)
+    if img_np is None:
+        return None
 
+    if (dpi is not None or not pagina_inteira) and img_np.shape != (caixa.height, caixa.width):
+        interpolacao = cv2.INTER_AREA if img_np.shape[1] > caixa.width else cv2.INTER_LINEAR
+        img_np = cv2.resize(img_np, (caixa.width, caixa.height), interpolation=interpolacao)
+    if pagina_inteira:
+        return img_np
+
+    pagina = np.full((alvo.height, alvo.width), 255, dtype=np.uint8)
+    visivel = caixa & alvo
+    if not visivel.is_empty:
+        pagina[visivel.y0:visivel.y1, visivel.x0:visivel.x1] = img_np[
+            visivel.y0 - caixa.y0:visivel.y1 - caixa.y0, visivel.x0 - caixa.x0:visivel.x1 - caixa.x0
+        ]
+    return pagina
+
+
+def _renderizar_pagina_np(page, dpi, pre_processar=True, extrair_embutidas=True, resolucao_nativa=False):
+    """
+    Obtém a página em cinza (decodificando o scan embutido quando possível,
+    senão rasterizando) e aplica (opcionalmente) contraste, mediana e Otsu,
+    devolvendo um array uint8 que não depende mais do pixmap.
+    """
+    img_np = None
+    if extrair_embutidas:
+        img_np = extrair_scan_embutido(page, None if resolucao_nativa else dpi)
+
+    pix = None
+    if img_np is None:
+        # Renderizar página direto em cinza e ler as amostras sem cópia
+        pix = renderizar_pagina_cinza(page, dpi)
+        img_np = pixmap_para_numpy(pix)
+
+    if pre_processar:
         # Melhorar contraste
-        pil_img = ajustar_contraste(pil_img)
+        img_np = ajustar_contraste_np(img_np)
 
         # Remover ruído e binarizar
-        pil_img = remover_ruido_e_binarizar(pil_img)
+        return remover_ruido_e_binarizar_np(img_np)
+    return img_np.copy() if pix is not None else img_np
 
-        imagens.append(pil_img)
 
-    pdf_document.close()
-    return imagens
+def _receita(pre_processar, resolucao_nativa=False, extrair_embutidas=True):
+    receita = RECEITA_BINARIZADA if pre_processar else RECEITA_CINZA
+    if extrair_embutidas:
+        receita += "+embutida"
+    return receita + "+nativa" if resolucao_nativa else receita
+
+
+def _formatar_saida(img_np, formato):
+    if formato == "numpy":
+        return img_np
+    return Image.fromarray(img_np)
+
+
+def iterar_paginas_pdf(pdf_path, dpi=300, paginas=None, dpi_por_pagina=None, pre_processar=True, formato="pil",
+                       cache=None, extrair_embutidas=True, resolucao_nativa=False):
+    """
+    Gera as páginas de um PDF uma a uma, como tuplas (indice, imagem).
+
+    Apenas a página corrente fica em memória, então o consumo é limitado
+    a poucas páginas independentemente do tamanho do documento.
+
+    Args:
+        pdf_path: Caminho do PDF
+        dpi: Resolução padrão de renderização
+        paginas: Índices (base 0) das páginas a gerar; None gera todas
+        dpi_por_pagina: Dicionário {indice: dpi} que sobrescreve o DPI padrão
+        pre_processar: Se True, aplica contraste, mediana e binarização Otsu
+        formato: "pil" para imagens PIL ou "numpy" para arrays uint8 (altura x largura)
+        cache: CachePaginas opcional; páginas já renderizadas são lidas dele
+        extrair_embutidas: Se True, páginas que são um único scan embutido são
+            decodificadas diretamente em vez de rasterizadas
+        resolucao_nativa: Se True, esses scans saem na resolução original,
+            sem reamostragem, em vez de no tamanho correspondente ao DPI
+
+    Yields:
+        Tupla (indice da página, imagem em escala de cinza)
+    """
+    dpi_por_pagina = dpi_por_pagina or {}
+    receita = _receita(pre_processar, resolucao_nativa, extrair_embutidas)
+    hash_pdf = hash_arquivo(pdf_path) if cache else None
+
+    with fitz.open(pdf_path) as pdf_document:
+        total = len(pdf_document)
+        indices = range(total) if paginas is None else paginas
+
+        for page_num in indices:
+            if page_num < 0 or page_num >= total:
+                continue
+            page_dpi = dpi_por_pagina.get(page_num, dpi)
+            img_np = cache.obter(hash_pdf, page_num, page_dpi, receita) if cache else None
+            if img_np is None:
+                img_np = _renderizar_pagina_np(
+                    pdf_document[page_num], page_dpi, pre_processar, extrair_embutidas, resolucao_nativa
+                )
+                if cache:
+                    cache.gravar(hash_pdf, page_num, page_dpi, receita, img_np, binaria=pre_processar)
+            yield page_num, _formatar_saida(img_np, formato)
+
+
+def _renderizar_bloco(pdf_path, tarefas, pre_processar, extrair_embutidas=True, resolucao_nativa=False):
+    """
+    Executado nos processos auxiliares: abre seu próprio handle do PDF e
+    renderiza as páginas do bloco, na ordem recebida.
+    """
+    resultados = []
+    with fitz.open(pdf_path) as pdf_document:
+        for page_num, dpi in tarefas:
+            img_np = _renderizar_pagina_np(
+                pdf_document[page_num], dpi, pre_processar, extrair_embutidas, resolucao_nativa
+            )
+            resultados.append((page_num, img_np))
+    return resultados
+
+
+def iterar_paginas_pdf_paralelo(pdf_path, dpi=300, paginas=None, dpi_por_pagina=None, pre_processar=True,
+                                formato="pil", n_workers=None, paginas_por_tarefa=4, cache=None,
+                                extrair_embutidas=True, resolucao_nativa=False):
+    """
+    Versão paralela de iterar_paginas_pdf: divide as páginas em blocos
+    renderizados (com contraste, mediana e Otsu) em processos separados e
+    devolve os resultados na ordem das páginas, à medida que ficam prontos.
+
+    No máximo 2 blocos por processo ficam em andamento, então a memória
+    continua limitada mesmo em documentos grandes.
+
+    Args:
+        pdf_path: Caminho do PDF
+        dpi: Resolução padrão de renderização
+        paginas: Índices (base 0) das páginas a gerar; None gera todas
+        dpi_por_pagina: Dicionário {indice: dpi} que sobrescreve o DPI padrão
+        pre_processar: Se True, aplica contraste, mediana e binarização Otsu
+        formato: "pil" para imagens PIL ou "numpy" para arrays uint8
+        n_workers: Número de processos; None ou 0 usa todos os núcleos
+        paginas_por_tarefa: Quantidade de páginas enviada a cada processo por vez
+        cache: CachePaginas opcional; só as páginas ausentes dele são renderizadas
+        extrair_embutidas: Se True, decodifica direto as páginas que são um único scan
+        resolucao_nativa: Se True, esses scans saem na resolução original
+
+    Yields:
+        Tupla (indice da página, imagem em escala de cinza)
+    """
+    dpi_por_pagina = dpi_por_pagina or {}
+    n_workers = n_workers or os.cpu_count() or 1
+
+    total = contar_paginas_pdf(pdf_path)
+    indices = range(total) if paginas is None else paginas
+    tarefas = [(n, dpi_por_pagina.get(n, dpi)) for n in indices if 0 <= n < total]
+
+    receita = _receita(pre_processar, resolucao_nativa, extrair_embutidas)
+    hash_pdf = hash_arquivo(pdf_path) if cache else None
+    em_cache = set()
+    if cache:
+        em_cache = {n for n, page_dpi in tarefas if cache.contem(hash_pdf, n, page_dpi, receita)}
+    faltantes = [t for t in tarefas if t[0] not in em_cache]
+
+    if n_workers <= 1 or len(faltantes) <= paginas_por_tarefa:
+        yield from iterar_paginas_pdf(pdf_path, dpi, [n for n, _ in tarefas], dpi_por_pagina, pre_processar, formato,
+                                      cache, extrair_embutidas, resolucao_nativa)
+        return
+
+    blocos = [faltantes[i:i + paginas_por_tarefa] for i in range(0, len(faltantes), paginas_por_tarefa)]
+    n_workers = min(n_workers, len(blocos))
+
+    executor = ProcessPoolExecutor(max_workers=n_workers)
+    try:
+        pendentes = deque()
+        prontas = {}
+        proximo = 0
+        for page_num, page_dpi in tarefas:
+            if page_num in em_cache:
+                img_np = cache.obter(hash_pdf, page_num, page_dpi, receita)
+                if img_np is None:
+                    # Removida do cache depois da consulta inicial: renderiza aqui mesmo
+                    img_np = _renderizar_bloco(
+                        pdf_path, [(page_num, page_dpi)], pre_processar, extrair_embutidas, resolucao_nativa
+                    )[0][1]
+                yield page_num, _formatar_saida(img_np, formato)
+                continue
+            while page_num not in prontas:
+                while proximo < len(blocos) and len(pendentes) < 2 * n_workers:
+                    pendentes.append(executor.submit(
+                        _renderizar_bloco, pdf_path, blocos[proximo], pre_processar, extrair_embutidas, resolucao_nativa
+                    ))
+                    proximo += 1
+                prontas.update(pendentes.popleft().result())
+            img_np = prontas.pop(page_num)
+            if cache:
+                cache.gravar(hash_pdf, page_num, page_dpi, receita, img_np, binaria=pre_processar)
+            yield page_num, _formatar_saida(img_np, formato)
+    finally:
+        # Se o consumidor parar antes do fim, descarta os blocos ainda não iniciados
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def eh_pdf(caminho):
+    return os.path.isfile(caminho) and caminho.lower().endswith(".pdf")
+
+
+def listar_imagens_pasta(pasta):
+    """Retorna os scans (JPEG/PNG/TIFF) de uma pasta em ordem alfabética."""
+    return sorted(
+        os.path.join(pasta, nome) for nome in os.listdir(pasta)
+        if nome.lower().endswith(EXTENSOES_IMAGEM) and os.path.isfile(os.path.join(pasta, nome))
+    )
+
+
+def paginas_imagem(caminho):
+    """
+    Lista as páginas de um arquivo de imagem ou pasta de scans como tuplas
+    (arquivo, quadro, largura, altura, dpi), lendo apenas os cabeçalhos.
+    """
+    arquivos = listar_imagens_pasta(caminho) if os.path.isdir(caminho) else [caminho]
+    paginas = []
+    for arquivo in arquivos:
+        with Image.open(arquivo) as img:
+            dpi_scan = img.info.get("dpi", (DPI_SCAN_PADRAO,))[0] or DPI_SCAN_PADRAO
+            for quadro in range(getattr(img, "n_frames", 1)):
+                if quadro:
+                    img.seek(quadro)
+                paginas.append((arquivo, quadro, img.size[0], img.size[1], float(dpi_scan)))
+    return paginas
+
+
+def _ler_pagina_imagem(arquivo, quadro, largura, altura, dpi_scan, dpi):
+    """
+    Decodifica uma página de scan direto em escala de cinza, no tamanho
+    correspondente ao DPI pedido (ou nativo se dpi for None).
+
+    JPEG e PNG são lidos pelo OpenCV nos modos reduzidos (2x, 4x, 8x) quando
+    o scan tem resolução bem maior que a desejada; quadros de TIFF
+    multipágina são lidos um a um pelo Pillow.
+    """
+    if dpi is None:
+        alvo = (largura, altura)
+    else:
+        alvo = (max(1, round(largura * dpi / dpi_scan)), max(1, round(altura * dpi / dpi_scan)))
+
+    img_np = None
+    if not arquivo.lower().endswith((".tif", ".tiff")):
+        reducao = 1
+        while reducao < 8 and largura // (reducao * 2) >= alvo[0] and altura // (reducao * 2) >= alvo[1]:
+            reducao *= 2
+        # alvo vem do tamanho do cabeçalho, sem a orientação EXIF (que o
+        # Pillow também não aplica); páginas de lado são giradas depois
+        img_np = cv2.imread(arquivo, FLAGS_REDUCAO_JPEG[reducao] | cv2.IMREAD_IGNORE_ORIENTATION)
+
+    if img_np is None:
+        with Image.open(arquivo) as img:
+            img.seek(quadro)
+            img_np = np.array(img.convert("L"))
+
+    if img_np.shape[:2] != (alvo[1], alvo[0]):
+        interpolacao = cv2.INTER_AREA if img_np.shape[1] > alvo[0] else cv2.INTER_LINEAR
+        img_np = cv2.resize(img_np, alvo, interpolation=interpolacao)
+    return img_np
+
+
+def iterar_paginas_imagem(caminho, dpi=300, paginas=None, pre_processar=True, formato="pil", resolucao_nativa=False):
+    """
+    Gera as páginas de um TIFF multipágina, de uma imagem JPEG/PNG ou de
+    uma pasta de scans, uma a uma, sem passar por PDF.
+
+    Args:
+        caminho: Arquivo de imagem ou pasta com scans (ordem alfabética)
+        dpi: Resolução desejada; o DPI do scan vem dos metadados (ou DPI_SCAN_PADRAO)
+        paginas: Índices (base 0) das páginas a gerar; None gera todas
+        pre_processar: Se True, aplica contraste, mediana e binarização Otsu
+        formato: "pil" para imagens PIL ou "numpy" para arrays uint8
+        resolucao_nativa: Se True, mantém a resolução original do scan
+
+    Yields:
+        Tupla (indice da página, imagem em escala de cinza)
+    """
+    todas = paginas_imagem(caminho)
+    indices = range(len(todas)) if paginas is None else paginas
+    for page_num in indices:
+        if page_num < 0 or page_num >= len(todas):
+            continue
+        img_np = _ler_pagina_imagem(*todas[page_num], None if resolucao_nativa else dpi)
+        if pre_processar:
+            img_np = remover_ruido_e_binarizar_np(ajustar_contraste_np(img_np))
+        yield page_num, _formatar_saida(img_np, formato)
+
+
+def contar_paginas_arquivo(caminho):
+    """Número de páginas de um PDF, imagem, TIFF multipágina ou pasta de scans."""
+    if eh_pdf(caminho):
+        return contar_paginas_pdf(caminho)
+    return len(paginas_imagem(caminho))
+
+
+def iterar_paginas_arquivo(caminho, dpi=300, paginas=None, pre_processar=True, formato="pil", paralelo=False, **kwargs):
+    """
+    Ponto de entrada único para gerar páginas de qualquer entrada aceita:
+    PDFs vão para iterar_paginas_pdf (ou a versão paralela, com paralelo=True)
+    e imagens/pastas para iterar_paginas_imagem. Argumentos extras são
+    repassados ao iterador de PDF.
+    """
+    if eh_pdf(caminho):
+        iterador = iterar_paginas_pdf_paralelo if paralelo else iterar_paginas_pdf
+        yield from iterador(caminho, dpi=dpi, paginas=paginas, pre_processar=pre_processar, formato=formato, **kwargs)
+    else:
+        yield from iterar_paginas_imagem(
+            caminho, dpi, paginas, pre_processar, formato, kwargs.get("resolucao_nativa", False)
+        )
+
+
+def converter_pdf_em_imagens(pdf_path, dpi=300):
+    """
+    Converte um PDF em uma lista de imagens PIL de alta qualidade.
+    Aplica filtros de contraste, binarização e remoção de ruído.
+
+    Mantém todas as páginas em memória; para documentos grandes prefira
+    iterar_paginas_pdf.
+    """
+    return [pil_img for _, pil_img in iterar_paginas_pdf(pdf_path, dpi=dpi)]
 
 
 def ajustar_contraste(pil_img, fator=1.5):
@@ -59,3 +468,21 @@ def remover_ruido_e_binarizar(pil_img):
     # Binarização Otsu
     _, img_bin = cv2.threshold(img_np, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
     return Image.fromarray(img_bin)
+
+
+def ajustar_contraste_np(img_np, fator=1.5):
+    """
+    Equivalente a ajustar_contraste para arrays em escala de cinza:
+    afasta cada pixel da média da imagem pelo fator informado.
+    """
+    media = int(img_np.mean() + 0.5)
+    return cv2.addWeighted(img_np, fator, img_np, 0, (1 - fator) * media)
+
+
+def remover_ruido_e_binarizar_np(img_np):
+    """
+    Equivalente a remover_ruido_e_binarizar para arrays em escala de cinza.
+    """
+    img_np = cv2.medianBlur(img_np, 3)
+    _, img_bin = cv2.threshold(img_np, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return img_bin
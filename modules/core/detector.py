@@ -1,11 +1,28 @@
+import itertools
 import cv2
 import numpy as np
 from PIL import Image, ImageDraw
 import os
 import logging
 
+from modules.core.template_registry import (
+    TAMANHO_TEMPLATE_GROSSO,
+    LARGURA_CLASSIFICACAO,
+    extrair_caracteristicas,
+    janelas_verificacao
+)
+from modules.core.layout import ROI_OK, ROI_INVALIDO, ROI_FORA, compilar_layout, caixas_na_pagina
+
 logger = logging.getLogger('GabaritoApp.Detector')
 
+def imagem_cinza_np(imagem):
+    """Retorna a imagem (PIL ou array NumPy) como array uint8 em escala de cinza, sem cópia se já for."""
+    if isinstance(imagem, np.ndarray):
+        if imagem.ndim == 2:
+            return imagem
+        return cv2.cvtColor(imagem, cv2.COLOR_RGB2GRAY)
+    return np.array(imagem.convert("L"))
+
 def corrigir_perspectiva(imagem_np, pts_ref, largura_dest, altura_dest):
     pts_ref = np.array(pts_ref, dtype="float32")
     pts_dest = np.array([
@@ -18,19 +35,149 @@ def corrigir_perspectiva(imagem_np, pts_ref, largura_dest, altura_dest):
     imagem_corrigida = cv2.warpPerspective(imagem_np, M, (largura_dest, altura_dest))
     return imagem_corrigida
 
+def corrigir_perspectiva_regiao(imagem_np, pts_ref, largura_dest, altura_dest, regiao):
+    """
+    Como corrigir_perspectiva, mas gera só o retângulo regiao = (x0, y0, x1, y1)
+    do quadro corrigido: a homografia é composta com a translação da região,
+    então apenas esses pixels são amostrados da página.
+    """
+    x0, y0, x1, y1 = regiao
+    pts_ref = np.array(pts_ref, dtype="float32")
+    pts_dest = np.array([
+        [0, 0],
+        [largura_dest - 1, 0],
+        [largura_dest - 1, altura_dest - 1],
+        [0, altura_dest - 1]
+    ], dtype="float32")
+    M = cv2.getPerspectiveTransform(pts_ref, pts_dest)
+    T = np.array([[1, 0, -x0], [0, 1, -y0], [0, 0, 1]], dtype=np.float64)
+    return cv2.warpPerspective(imagem_np, T @ M, (x1 - x0, y1 - y0))
+
+# Marcadores fiduciais: quadrados sólidos impressos nos cantos da área do gabarito
+LADO_BUSCA_MARCADORES = 1000
+PREENCHIMENTO_MIN_MARCADOR = 0.8
+# Menor lado de um marcador, como fração do maior lado da página
+LADO_MIN_MARCADOR = 0.01
+# Candidatos mais sólidos considerados na montagem do quadrilátero
+MAX_CANDIDATOS_MARCADORES = 12
+AREA_MIN_QUADRO_MARCADORES = 0.1
+
+def _quadrilatero_regular(quad, tolerancia=0.25):
+    if not cv2.isContourConvex(quad.astype(np.float32)):
+        return False
+    lados = np.linalg.norm(quad - np.roll(quad, -1, axis=0), axis=1)
+    diagonais = np.linalg.norm(quad[:2] - quad[2:], axis=1)
+    if lados.min() <= 0:
+        return False
+    # Lados opostos e diagonais de mesmo comprimento: um retângulo visto com
+    # pouca perspectiva
+    return (abs(lados[0] / lados[2] - 1) <= tolerancia and abs(lados[1] / lados[3] - 1) <= tolerancia
+            and abs(diagonais[0] / diagonais[1] - 1) <= tolerancia)
+
+def detectar_marcadores(imagem, lado_busca=LADO_BUSCA_MARCADORES):
+    """
+    Localiza os quatro marcadores fiduciais (quadrados sólidos estampados
+    por pdf_filler) com uma única binarização e uma passada de componentes
+    conexos sobre uma cópia reduzida da página. O centro de cada marcador é
+    refinado na resolução cheia.
+
+    Args:
+        imagem: Página (PIL ou array NumPy)
+        lado_busca: Maior lado da cópia reduzida usada na busca
+
+    Returns:
+        Lista com os centros (superior esquerdo, superior direito, inferior
+        direito, inferior esquerdo), no formato de pts_ref, ou None se a
+        página não tiver os marcadores
+    """
+    img_gray = imagem_cinza_np(imagem)
+    altura, largura = img_gray.shape
+    fator = min(1.0, lado_busca / max(altura, largura))
+    if fator < 1.0:
+        img_busca = cv2.resize(img_gray, None, fx=fator, fy=fator, interpolation=cv2.INTER_AREA)
+    else:
+        img_busca = img_gray
+    limiar, img_bin = cv2.threshold(img_busca, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    _, rotulos, stats, centros = cv2.connectedComponentsWithStats(img_bin, connectivity=8)
+    x, y, w, h, area = stats.T
+    candidatos = np.flatnonzero(
+        (area / np.maximum(w * h, 1) >= 0.45)
+        & (np.minimum(w, h) >= max(img_busca.shape) * LADO_MIN_MARCADOR)
+        & (w <= 2 * h) & (h <= 2 * w) & (w < img_busca.shape[1] * 0.1)
+    )
+    candidatos = candidatos[candidatos > 0]
+    # Quadrados sólidos em qualquer rotação: a área cobre quase todo o
+    # retângulo mínimo (um círculo preenchido cobre ~78%)
+    solidos = []
+    for i in candidatos:
+        recorte = rotulos[y[i]:y[i] + h[i], x[i]:x[i] + w[i]] == i
+        (_, _), (rw, rh), _ = cv2.minAreaRect(cv2.findNonZero(recorte.astype(np.uint8)))
+        rw, rh = rw + 1, rh + 1
+        preenchimento = area[i] / (rw * rh)
+        if preenchimento >= PREENCHIMENTO_MIN_MARCADOR and max(rw, rh) <= 1.25 * min(rw, rh):
+            solidos.append((preenchimento, i))
+    if len(solidos) < 4:
+        return None
+    solidos = [i for _, i in sorted(solidos, reverse=True)[:MAX_CANDIDATOS_MARCADORES]]
+    stats, centros, area = stats[solidos], centros[solidos], area[solidos]
+
+    # Os quatro marcadores têm o mesmo tamanho e formam um retângulo: entre
+    # as combinações de quatro candidatos, fica com o maior quadrilátero
+    # regular
+    area_busca = img_busca.shape[0] * img_busca.shape[1]
+    melhor = None
+    for combinacao in itertools.combinations(range(len(stats)), 4):
+        combinacao = np.array(combinacao)
+        areas = area[combinacao]
+        if areas.max() > 1.35 * areas.min():
+            continue
+        pts = centros[combinacao]
+        soma, dif = pts.sum(axis=1), pts[:, 0] - pts[:, 1]
+        cantos = [np.argmin(soma), np.argmax(dif), np.argmax(soma), np.argmin(dif)]
+        if len(set(cantos)) < 4:
+            continue
+        quad = pts[cantos]
+        area_quad = cv2.contourArea(quad.astype(np.float32))
+        if area_quad < AREA_MIN_QUADRO_MARCADORES * area_busca or not _quadrilatero_regular(quad):
+            continue
+        if melhor is None or area_quad > melhor[0]:
+            melhor = (area_quad, combinacao[cantos])
+    if melhor is None:
+        return None
+
+    # Centro de cada marcador refinado na resolução cheia, usando apenas o
+    # componente do marcador dentro da janela
+    pts_ref = []
+    for i in melhor[1]:
+        bx, by, bw, bh = stats[i, :4] / fator
+        mx, my = bw * 0.5, bh * 0.5
+        x0, y0 = max(0, int(bx - mx)), max(0, int(by - my))
+        x1, y1 = min(largura, int(bx + bw + mx) + 1), min(altura, int(by + bh + my) + 1)
+        janela = (img_gray[y0:y1, x0:x1] <= limiar).astype(np.uint8)
+        n, rotulos_janela, stats_janela, centros_janela = cv2.connectedComponentsWithStats(janela, connectivity=8)
+        cx, cy = centros[i] / fator
+        rotulo = rotulos_janela[min(int(cy) - y0, y1 - y0 - 1), min(int(cx) - x0, x1 - x0 - 1)]
+        if rotulo == 0 and n > 1:
+            rotulo = 1 + int(np.argmax(stats_janela[1:, cv2.CC_STAT_AREA]))
+        if rotulo > 0:
+            pts_ref.append((x0 + float(centros_janela[rotulo][0]), y0 + float(centros_janela[rotulo][1])))
+        else:
+            pts_ref.append((float(cx), float(cy)))
+    return pts_ref
+
 def desenhar_rois_em_imagem(imagem, grid_rois, color=(255, 0, 0), width=2):
+    """grid_rois pode ser a lista do config ou um layout compilado (modules.core.layout)."""
     draw = ImageDraw.Draw(imagem)
-    for coluna in grid_rois:
-        for roi in coluna:
-            x = roi["x"]
-            y = roi["y"]
-            w = roi["width"]
-            h = roi["height"]
-            draw.rectangle([x, y, x + w, y + h], outline=color, width=width)
+    if isinstance(grid_rois, np.ndarray):
+        caixas = grid_rois["caixa"][grid_rois["valida"]].tolist()
+    else:
+        caixas = [(roi["x"], roi["y"], roi["width"], roi["height"]) for coluna in grid_rois for roi in coluna]
+    for x, y, w, h in caixas:
+        draw.rectangle([x, y, x + w, y + h], outline=color, width=width)
     return imagem
 
 def pre_processar_imagem(imagem_pil, equalizar=True, ajustar_contraste=True, remover_ruido=True):
-    img_gray = np.array(imagem_pil.convert("L"))
+    img_gray = imagem_cinza_np(imagem_pil)
     if remover_ruido:
         img_gray = cv2.GaussianBlur(img_gray, (3, 3), 0)
     if equalizar:
@@ -40,13 +187,110 @@ def pre_processar_imagem(imagem_pil, equalizar=True, ajustar_contraste=True, rem
         img_gray = clahe.apply(img_gray)
     return Image.fromarray(img_gray)
 
-def detectar_area_gabarito_template(imagem, template, metodo=cv2.TM_CCOEFF_NORMED, pre_processar=True, multi_escala=True, rotacoes=True):
+# Candidatos da busca grossa refinados em resolução cheia
+CANDIDATOS_REFINO = 5
+
+def _transformacao_busca(shape, scale, angle):
+    """
+    Matriz afim (2x3) equivalente a redimensionar a imagem por scale e
+    girá-la por angle em torno do centro, como na busca exaustiva.
+    """
+    h, w = shape[:2]
+    largura, altura = int(w * scale), int(h * scale)
+    M = np.array([[scale, 0, 0], [0, scale, 0]], dtype=np.float64)
+    if angle != 0:
+        R = cv2.getRotationMatrix2D((largura // 2, altura // 2), angle, 1.0)
+        M = R @ np.vstack([M, [0, 0, 1]])
+    return M, (largura, altura)
+
+def _pontos_na_original(max_loc, scale, angle, template_shape, img_shape):
+    h, w = template_shape
+    if scale != 1.0 or angle != 0:
+        if scale != 1.0:
+            max_loc = (int(max_loc[0] / scale), int(max_loc[1] / scale))
+            h = int(h / scale)
+            w = int(w / scale)
+        if angle != 0:
+            center_orig = (img_shape[1] // 2, img_shape[0] // 2)
+            dx = max_loc[0] - center_orig[0]
+            dy = max_loc[1] - center_orig[1]
+            angle_rad = -angle * np.pi / 180.0
+            dx_rot = dx * np.cos(angle_rad) - dy * np.sin(angle_rad)
+            dy_rot = dx * np.sin(angle_rad) + dy * np.cos(angle_rad)
+            max_loc = (int(center_orig[0] + dx_rot), int(center_orig[1] + dy_rot))
+    top_left = max_loc
+    bottom_right = (top_left[0] + w, top_left[1] + h)
+    return [
+        top_left,
+        (bottom_right[0], top_left[1]),
+        bottom_right,
+        (top_left[0], bottom_right[1])
+    ]
+
+def _busca_piramidal(img_gray, template_gray, metodo, scales, angles, fator, template_grosso=None):
+    """
+    Busca em dois níveis: percorre toda a grade de escalas/ângulos com a
+    página e o template reduzidos por fator, e depois refina só os melhores
+    candidatos em uma janela pequena na resolução cheia. Apenas a janela é
+    transformada (warpAffine com saída do tamanho da janela), nunca a página.
+    """
+    img_grossa = cv2.resize(img_gray, None, fx=1 / fator, fy=1 / fator, interpolation=cv2.INTER_AREA)
+    if template_grosso is None:
+        template_grosso = cv2.resize(template_gray, None, fx=1 / fator, fy=1 / fator, interpolation=cv2.INTER_AREA)
+    th, tw = template_grosso.shape
+
+    candidatos = []
+    for scale in scales:
+        for angle in angles:
+            M, (largura, altura) = _transformacao_busca(img_grossa.shape, scale, angle)
+            if th >= altura or tw >= largura:
+                continue
+            if angle == 0:
+                img_t = cv2.resize(img_grossa, (largura, altura), interpolation=cv2.INTER_AREA) if scale != 1.0 else img_grossa
+            else:
+                img_t = cv2.warpAffine(img_grossa, M, (largura, altura), flags=cv2.INTER_LINEAR)
+            res = cv2.matchTemplate(img_t, template_grosso, metodo)
+            _, max_val, _, max_loc = cv2.minMaxLoc(res)
+            candidatos.append((max_val, scale, angle, max_loc))
+    candidatos.sort(key=lambda c: c[0], reverse=True)
+
+    best_score = -1
+    best_pts = None
+    th, tw = template_gray.shape
+    margem = int(2 * fator) + 4
+    for score_grosso, scale, angle, loc in candidatos[:CANDIDATOS_REFINO]:
+        M, (largura, altura) = _transformacao_busca(img_gray.shape, scale, angle)
+        x0 = min(max(0, int(loc[0] * fator) - margem), max(0, largura - tw))
+        y0 = min(max(0, int(loc[1] * fator) - margem), max(0, altura - th))
+        x1 = min(largura, x0 + tw + 2 * margem)
+        y1 = min(altura, y0 + th + 2 * margem)
+        if x1 - x0 < tw or y1 - y0 < th:
+            continue
+        M_janela = M.copy()
+        M_janela[:, 2] -= (x0, y0)
+        janela = cv2.warpAffine(img_gray, M_janela, (x1 - x0, y1 - y0), flags=cv2.INTER_LINEAR)
+        res = cv2.matchTemplate(janela, template_gray, metodo)
+        _, max_val, _, max_loc = cv2.minMaxLoc(res)
+        logger.debug(f"Pirâmide: escala {scale}, ângulo {angle}, score grosso {score_grosso:.4f}, refinado {max_val:.4f}")
+        if max_val > best_score:
+            best_score = max_val
+            best_pts = _pontos_na_original((max_loc[0] + x0, max_loc[1] + y0), scale, angle, template_gray.shape, img_gray.shape)
+    logger.debug(f"Template matching score: {best_score:.4f}")
+    return best_pts, best_score
+
+def detectar_area_gabarito_template(imagem, template, metodo=cv2.TM_CCOEFF_NORMED, pre_processar=True, multi_escala=True, rotacoes=True, piramide=True):
     if pre_processar:
         imagem_proc = pre_processar_imagem(imagem)
     else:
-        imagem_proc = imagem.convert("L")
-    template_gray = np.array(template.convert("L"))
-    img_gray = np.array(imagem_proc)
+        imagem_proc = imagem
+    # template pode vir do registro (dict com as versões pré-calculadas)
+    template_grosso = None
+    if isinstance(template, dict):
+        template_gray = template["cinza"]
+        template_grosso = template["grosso"]
+    else:
+        template_gray = imagem_cinza_np(template)
+    img_gray = imagem_cinza_np(imagem_proc)
     if template_gray.shape[0] >= img_gray.shape[0] or template_gray.shape[1] >= img_gray.shape[1]:
         logger.debug(f"Template maior que a imagem. Redimensionando template.")
         scale = min(img_gray.shape[0] / template_gray.shape[0], 
@@ -54,6 +298,7 @@ def detectar_area_gabarito_template(imagem, template, metodo=cv2.TM_CCOEFF_NORME
         new_width = int(template_gray.shape[1] * scale)
         new_height = int(template_gray.shape[0] * scale)
         template_gray = cv2.resize(template_gray, (new_width, new_height))
+        template_grosso = None
         logger.debug(f"Template redimensionado para {new_width}x{new_height}")
     if template_gray.shape[0] >= img_gray.shape[0] or template_gray.shape[1] >= img_gray.shape[1]:
         logger.error("Template ainda é maior que a imagem após redimensionamento!")
@@ -73,6 +318,9 @@ def detectar_area_gabarito_template(imagem, template, metodo=cv2.TM_CCOEFF_NORME
         angles = [-2, -1, 0, 1, 2]
     else:
         angles = [0]
+    fator = min(template_gray.shape) / TAMANHO_TEMPLATE_GROSSO
+    if piramide and fator >= 2:
+        return _busca_piramidal(img_gray, template_gray, metodo, scales, angles, fator, template_grosso)
     for scale in scales:
         for angle in angles:
             try:
@@ -98,36 +346,299 @@ def detectar_area_gabarito_template(imagem, template, metodo=cv2.TM_CCOEFF_NORME
                 _, max_val, _, max_loc = cv2.minMaxLoc(res)
                 if max_val > best_score:
                     best_score = max_val
-                    h, w = template_gray.shape
-                    if scale != 1.0 or angle != 0:
-                        if scale != 1.0:
-                            max_loc = (int(max_loc[0] / scale), int(max_loc[1] / scale))
-                            h = int(h / scale)
-                            w = int(w / scale)
-                        if angle != 0:
-                            center_orig = (img_gray.shape[1] // 2, img_gray.shape[0] // 2)
-                            dx = max_loc[0] - center_orig[0]
-                            dy = max_loc[1] - center_orig[1]
-                            angle_rad = -angle * np.pi / 180.0
-                            dx_rot = dx * np.cos(angle_rad) - dy * np.sin(angle_rad)
-                            dy_rot = dx * np.sin(angle_rad) + dy * np.cos(angle_rad)
-                            max_loc = (int(center_orig[0] + dx_rot), int(center_orig[1] + dy_rot))
-                    top_left = max_loc
-                    bottom_right = (top_left[0] + w, top_left[1] + h)
-                    best_pts = [
-                        top_left,
-                        (bottom_right[0], top_left[1]),
-                        bottom_right,
-                        (top_left[0], bottom_right[1])
-                    ]
+                    best_pts = _pontos_na_original(max_loc, scale, angle, template_gray.shape, img_gray.shape)
             except Exception as e:
                 logger.error(f"Erro no template matching para escala {scale} e ângulo {angle}: {e}")
                 continue
     logger.debug(f"Template matching score: {best_score:.4f}")
     return best_pts, best_score
 
-def detectar_area_cabecalho_template(imagem, template, metodo=cv2.TM_CCOEFF_NORMED, pre_processar=True, multi_escala=True, rotacoes=True):
-    return detectar_area_gabarito_template(imagem, template, metodo, pre_processar, multi_escala, rotacoes)
+def detectar_area_cabecalho_template(imagem, template, metodo=cv2.TM_CCOEFF_NORMED, pre_processar=True, multi_escala=True, rotacoes=True, piramide=True):
+    return detectar_area_gabarito_template(imagem, template, metodo, pre_processar, multi_escala, rotacoes, piramide)
+
+# Alinhamento por características: maior lado da cópia reduzida da página,
+# pontos extraídos dela e mínimo de correspondências consistentes
+LADO_BUSCA_CARACTERISTICAS = 1400
+MAX_PONTOS_PAGINA = 5000
+RAZAO_CORRESPONDENCIA = 0.8
+MIN_INLIERS_ALINHAMENTO = 20
+
+def _caracteristicas(template):
+    if isinstance(template, dict):
+        return template["caracteristicas"]
+    return extrair_caracteristicas(imagem_cinza_np(template))
+
+def _retificar_reduzido(img_gray, pts_ref, reduzido):
+    """Retifica a região pts_ref da página para o quadro do template reduzido."""
+    h, w = reduzido.shape
+    quadro = np.array([[0, 0], [w, 0], [w, h], [0, h]], dtype=np.float32)
+    M = cv2.getPerspectiveTransform(np.array(pts_ref, dtype=np.float32), quadro)
+    return cv2.warpPerspective(img_gray, M, (w, h), flags=cv2.INTER_AREA, borderValue=255)
+
+def score_alinhamento(imagem, pts_ref, template):
+    """
+    Correlação normalizada (TM_CCOEFF_NORMED) entre o template reduzido e a
+    região da página delimitada por pts_ref, retificada para o tamanho do
+    template. Mede a qualidade de qualquer alinhamento na mesma escala do
+    score do template matching.
+    """
+    reduzido = _caracteristicas(template)["reduzido"]
+    retificada = _retificar_reduzido(imagem_cinza_np(imagem), pts_ref, reduzido)
+    return float(cv2.matchTemplate(retificada, reduzido, cv2.TM_CCOEFF_NORMED)[0, 0])
+
+# Verificação rápida de um alinhamento: deslocamento máximo procurado (em
+# pixels do template reduzido) e correlação mínima de cada janela
+MARGEM_VERIFICACAO = 16
+LIMIAR_VERIFICACAO = 0.5
+
+def janelas_confiaveis(imagem, pts_ref, template):
+    """
+    Janelas de verificação em que a página alinhada por pts_ref confere com
+    o template; usadas por verificar_alinhamento nas páginas seguintes.
+    """
+    reduzido = _caracteristicas(template)["reduzido"]
+    retificada = _retificar_reduzido(imagem_cinza_np(imagem), pts_ref, reduzido)
+    return janelas_verificacao(reduzido, referencia=retificada)
+
+def verificar_alinhamento(imagem, pts_ref, template, janelas=None, margem=MARGEM_VERIFICACAO, limiar=LIMIAR_VERIFICACAO):
+    """
+    Confere se pts_ref (por exemplo, o alinhamento da página anterior) vale
+    para esta página sem refazer a localização: só as janelas de
+    verificação do template são retificadas, cada uma com uma margem, e
+    correlacionadas com o template. Se a maioria das janelas confere, o
+    alinhamento é corrigido pelo deslocamento encontrado em cada uma.
+
+    Args:
+        imagem: Página (PIL ou array NumPy)
+        pts_ref: Alinhamento a conferir
+        template: Dicionário do registro (template_registry) ou imagem
+        janelas: Janelas de verificação (ver janelas_confiaveis); por
+            padrão, as pré-calculadas no registro
+        margem: Deslocamento máximo procurado, em pixels do template reduzido
+        limiar: Correlação mínima de cada janela
+
+    Returns:
+        Tupla (pts_ref, score): os pontos (refinados) e a correlação média
+        das janelas, ou (None, score) se o alinhamento não vale
+    """
+    img_gray = imagem_cinza_np(imagem)
+    caracteristicas = _caracteristicas(template)
+    reduzido = caracteristicas["reduzido"]
+    if janelas is None:
+        janelas = caracteristicas["janelas"]
+    if len(janelas) < 3:
+        return None, 0.0
+    h, w = reduzido.shape
+    quadro = np.array([[0, 0], [w, 0], [w, h], [0, h]], dtype=np.float32)
+    M = cv2.getPerspectiveTransform(np.array(pts_ref, dtype=np.float32), quadro)
+
+    scores, esperados, encontrados = [], [], []
+    for x, y, jw, jh in janelas:
+        T = np.array([[1, 0, margem - x], [0, 1, margem - y], [0, 0, 1]], dtype=np.float64)
+        regiao = cv2.warpPerspective(img_gray, T @ M, (jw + 2 * margem, jh + 2 * margem), borderValue=255)
+        res = cv2.matchTemplate(regiao, reduzido[y:y + jh, x:x + jw], cv2.TM_CCOEFF_NORMED)
+        _, valor, _, loc = cv2.minMaxLoc(res)
+        scores.append(valor)
+        if valor >= limiar:
+            esperados.append((x + jw / 2, y + jh / 2))
+            encontrados.append((x - margem + loc[0] + jw / 2, y - margem + loc[1] + jh / 2))
+    score = float(np.mean(scores))
+    if len(esperados) < max(3, int(np.ceil(0.75 * len(janelas)))):
+        return None, score
+
+    esperados = np.array(esperados, dtype=np.float32)
+    encontrados = np.array(encontrados, dtype=np.float32)
+    if np.abs(encontrados - esperados).max() <= 1:
+        return pts_ref, score
+    # Corrige o alinhamento pelo deslocamento das janelas com uma semelhança
+    # (translação, rotação e escala): entre páginas de um mesmo lote a folha
+    # só escorrega e gira, e as janelas próximas umas das outras não
+    # sustentam uma homografia completa
+    A, _ = cv2.estimateAffinePartial2D(encontrados, esperados, method=cv2.LMEDS)
+    if A is None:
+        return None, score
+    C = np.vstack([A, [0, 0, 1]])
+    residuo = np.abs(cv2.perspectiveTransform(encontrados[None], C)[0] - esperados).max()
+    if residuo > 2:
+        return None, score
+    pts = cv2.perspectiveTransform(quadro[None], np.linalg.inv(C @ M))[0]
+    return [(float(px), float(py)) for px, py in pts], score
+
+def detectar_area_gabarito_caracteristicas(imagem, template, lado_busca=LADO_BUSCA_CARACTERISTICAS,
+                                          min_inliers=MIN_INLIERS_ALINHAMENTO):
+    """
+    Localiza o template na página casando pontos ORB (pré-calculados no
+    registro de templates) com os de uma cópia reduzida da página e
+    estimando uma homografia completa com RANSAC. Tolera rotação, escala e
+    perspectiva além da faixa da busca por template matching.
+
+    Args:
+        imagem: Página (PIL ou array NumPy)
+        template: Dicionário do registro (template_registry) ou imagem
+        lado_busca: Maior lado da cópia reduzida da página
+        min_inliers: Mínimo de correspondências consistentes com a homografia
+
+    Returns:
+        Tupla (pts_ref, score): os cantos do template na página
+        (superior esquerdo, superior direito, inferior direito, inferior
+        esquerdo) e o score_alinhamento, ou (None, 0.0) se não houver
+        correspondências suficientes
+    """
+    if isinstance(template, dict):
+        altura_t, largura_t = template["cinza"].shape
+        caracteristicas = template["caracteristicas"]
+    else:
+        template_gray = imagem_cinza_np(template)
+        altura_t, largura_t = template_gray.shape
+        caracteristicas = extrair_caracteristicas(template_gray)
+    if len(caracteristicas["descritores"]) < min_inliers:
+        return None, 0.0
+
+    img_gray = imagem_cinza_np(imagem)
+    fator = min(1.0, lado_busca / max(img_gray.shape))
+    img_busca = img_gray if fator == 1.0 else cv2.resize(img_gray, None, fx=fator, fy=fator, interpolation=cv2.INTER_AREA)
+    orb = cv2.ORB_create(nfeatures=MAX_PONTOS_PAGINA, fastThreshold=10)
+    kps, descritores = orb.detectAndCompute(img_busca, None)
+    if descritores is None or len(kps) < min_inliers:
+        return None, 0.0
+
+    pares = cv2.BFMatcher(cv2.NORM_HAMMING).knnMatch(caracteristicas["descritores"], descritores, k=2)
+    bons = [m for m, n in (par for par in pares if len(par) == 2) if m.distance < RAZAO_CORRESPONDENCIA * n.distance]
+    if len(bons) < min_inliers:
+        logger.debug(f"Alinhamento por características: {len(bons)} correspondências")
+        return None, 0.0
+    origem = caracteristicas["pontos"][[m.queryIdx for m in bons]]
+    destino = np.array([kps[m.trainIdx].pt for m in bons], dtype=np.float32) / fator
+    H, mascara = cv2.findHomography(origem, destino, cv2.RANSAC, 3.0 / fator)
+    inliers = int(mascara.sum()) if mascara is not None else 0
+    if H is None or inliers < min_inliers:
+        logger.debug(f"Alinhamento por características: {inliers} inliers de {len(bons)}")
+        return None, 0.0
+
+    cantos = np.array([[[0, 0], [largura_t, 0], [largura_t, altura_t], [0, altura_t]]], dtype=np.float32)
+    quad = cv2.perspectiveTransform(cantos, H)[0]
+    if not cv2.isContourConvex(quad) or cv2.contourArea(quad) < 0.01 * img_gray.shape[0] * img_gray.shape[1]:
+        logger.debug("Alinhamento por características: homografia degenerada")
+        return None, 0.0
+    pts_ref = [(float(x), float(y)) for x, y in quad]
+    score = score_alinhamento(img_gray, pts_ref, template)
+    logger.debug(f"Alinhamento por características: {inliers} inliers de {len(bons)}, score {score:.4f}")
+    return pts_ref, score
+
+# Correlação mínima do template escolhido e vantagem mínima sobre o segundo
+SCORE_MIN_CLASSIFICACAO = 0.6
+MARGEM_MIN_CLASSIFICACAO = 0.1
+
+def _miniatura_pagina(img_gray):
+    """Cópia da página com o lado menor reduzido a LARGURA_CLASSIFICACAO (a largura, na folha de pé)."""
+    fator = LARGURA_CLASSIFICACAO / min(img_gray.shape)
+    tamanho = (max(1, int(round(img_gray.shape[1] * fator))), max(1, int(round(img_gray.shape[0] * fator))))
+    # Amostrar com passo antes da média por área mantém ao menos 4x4
+    # pixels por pixel reduzido e evita percorrer a página inteira
+    passo = max(1, min(img_gray.shape) // (4 * LARGURA_CLASSIFICACAO))
+    return cv2.resize(img_gray[::passo, ::passo], tamanho, interpolation=cv2.INTER_AREA)
+
+def _scores_templates(pagina, templates):
+    scores = {}
+    for chave, template in templates.items():
+        melhor = -1.0
+        for miniatura in template["miniaturas"]:
+            if miniatura.shape[0] > pagina.shape[0] or miniatura.shape[1] > pagina.shape[1]:
+                continue
+            res = cv2.matchTemplate(pagina, miniatura, cv2.TM_CCOEFF_NORMED)
+            melhor = max(melhor, cv2.minMaxLoc(res)[1])
+        scores[chave] = float(melhor)
+    return scores
+
+# Fração mínima de pixels de tinta para a página (em cinza) não ser
+# considerada em branco: uma folha impressa tem mais de 5%, um verso com
+# ruído ou transparência fica perto de 0; o limiar de 0,5% fica entre os dois
+DENSIDADE_MIN_TINTA = 0.005
+LARGURA_DENSIDADE = 400
+
+def densidade_tinta(imagem, largura=LARGURA_DENSIDADE):
+    """
+    Fração de pixels de tinta em uma cópia reduzida da página: os pixels
+    bem mais escuros que o papel (o percentil 90), o que ignora fundo
+    acinzentado, ruído e a transparência do verso.
+    """
+    img_gray = imagem_cinza_np(imagem)
+    passo = max(1, img_gray.shape[1] // (2 * largura))
+    amostra = img_gray[::passo, ::passo]
+    altura = max(1, int(round(amostra.shape[0] * largura / amostra.shape[1])))
+    reduzida = cv2.resize(amostra, (largura, altura), interpolation=cv2.INTER_AREA)
+    papel = np.percentile(reduzida, 90)
+    return float((reduzida < papel - 80).mean())
+
+def classificar_folha(imagem, templates, girar=False, score_min=SCORE_MIN_CLASSIFICACAO, margem_min=MARGEM_MIN_CLASSIFICACAO):
+    """
+    Identifica o tipo de folha comparando a página com todos os templates
+    registrados. A página é reduzida uma única vez (a LARGURA_CLASSIFICACAO)
+    e cada template é procurado nela nas miniaturas pré-calculadas pelo
+    registro; o custo é de poucos milissegundos por página.
+
+    Com girar, a miniatura é testada também de cabeça para baixo (ou,
+    numa página deitada, girada para os dois lados) e fica a orientação
+    em que um template confere claramente melhor; assim folhas alimentadas
+    de lado ou invertidas são endireitadas antes do alinhamento. Como a
+    grade de bolhas é quase simétrica, a folha invertida ainda correlaciona
+    bem, e as duas orientações são sempre comparadas.
+
+    Args:
+        imagem: Página (PIL ou array NumPy)
+        templates: Dicionário {chave: template do registro}
+        girar: Testa as outras orientações
+        score_min: Correlação mínima do melhor template
+        margem_min: Vantagem mínima do melhor template sobre o segundo (e
+            da orientação escolhida sobre a página de pé)
+
+    Returns:
+        Tupla (chave, scores, rotacao): a chave do template escolhido, ou
+        None se nenhum for claramente o melhor, a correlação de cada
+        template e quantos quartos de volta (como em np.rot90) põem a
+        página de pé
+    """
+    pagina = _miniatura_pagina(imagem_cinza_np(imagem))
+    rotacao = 0
+    if not girar:
+        scores = _scores_templates(pagina, templates)
+    else:
+        # Folha retrato: de pé ou invertida; deitada: girada para um dos lados
+        altura, largura = pagina.shape
+        rotacoes = (0, 2) if altura > largura * 1.1 else (1, 3) if largura > altura * 1.1 else (0, 1, 2, 3)
+        por_rotacao = {k: _scores_templates(np.rot90(pagina, k), templates) for k in rotacoes}
+        melhor = {k: max(sc.values(), default=-1.0) for k, sc in por_rotacao.items()}
+        ordem_rot = sorted(melhor, key=melhor.get, reverse=True)
+        if melhor[ordem_rot[0]] >= score_min and melhor[ordem_rot[0]] - melhor[ordem_rot[1]] >= margem_min:
+            rotacao = ordem_rot[0]
+        scores = por_rotacao.get(rotacao) or _scores_templates(pagina, templates)
+    ordem = sorted(scores, key=scores.get, reverse=True)
+    if not ordem or scores[ordem[0]] < score_min:
+        return None, scores, rotacao
+    if len(ordem) > 1 and scores[ordem[0]] - scores[ordem[1]] < margem_min:
+        return None, scores, rotacao
+    return ordem[0], scores, rotacao
+
+def orientacao_marcadores(imagem):
+    """
+    Orientação de uma folha do preenchedor pelos marcadores fiduciais: o
+    quadro dos marcadores fica na metade de baixo da folha de pé.
+
+    Returns:
+        Quartos de volta (como em np.rot90) que põem a página de pé, ou
+        None se não houver marcadores ou o quadro estiver centrado
+    """
+    pts = detectar_marcadores(imagem)
+    if pts is None:
+        return None
+    altura, largura = imagem_cinza_np(imagem).shape
+    cx, cy = np.mean(pts, axis=0)
+    dx, dy = cx / largura - 0.5, cy / altura - 0.5
+    if max(abs(dx), abs(dy)) < 0.1:
+        return None
+    if abs(dy) >= abs(dx):
+        return 0 if dy > 0 else 2
+    return 3 if dx > 0 else 1
 
 def detectar_matricula_por_contornos(imagem_pil, debug_folder=None):
     img_gray = np.array(imagem_pil.convert("L"))
@@ -204,43 +715,157 @@ def detectar_matricula_por_hough(imagem_pil, debug_folder=None):
         cv2.imwrite(os.path.join(debug_folder, "matricula_hough.png"), debug_img)
     return (x, y, w, h)
 
-def detectar_respostas_por_grid(
-    imagem,
-    grid_rois,
-    num_alternativas=4,
-    threshold_fill=0.3,
-    debug=False,
-    debug_folder=None
-):
-    if num_alternativas == 4:
-        alternativas = ['A','B','C','D']
-    else:
-        alternativas = ['A','B','C','D','E']
-
-    if debug and debug_folder:
-        os.makedirs(debug_folder, exist_ok=True)
-        debug_bin_dir = os.path.join(debug_folder, "bin")
-        debug_rois_dir = os.path.join(debug_folder, "rois")
-        debug_subrois_dir = os.path.join(debug_folder, "subrois")
-        os.makedirs(debug_bin_dir, exist_ok=True)
-        os.makedirs(debug_rois_dir, exist_ok=True)
-        os.makedirs(debug_subrois_dir, exist_ok=True)
-        imagem.save(os.path.join(debug_bin_dir, "debug_original.png"))
-
-    debug_image = imagem.copy()
-    draw = ImageDraw.Draw(debug_image)
-
-    imagem_gray = imagem.convert("L")
-    imagem_np = np.array(imagem_gray)
-
-    if debug and debug_folder:
+def calcular_razoes_preenchimento(imagem_bin, caixas):
+    """
+    Fração de pixels marcados em cada caixa, calculada com uma única imagem
+    integral da página binarizada e uma leitura vetorizada dos quatro cantos
+    de todas as caixas.
+
+    Args:
+        imagem_bin: Página binarizada (pixels marcados != 0)
+        caixas: Array (..., 4) com (x0, y0, x1, y1)
+
+    Returns:
+        Array float64 com o formato de caixas[..., 0]; caixas vazias valem 0
+    """
+    integral = cv2.integral((imagem_bin > 0).astype(np.uint8))
+    x0, y0, x1, y1 = (caixas[..., k] for k in range(4))
+    somas = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+    areas = (x1 - x0) * (y1 - y0)
+    razoes = np.zeros(areas.shape, dtype=np.float64)
+    np.divide(somas, areas, out=razoes, where=areas > 0)
+    return razoes
+
+def calcular_razoes_lote(paginas_bin, caixas):
+    """
+    Razões de preenchimento de várias páginas alinhadas de uma só vez.
+
+    As páginas são empilhadas e reduzidas em uma única passada: as bordas
+    únicas das caixas dividem a página em uma grade de células, cujas somas
+    saem de dois np.add.reduceat; a imagem integral é montada só sobre essa
+    grade (bem menor que a página), e as quatro leituras por caixa são
+    feitas para todas as páginas ao mesmo tempo.
+
+    Args:
+        paginas_bin: Sequência ou array (páginas x altura x largura) de
+            páginas binarizadas do mesmo tamanho (pixels marcados != 0)
+        caixas: Array (questões x alternativas x 4) com (x0, y0, x1, y1)
+            recortado à página (ver layout.caixas_na_pagina)
+
+    Returns:
+        Array float64 (páginas x questões x alternativas)
+    """
+    pilha = paginas_bin if isinstance(paginas_bin, np.ndarray) else np.stack(paginas_bin)
+    if pilha.dtype != np.bool_:
+        pilha = pilha > 0
+    n, altura, largura = pilha.shape
+    xs = np.unique(np.concatenate([caixas[..., 0::2].ravel(), [0, largura]]))
+    ys = np.unique(np.concatenate([caixas[..., 1::2].ravel(), [0, altura]]))
+
+    faixas = np.add.reduceat(pilha, ys[:-1], axis=1, dtype=np.int32)
+    celulas = np.add.reduceat(faixas, xs[:-1], axis=2)
+    integral = np.zeros((n, len(ys), len(xs)), dtype=np.int64)
+    integral[:, 1:, 1:] = celulas.cumsum(axis=1).cumsum(axis=2)
+
+    ix0, ix1 = np.searchsorted(xs, caixas[..., 0]), np.searchsorted(xs, caixas[..., 2])
+    iy0, iy1 = np.searchsorted(ys, caixas[..., 1]), np.searchsorted(ys, caixas[..., 3])
+    somas = integral[:, iy1, ix1] - integral[:, iy0, ix1] - integral[:, iy1, ix0] + integral[:, iy0, ix0]
+    areas = (caixas[..., 2] - caixas[..., 0]) * (caixas[..., 3] - caixas[..., 1])
+    razoes = np.zeros(somas.shape, dtype=np.float64)
+    np.divide(somas, areas, out=razoes, where=areas > 0)
+    return razoes
+
+def classificar_razoes(razoes, alternativas, threshold_fill, estados=None):
+    """
+    Versão vetorizada de classificar_questao para um array
+    (páginas x questões x alternativas): as decisões de limiar são tomadas
+    em bloco e só a montagem dos textos percorre as questões.
+
+    Returns:
+        Lista (uma por página) de dicionários {"Questao N": resultado}
+    """
+    maximo = razoes.max(axis=-1)
+    limiar = np.where(
+        maximo < threshold_fill * 0.5, threshold_fill * 0.6,
+        np.where(maximo > threshold_fill * 3, threshold_fill * 1.5, threshold_fill)
+    )
+    marcadas = (razoes >= limiar[..., None]) & (razoes >= maximo[..., None] * 0.6)
+    n_marcadas = marcadas.sum(axis=-1)
+    escolhida = np.where(n_marcadas == 1, marcadas.argmax(axis=-1), razoes.argmax(axis=-1))
+    if estados is None:
+        estados = np.full(razoes.shape[1], ROI_OK, dtype=np.int8)
+
+    paginas = []
+    for n_pag, max_pag, esc_pag in zip(n_marcadas.tolist(), maximo.tolist(), escolhida.tolist()):
+        resultados = {}
+        for q, (n, max_ratio, i) in enumerate(zip(n_pag, max_pag, esc_pag)):
+            if estados[q] == ROI_INVALIDO:
+                resultado = "ROI inválido"
+            elif estados[q] == ROI_FORA:
+                resultado = "ROI fora dos limites"
+            elif n == 1:
+                resultado = alternativas[i]
+            elif n > 1:
+                resultado = "N"
+            elif max_ratio > threshold_fill * 0.3:
+                if max_ratio >= threshold_fill * 0.5:
+                    resultado = f"{alternativas[i]} (fraco)"
+                else:
+                    resultado = f"Não marcado (max: {max_ratio:.2f})"
+            else:
+                resultado = "Não marcado"
+            resultados[f"Questao {q + 1}"] = resultado
+        paginas.append(resultados)
+    return paginas
+
+def detectar_respostas_lote(paginas_bin, layout, threshold_fill=0.3):
+    """
+    Lê as respostas de várias páginas já binarizadas (binarizar_para_omr)
+    e alinhadas no mesmo quadro, com um único layout compilado.
+
+    Returns:
+        Tupla (razoes, respostas): tensor páginas x questões x alternativas
+        e a lista de dicionários de respostas, um por página
+    """
+    num_alternativas = layout["alternativas"].shape[1]
+    alternativas = ['A','B','C','D'] if num_alternativas == 4 else ['A','B','C','D','E']
+    pilha = paginas_bin if isinstance(paginas_bin, np.ndarray) else np.stack(paginas_bin)
+    caixas, estados = caixas_na_pagina(layout, pilha.shape[1], pilha.shape[2])
+    razoes = calcular_razoes_lote(pilha, caixas)
+    return razoes, classificar_razoes(razoes, alternativas, threshold_fill, estados)
+
+# Uma bolha marcada tem ao menos esta razão sobre a mediana da página (o
+# contorno impresso das bolhas vazias, que são a maioria, define a mediana)
+CONTRASTE_MIN_MARCACAO = 1.5
+RAZAO_MIN_MARCACAO = 0.05
+
+def pagina_sem_marcacoes(imagem_bin, layout, contraste_min=CONTRASTE_MIN_MARCACAO):
+    """
+    Indica se nenhuma bolha da grade foi marcada, a partir da página
+    alinhada e binarizada (binarizar_para_omr). Usa uma única imagem
+    integral (calcular_razoes_preenchimento) e não monta as respostas.
+    """
+    caixas, estados = caixas_na_pagina(layout, imagem_bin.shape[0], imagem_bin.shape[1])
+    razoes = calcular_razoes_preenchimento(imagem_bin, caixas)[estados == ROI_OK]
+    if not razoes.size:
+        return False
+    limite = max(float(np.median(razoes)) * contraste_min, RAZAO_MIN_MARCACAO)
+    return bool(razoes.max() < limite)
+
+def binarizar_para_omr(imagem_np, debug_bin_dir=None):
+    """
+    Binarização usada na leitura das bolhas: filtro bilateral, CLAHE,
+    combinação de Otsu com limiar adaptativo e limpeza morfológica.
+    Retorna uma imagem uint8 com as marcas em 255.
+    """
+    if debug_bin_dir:
         cv2.imwrite(os.path.join(debug_bin_dir, "debug_gray.png"), imagem_np)
 
     imagem_np = cv2.bilateralFilter(imagem_np, 5, 50, 50)
     clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
     imagem_np = clahe.apply(imagem_np)
 
-    if debug and debug_folder:
+    if debug_bin_dir:
         cv2.imwrite(os.path.join(debug_bin_dir, "debug_clahe.png"), imagem_np)
 
     _, thresh_otsu = cv2.threshold(imagem_np, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
@@ -251,7 +876,7 @@ def detectar_respostas_por_grid(
     imagem_bin = cv2.addWeighted(thresh_otsu, 0.5, thresh_adaptive, 0.5, 0)
     _, imagem_bin = cv2.threshold(imagem_bin, 127, 255, cv2.THRESH_BINARY)
 
-    if debug and debug_folder:
+    if debug_bin_dir:
         cv2.imwrite(os.path.join(debug_bin_dir, "debug_otsu.png"), thresh_otsu)
         cv2.imwrite(os.path.join(debug_bin_dir, "debug_adaptive.png"), thresh_adaptive)
         cv2.imwrite(os.path.join(debug_bin_dir, "debug_combined.png"), imagem_bin)
@@ -261,103 +886,134 @@ def detectar_respostas_por_grid(
     kernel_connect = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
     imagem_bin = cv2.morphologyEx(imagem_bin, cv2.MORPH_CLOSE, kernel_connect, iterations=1)
 
-    if debug and debug_folder:
+    if debug_bin_dir:
         cv2.imwrite(os.path.join(debug_bin_dir, "debug_final_binary.png"), imagem_bin)
+    return imagem_bin
+
+def classificar_questao(fill_ratios, alternativas, threshold_fill):
+    """
+    Decide a resposta de uma questão a partir das razões de preenchimento
+    das alternativas, com limiar dinâmico.
+
+    Returns:
+        Tupla (resultado, limiar usado, índices das alternativas marcadas)
+    """
+    max_ratio = max(fill_ratios) if fill_ratios else 0
+    dynamic_threshold = threshold_fill
+
+    if max_ratio < threshold_fill * 0.5:
+        dynamic_threshold = threshold_fill * 0.6
+    elif max_ratio > threshold_fill * 3:
+        dynamic_threshold = threshold_fill * 1.5
+
+    marcadas = []
+    for i, ratio in enumerate(fill_ratios):
+        if ratio >= dynamic_threshold and ratio >= max_ratio * 0.6:
+            marcadas.append(i)
+
+    if len(marcadas) == 0:
+        if max_ratio > threshold_fill * 0.3:
+            best_alt = fill_ratios.index(max_ratio)
+            if max_ratio >= threshold_fill * 0.5:
+                resultado = f"{alternativas[best_alt]} (fraco)"
+            else:
+                resultado = f"Não marcado (max: {max_ratio:.2f})"
+        else:
+            resultado = "Não marcado"
+    elif len(marcadas) == 1:
+        resultado = alternativas[marcadas[0]]
+    else:
+        resultado = "N"
+    return resultado, dynamic_threshold, marcadas
 
-    resultados = {}
-    questao_num = 1
-
-    for col_rois in grid_rois:
-        for roi in col_rois:
-            questao_nome = f"Questao {questao_num}"
-            x = roi["x"]
-            y = roi["y"]
-            w = roi["width"]
-            h = roi["height"]
-
-            draw.rectangle([x, y, x+w, y+h], outline="red", width=2)
-            draw.text((x+5, y+5), f"{questao_num}", fill="red")
-
-            if w is None or h is None or w <= 0 or h <= 0:
-                resultados[questao_nome] = "ROI inválido"
-                questao_num += 1
-                continue
-
-            x = max(0, x)
-            y = max(0, y)
-            w = min(w, imagem_bin.shape[1] - x)
-            h = min(h, imagem_bin.shape[0] - y)
+def detectar_respostas_por_grid(
+    imagem,
+    grid_rois,
+    num_alternativas=4,
+    threshold_fill=0.3,
+    debug=False,
+    debug_folder=None
+):
+    """
+    Lê as alternativas marcadas em cada questão.
+
+    grid_rois pode ser a lista de colunas do config ou, de preferência, o
+    layout já compilado (modules.core.layout.obter_layout); neste caso o
+    número de alternativas vem do próprio layout.
+    """
+    if isinstance(grid_rois, np.ndarray):
+        layout = grid_rois
+        num_alternativas = layout["alternativas"].shape[1]
+    else:
+        layout = compilar_layout(grid_rois, num_alternativas)
 
-            if w <= 0 or h <= 0:
-                resultados[questao_nome] = "ROI fora dos limites"
-                questao_num += 1
-                continue
+    if num_alternativas == 4:
+        alternativas = ['A','B','C','D']
+    else:
+        alternativas = ['A','B','C','D','E']
 
-            roi_img = imagem_bin[y:y+h, x:x+w]
+    debug_bin_dir = None
+    if debug and debug_folder:
+        os.makedirs(debug_folder, exist_ok=True)
+        debug_bin_dir = os.path.join(debug_folder, "bin")
+        debug_rois_dir = os.path.join(debug_folder, "rois")
+        debug_subrois_dir = os.path.join(debug_folder, "subrois")
+        os.makedirs(debug_bin_dir, exist_ok=True)
+        os.makedirs(debug_rois_dir, exist_ok=True)
+        os.makedirs(debug_subrois_dir, exist_ok=True)
+        imagem_pil = imagem if isinstance(imagem, Image.Image) else Image.fromarray(imagem)
+        imagem_pil.save(os.path.join(debug_bin_dir, "debug_original.png"))
 
-            if debug and debug_folder:
-                cv2.imwrite(os.path.join(debug_rois_dir, f"debug_roi_{questao_num}.png"), roi_img)
+    imagem_np = imagem_cinza_np(imagem)
+    imagem_bin = binarizar_para_omr(imagem_np, debug_bin_dir)
 
-            sub_w = w // num_alternativas
-            fill_ratios = []
+    caixas, estados = caixas_na_pagina(layout, imagem_bin.shape[0], imagem_bin.shape[1])
+    razoes = calcular_razoes_preenchimento(imagem_bin, caixas)
 
-            for alt_i in range(num_alternativas):
-                start_x = alt_i * sub_w
-                end_x = (alt_i + 1) * sub_w if alt_i < num_alternativas - 1 else w
-                end_x = min(end_x, w)
-                if start_x >= end_x:
-                    fill_ratios.append(0.0)
-                    continue
-                sub_roi = roi_img[:, start_x:end_x]
-                if sub_roi.size == 0:
-                    fill_ratios.append(0.0)
-                    continue
-                area_sub = sub_roi.shape[0] * sub_roi.shape[1]
-                count_white = cv2.countNonZero(sub_roi)
-                ratio = count_white / area_sub if area_sub > 0 else 0
-                fill_ratios.append(ratio)
-                if debug and debug_folder:
-                    alt_filename = f"debug_roi_{questao_num}_alt_{alternativas[alt_i]}_ratio_{ratio:.3f}.png"
-                    alt_file_path = os.path.join(debug_subrois_dir, alt_filename)
-                    cv2.imwrite(alt_file_path, sub_roi)
-
-            max_ratio = max(fill_ratios) if fill_ratios else 0
-            dynamic_threshold = threshold_fill
-
-            if max_ratio < threshold_fill * 0.5:
-                dynamic_threshold = threshold_fill * 0.6
-            elif max_ratio > threshold_fill * 3:
-                dynamic_threshold = threshold_fill * 1.5
-
-            marcadas = []
-            for i, ratio in enumerate(fill_ratios):
-                if ratio >= dynamic_threshold and ratio >= max_ratio * 0.6:
-                    marcadas.append(i)
-
-            if len(marcadas) == 0:
-                if max_ratio > threshold_fill * 0.3:
-                    best_alt = fill_ratios.index(max_ratio)
-                    if max_ratio >= threshold_fill * 0.5:
-                        resultado = f"{alternativas[best_alt]} (fraco)"
-                    else:
-                        resultado = f"Não marcado (max: {max_ratio:.2f})"
-                else:
-                    resultado = "Não marcado"
-            elif len(marcadas) == 1:
-                resultado = alternativas[marcadas[0]]
-            else:
-                resultado = "N"
+    resultados = {}
+    for q, fill_ratios in enumerate(razoes.tolist()):
+        questao_num = q + 1
+        questao_nome = f"Questao {questao_num}"
+        if estados[q] == ROI_INVALIDO:
+            resultados[questao_nome] = "ROI inválido"
+            continue
+        if estados[q] == ROI_FORA:
+            resultados[questao_nome] = "ROI fora dos limites"
+            continue
 
-            resultados[questao_nome] = resultado
+        resultado, dynamic_threshold, marcadas = classificar_questao(fill_ratios, alternativas, threshold_fill)
+        resultados[questao_nome] = resultado
 
-            if debug:
-                logger.debug(f"{questao_nome}: ratios={[f'{r:.3f}' for r in fill_ratios]}, "
-                           f"max={max_ratio:.3f}, threshold={dynamic_threshold:.3f}, "
-                           f"marcadas={marcadas}, resultado='{resultado}'")
-            questao_num += 1
+        if debug:
+            logger.debug(f"{questao_nome}: ratios={[f'{r:.3f}' for r in fill_ratios]}, "
+                       f"max={max(fill_ratios):.3f}, threshold={dynamic_threshold:.3f}, "
+                       f"marcadas={marcadas}, resultado='{resultado}'")
 
     if debug and debug_folder:
-        debug_boxes_path = os.path.join(debug_folder, "debug_respostas_boxes.png")
-        debug_image.save(debug_boxes_path)
+        _salvar_debug_grid(imagem_pil, imagem_bin, layout, caixas, estados, razoes,
+                           alternativas, debug_folder, debug_rois_dir, debug_subrois_dir)
 
     return resultados
+
+def _salvar_debug_grid(imagem_pil, imagem_bin, layout, caixas, estados, razoes,
+                       alternativas, debug_folder, debug_rois_dir, debug_subrois_dir):
+    debug_image = imagem_pil.copy()
+    draw = ImageDraw.Draw(debug_image)
+    for q, (x, y, w, h) in enumerate(layout["caixa"].tolist()):
+        questao_num = q + 1
+        if w < 0 or h < 0:
+            continue
+        draw.rectangle([x, y, x+w, y+h], outline="red", width=2)
+        draw.text((x+5, y+5), f"{questao_num}", fill="red")
+        if estados[q] != ROI_OK:
+            continue
+        x0, y0 = caixas[q, 0, :2]
+        x1, y1 = caixas[q, -1, 2:]
+        cv2.imwrite(os.path.join(debug_rois_dir, f"debug_roi_{questao_num}.png"), imagem_bin[y0:y1, x0:x1])
+        for alt_i, (ax0, ay0, ax1, ay1) in enumerate(caixas[q]):
+            if ax1 <= ax0:
+                continue
+            ratio = razoes[q, alt_i]
+            alt_filename = f"debug_roi_{questao_num}_alt_{alternativas[alt_i]}_ratio_{ratio:.3f}.png"
+            cv2.imwrite(os.path.join(debug_subrois_dir, alt_filename), imagem_bin[ay0:ay1, ax0:ax1])
+    debug_image.save(os.path.join(debug_folder, "debug_respostas_boxes.png"))
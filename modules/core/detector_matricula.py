@@ -4,9 +4,10 @@ import cv2
 import numpy as np
 from PIL import Image
 import logging
-import pytesseract
 import re
-from pytesseract import image_to_data, Output
+
+from modules.core.ocr import image_to_string, image_to_data, ocr_mosaico, Output, ALTURA_MAX_MOSAICO
+from modules.core.template_registry import obter_template_matricula
 
 logger = logging.getLogger('DetectorMatricula')
 
@@ -35,6 +36,11 @@ class DetectorMatricula:
             '--psm 10 -c tessedit_char_whitelist=0123456789',
             '--psm 13 -c tessedit_char_whitelist=0123456789',
         ]
+        # Com ocr_mosaico, as variantes de pré-processamento são lidas juntas,
+        # em uma chamada; as configurações acima só são tentadas uma a uma se
+        # o mosaico não encontrar uma matrícula válida
+        self.ocr_mosaico = self.config.get('ocr_mosaico', True)
+        self.tesseract_config_mosaico = '--psm 6 -c tessedit_char_whitelist=0123456789'
         self.min_length = self.config.get('matricula_min_length', 5)
         self.max_length = self.config.get('matricula_max_length', 10)
         self.debug = debug
@@ -57,37 +63,98 @@ class DetectorMatricula:
         return resultado
 
     def extrair_matricula_scaneada(self, imagem, debug_folder=None):
+        imagem_pil, roi_pil, processed_images = self.preparar_variantes(imagem, debug_folder)
+
+        if roi_pil is None:
+            logger.warning("Não foi possível extrair ROI da matrícula. Tentando OCR geral.")
+            return self._ocr_semantico_global(imagem_pil)
+
+        resultados = self.ler_variantes_mosaico(roi_pil, processed_images)
+        if not resultados:
+            resultados = self.ler_variantes_exaustivo(processed_images)
+
+        if resultados:
+            resultados.sort(key=lambda x: x[1], reverse=True)
+            melhor_texto, melhor_confianca = resultados[0]
+            return melhor_texto, melhor_confianca
+
+        return self._ocr_semantico_global(imagem_pil)
+
+    def preparar_variantes(self, imagem, debug_folder=None):
+        """
+        Recorta a ROI da matrícula e gera as variantes de pré-processamento
+        lidas por ler_variantes_mosaico e ler_variantes_exaustivo.
+
+        Returns:
+            Tupla (imagem_pil, roi_pil, variantes): roi_pil é None (e
+            variantes vazia) se a ROI não pôde ser recortada
+        """
         if isinstance(imagem, np.ndarray):
             imagem_pil = Image.fromarray(imagem)
         else:
             imagem_pil = imagem
 
         roi_pil = self._extrair_roi_matricula(imagem_pil, debug_folder)
-
         if roi_pil is None or roi_pil.size[0] < 10:
-            logger.warning("Não foi possível extrair ROI da matrícula. Tentando OCR geral.")
-            return self._ocr_semantico_global(imagem_pil)
+            return imagem_pil, None, []
 
-        processed_images = self._aplicar_tecnicas_pre_processamento(roi_pil)
-        resultados = []
+        processed_images = [
+            (technique, self._aplicar_morfologia_adaptativa(img))
+            for technique, img in self._aplicar_tecnicas_pre_processamento(roi_pil)
+        ]
+        return imagem_pil, roi_pil, processed_images
 
-        for technique, img in processed_images:
-            img_morph = self._aplicar_morfologia_adaptativa(img)
-            for config in self.tesseract_configs:
+    def ler_variantes_mosaico(self, roi_pil, processed_images, votacao=None):
+        """
+        Lê todas as variantes em uma chamada (ocr_mosaico).
+
+        Returns:
+            Lista de (matricula, confianca) válidas; vazia se o mosaico
+            estiver desligado ou a ROI for grande demais para ele
+        """
+        resultados = []
+        if not self.ocr_mosaico or roi_pil.size[1] > ALTURA_MAX_MOSAICO:
+            return resultados
+        try:
+            lidos = ocr_mosaico([img for _, img in processed_images], config=self.tesseract_config_mosaico)
+            for (technique, _), lido in zip(processed_images, lidos):
+                texto = self._corrigir_erros_comuns(lido["texto"])
+                if votacao is not None:
+                    votacao.registrar(texto, f"scanner:{technique}")
+                if texto and self._validar_matricula(texto):
+                    resultados.append((texto, 0.8))
+        except Exception as e:
+            logger.error(f"Erro OCR em mosaico: {e}")
+        return resultados
+
+    def ler_variantes_exaustivo(self, processed_images, votacao=None, configs=None):
+        """
+        Lê cada variante com cada configuração do Tesseract, parando assim
+        que a votação (se dada) for decidida. Cada leitura é registrada na
+        votação com a configuração como marca.
+
+        Args:
+            configs: Configurações na ordem em que são tentadas
+                (padrão: self.tesseract_configs)
+
+        Returns:
+            Lista de (matricula, confianca) válidas
+        """
+        resultados = []
+        for technique, img_morph in processed_images:
+            for config in configs or self.tesseract_configs:
+                if votacao is not None and votacao.decidida:
+                    return resultados
                 try:
-                    texto = pytesseract.image_to_string(img_morph, config=config).strip()
+                    texto = image_to_string(img_morph, config=config).strip()
                     texto = self._corrigir_erros_comuns(texto)
+                    if votacao is not None:
+                        votacao.registrar(texto, f"scanner:{technique}", config)
                     if texto and self._validar_matricula(texto):
                         resultados.append((texto, 0.8))
                 except Exception as e:
                     logger.error(f"Erro OCR {technique}: {e}")
-
-        if resultados:
-            resultados.sort(key=lambda x: x[1], reverse=True)
-            melhor_texto, melhor_confianca = resultados[0]
-            return melhor_texto, melhor_confianca
-
-        return self._ocr_semantico_global(imagem_pil)
+        return resultados
 
     def _ocr_semantico_global(self, imagem_pil):
         dados = image_to_data(imagem_pil, output_type=Output.DICT, lang='por')
@@ -118,9 +185,8 @@ class DetectorMatricula:
         if "matricula_template_path" in self.config:
             try:
                 from modules.core.detector import detectar_area_cabecalho_template, pre_processar_imagem
-                template_path = resource_path(self.config["matricula_template_path"])
-                if os.path.exists(template_path):
-                    template = Image.open(template_path)
+                template = obter_template_matricula(self.config)
+                if template is not None:
                     img_proc = pre_processar_imagem(imagem_pil)
                     pts, score = detectar_area_cabecalho_template(img_proc, template)
                     if score >= self.config.get("matricula_template_threshold", 0.25):
@@ -221,7 +287,7 @@ class DetectorMatricula:
             cv2.imwrite(debug_header, header_roi)
 
         config_tess = "--psm 6"
-        data = pytesseract.image_to_data(header_roi, output_type=pytesseract.Output.DICT, config=config_tess)
+        data = image_to_data(header_roi, output_type=Output.DICT, config=config_tess)
 
         matricula = ""
         for i, word in enumerate(data['text']):
@@ -233,7 +299,7 @@ class DetectorMatricula:
                         break
 
         if not matricula:
-            fallback_text = pytesseract.image_to_string(header_roi, config="--psm 7")
+            fallback_text = image_to_string(header_roi, config="--psm 7")
             fallback_text = fallback_text.replace("\n", " ")
             match = re.search(r'\d{5,}', fallback_text)
             if match:
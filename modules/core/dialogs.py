@@ -10,6 +10,12 @@ from PIL.ImageQt import ImageQt
 from modules.ui.icon_provider import IconProvider
 from modules.ui.modern_widgets import ModernButton
 
+# Texto mostrado para as páginas que o processamento ignorou
+MOTIVOS_IGNORADA = {
+    "em_branco": "Página em branco (ignorada)",
+    "sem_marcacoes": "Nenhuma bolha marcada (OCR dispensado; não exportada)",
+}
+
 class ResultadoDialog(QDialog):
     """Mostra as abas: Resumo e Detalhes (pré-visualização removida)."""
     def __init__(self, resultados, parent=None):
@@ -92,6 +98,14 @@ class ResultadoDialog(QDialog):
                     contagem["Anulada"]+=1
 
         row = 1
+        ignoradas = sum(1 for pagina in self.resultados if pagina.get("Ignorada"))
+        if ignoradas:
+            stats_layout.addWidget(QLabel("Páginas ignoradas:"), row, 0)
+            ignoradas_label = QLabel(str(ignoradas))
+            ignoradas_label.setStyleSheet("font-weight: bold; color: #f5a623; font-size: 16px;")
+            stats_layout.addWidget(ignoradas_label, row, 1)
+            row += 1
+
         for k, v in contagem.items():
             if v > 0:
                 stats_layout.addWidget(QLabel(f"Respostas {k}:"), row, 0)
@@ -140,6 +154,14 @@ class ResultadoDialog(QDialog):
             grp_lay.setContentsMargins(15, 20, 15, 15)
             grp_lay.setSpacing(15)
 
+            if pagina.get("Ignorada"):
+                motivo_label = QLabel(MOTIVOS_IGNORADA.get(pagina["Ignorada"], pagina["Ignorada"]))
+                motivo_label.setStyleSheet("font-weight: bold; color: #f5a623;")
+                grp_lay.addWidget(motivo_label)
+                if not pagina["Respostas"]:
+                    sc_layout.addWidget(grp)
+                    continue
+
             if pagina.get("OCR"):
                 ocr_info = pagina["OCR"]
                 ocr_layout = QFormLayout()
@@ -0,0 +1,223 @@
+import os
+import json
+import math
+import logging
+import argparse
+import tempfile
+import threading
+
+logger = logging.getLogger('GabaritoApp.EstrategiasMatricula')
+
+ARQUIVO_PADRAO = os.path.join(tempfile.gettempdir(), "gabarito_app_cache", "estrategias_matricula.json")
+# Etapas da leitura da matrícula (ver ProcessWorker.extrair_matricula_com_multiplas_estrategias)
+# e custo inicial de cada uma, em segundos; sem histórico, os custos
+# reproduzem a ordem fixa de antes
+ETAPAS_MATRICULA = (
+    "scanner_mosaico",
+    "recortes",
+    "tecnicas_multiplas",
+    "scanner_exaustivo",
+    "semantico",
+    "fallback_avancado",
+)
+CUSTO_INICIAL = {
+    "scanner_mosaico": 0.05,
+    "recortes": 0.1,
+    "tecnicas_multiplas": 0.2,
+    "scanner_exaustivo": 0.5,
+    "semantico": 1.0,
+    "fallback_avancado": 1.5,
+}
+# Peso (em páginas) do custo inicial na média de custo e peso do bônus de
+# exploração: etapas pouco tentadas parecem mais baratas do que o histórico
+# indica, para continuarem sendo experimentadas
+PESO_CUSTO_INICIAL = 1
+EXPLORACAO = 0.5
+
+
+def perfil_matricula(config, tipo_folha):
+    """Chave do perfil das estatísticas: tipo de folha e origem das imagens (scanner ou PDF)."""
+    origem = "scanner" if config.get("scanned_by_printer", False) else "pdf"
+    return f"{tipo_folha}|{origem}"
+
+
+class EstatisticasEstrategias:
+    """
+    Histórico, por perfil (ver perfil_matricula), das tentativas, acertos e
+    tempo de cada etapa da leitura da matrícula e de cada configuração do
+    Tesseract da leitura exaustiva, gravado em JSON entre execuções.
+
+    ordenar() põe as etapas em ordem de custo esperado até um acerto
+    (custo médio / taxa de acerto), com um bônus de exploração à maneira
+    de um bandit UCB, de modo que cada instalação converge para o caminho
+    mais barato para os seus scanners sem deixar de reavaliar os outros.
+    """
+
+    def __init__(self, caminho=ARQUIVO_PADRAO):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._perfis = {}
+        self._alterado = False
+        try:
+            with open(caminho, "r", encoding="utf-8") as f:
+                self._perfis = json.load(f).get("perfis", {})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Estatísticas de estratégias ilegíveis em {caminho}; recomeçando: {e}")
+
+    def _dados(self, perfil, grupo, nome):
+        return self._perfis.setdefault(perfil, {}).setdefault(grupo, {}).setdefault(
+            nome, {"tentativas": 0, "acertos": 0, "segundos": 0.0}
+        )
+
+    def custo_esperado(self, perfil, nome, grupo="etapas", custo_inicial=None):
+        """
+        Custo esperado, em segundos, até um acerto da estratégia (menor é
+        melhor). Estratégias registradas sem tempo ficam com o custo inicial.
+        """
+        with self._lock:
+            grupo_dados = self._perfis.get(perfil, {}).get(grupo, {})
+            total = sum(d["tentativas"] for d in grupo_dados.values())
+            dados = grupo_dados.get(nome, {"tentativas": 0, "acertos": 0, "segundos": 0.0})
+        n = dados["tentativas"]
+        if custo_inicial is None:
+            custo_inicial = CUSTO_INICIAL.get(nome, 1.0)
+        custo = custo_inicial
+        if dados["segundos"]:
+            custo = (dados["segundos"] + custo_inicial * PESO_CUSTO_INICIAL) / (n + PESO_CUSTO_INICIAL)
+        taxa = (dados["acertos"] + 1) / (n + 2)
+        bonus = EXPLORACAO * math.sqrt(math.log(total + 1) / (n + 1))
+        return custo / min(1.0, taxa + bonus)
+
+    def ordenar(self, perfil, nomes, grupo="etapas"):
+        """
+        Ordena as estratégias por custo esperado até um acerto. No empate
+        (sem histórico e com o mesmo custo inicial), mantém a ordem dada.
+        """
+        return sorted(nomes, key=lambda nome: self.custo_esperado(perfil, nome, grupo))
+
+    def registrar(self, perfil, nome, acerto, segundos=0.0, grupo="etapas"):
+        """Registra uma tentativa de uma estratégia em uma página."""
+        with self._lock:
+            dados = self._dados(perfil, grupo, nome)
+            dados["tentativas"] += 1
+            dados["acertos"] += int(bool(acerto))
+            dados["segundos"] += float(segundos)
+            self._alterado = True
+
+    def salvar(self):
+        """Grava o histórico, se houve alteração (escrita atômica)."""
+        with self._lock:
+            if not self._alterado:
+                return
+            conteudo = json.dumps({"perfis": self._perfis}, indent=4, ensure_ascii=False)
+            self._alterado = False
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.caminho)), exist_ok=True)
+            temporario = f"{self.caminho}.{os.getpid()}.tmp"
+            with open(temporario, "w", encoding="utf-8") as f:
+                f.write(conteudo)
+            os.replace(temporario, self.caminho)
+        except OSError as e:
+            logger.warning(f"Não foi possível gravar as estatísticas de estratégias: {e}")
+
+    def limpar(self, perfil=None):
+        """Descarta o histórico de um perfil ou de todos."""
+        with self._lock:
+            if perfil is None:
+                self._perfis.clear()
+            else:
+                self._perfis.pop(perfil, None)
+            self._alterado = True
+
+    def estatisticas(self):
+        """
+        Retorna, por perfil e grupo, as estratégias na ordem em que seriam
+        tentadas, com tentativas, acertos, taxa de acerto, custo médio e
+        custo esperado até um acerto.
+        """
+        with self._lock:
+            perfis = json.loads(json.dumps(self._perfis))
+        resultado = {}
+        for perfil, grupos in perfis.items():
+            resultado[perfil] = {}
+            for grupo, estrategias in grupos.items():
+                linhas = []
+                for nome in self.ordenar(perfil, list(estrategias), grupo):
+                    d = estrategias[nome]
+                    n = d["tentativas"]
+                    linhas.append({
+                        "estrategia": nome,
+                        "tentativas": n,
+                        "acertos": d["acertos"],
+                        "taxa_acerto": d["acertos"] / n if n else 0.0,
+                        "custo_medio": d["segundos"] / n if n else 0.0,
+                        "custo_esperado": self.custo_esperado(perfil, nome, grupo),
+                    })
+                resultado[perfil][grupo] = linhas
+        return resultado
+
+    def relatorio(self):
+        """Texto com as estatísticas de estatisticas(), uma tabela por perfil e grupo."""
+        linhas = []
+        for perfil, grupos in sorted(self.estatisticas().items()):
+            for grupo, estrategias in grupos.items():
+                largura = max(len("estratégia"), *(len(e["estrategia"]) for e in estrategias)) + 2
+                linhas.append(f"Perfil {perfil} - {grupo}")
+                linhas.append(f"  {'estratégia':<{largura}}{'tentativas':>11}{'acertos':>9}{'taxa':>8}{'custo (s)':>11}{'esperado (s)':>14}")
+                for e in estrategias:
+                    linhas.append(
+                        f"  {e['estrategia']:<{largura}}{e['tentativas']:>11}{e['acertos']:>9}{e['taxa_acerto']:>8.0%}"
+                        f"{e['custo_medio']:>11.3f}{e['custo_esperado']:>14.3f}"
+                    )
+                linhas.append("")
+        return "\n".join(linhas) if linhas else "Nenhuma estatística registrada."
+
+
+_instancias = {}
+_instancias_lock = threading.Lock()
+
+
+def obter_estatisticas_estrategias(config):
+    """
+    Retorna a instância compartilhada do histórico configurado em
+    config["matricula_estatisticas_arquivo"], ou None se a ordem adaptativa
+    estiver desligada (config["matricula_ordem_adaptativa"]).
+    """
+    if not config.get("matricula_ordem_adaptativa", True):
+        return None
+    caminho = config.get("matricula_estatisticas_arquivo") or ARQUIVO_PADRAO
+    with _instancias_lock:
+        estatisticas = _instancias.get(caminho)
+        if estatisticas is None:
+            estatisticas = EstatisticasEstrategias(caminho)
+            _instancias[caminho] = estatisticas
+        return estatisticas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Mostra o histórico das estratégias de leitura da matrícula e a ordem em que são tentadas."
+    )
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--json", action="store_true", help="Imprime as estatísticas em JSON")
+    parser.add_argument("--limpar", nargs="?", const="", metavar="PERFIL",
+                        help="Descarta o histórico (de todos os perfis ou só do indicado)")
+    args = parser.parse_args(argv)
+
+    from modules.utils import carregar_configuracoes
+    config = carregar_configuracoes(args.config)
+    estatisticas = EstatisticasEstrategias(config.get("matricula_estatisticas_arquivo") or ARQUIVO_PADRAO)
+    if args.limpar is not None:
+        estatisticas.limpar(args.limpar or None)
+        estatisticas.salvar()
+        print(f"Histórico descartado em {os.path.abspath(estatisticas.caminho)}")
+    elif args.json:
+        print(json.dumps(estatisticas.estatisticas(), indent=4, ensure_ascii=False))
+    else:
+        print(estatisticas.relatorio())
+
+
+if __name__ == "__main__":
+    main()
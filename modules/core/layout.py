@@ -0,0 +1,280 @@
+import json
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger('GabaritoApp.Layout')
+
+# Estado de cada questão nas caixas recortadas para uma página
+ROI_OK = 0
+ROI_INVALIDO = 1
+ROI_FORA = 2
+
+_layouts = {}
+_layouts_lock = threading.Lock()
+
+
+def dtype_layout(num_alternativas):
+    """
+    Tipo estruturado de uma linha do layout compilado:
+    questao (número, a partir de 1), coluna (índice do bloco em grid_rois),
+    caixa (x, y, largura, altura como no config), alternativas
+    (x0, y0, x1, y1 da faixa de cada alternativa), bolhas (x0, y0, x1, y1
+    da bolha impressa; igual à faixa quando o layout não é calibrado) e
+    valida (largura e altura > 0).
+    """
+    return np.dtype([
+        ("questao", np.int32),
+        ("coluna", np.int16),
+        ("caixa", np.int32, (4,)),
+        ("alternativas", np.int32, (num_alternativas, 4)),
+        ("bolhas", np.int32, (num_alternativas, 4)),
+        ("valida", np.bool_),
+    ])
+
+
+def compilar_layout(grid_rois, num_alternativas):
+    """
+    Converte grid_rois (lista de colunas com dicts {x, y, width, height})
+    em um array estruturado somente leitura, uma linha por questão.
+
+    Cada ROI é dividida em num_alternativas faixas verticais de mesma
+    largura; a última absorve o resto.
+    """
+    rois = [(coluna, roi) for coluna, col_rois in enumerate(grid_rois) for roi in col_rois]
+    layout = np.zeros(len(rois), dtype=dtype_layout(num_alternativas))
+    layout["questao"] = np.arange(1, len(rois) + 1)
+    layout["coluna"] = [coluna for coluna, _ in rois]
+    valores = np.array([
+        [roi["x"], roi["y"], roi["width"] or 0, roi["height"] or 0] for _, roi in rois
+    ], dtype=np.int32).reshape(-1, 4)
+    layout["caixa"] = valores
+    x, y, w, h = valores.T
+    layout["valida"] = (w > 0) & (h > 0)
+
+    alt = np.arange(num_alternativas)
+    sub_w = (w // num_alternativas)[:, None]
+    x0 = x[:, None] + alt * sub_w
+    x1 = x[:, None] + np.where(alt < num_alternativas - 1, (alt + 1) * sub_w, w[:, None])
+    y0 = np.broadcast_to(y[:, None], x0.shape)
+    y1 = np.broadcast_to((y + h)[:, None], x0.shape)
+    layout["alternativas"] = np.stack([x0, y0, x1, y1], axis=-1)
+    layout["bolhas"] = layout["alternativas"]
+
+    layout.setflags(write=False)
+    return layout
+
+
+def expandir_layout_parametrico(parametrico, largura=None, altura=None):
+    """
+    Expande um layout paramétrico (gerado por modules.core.calibracao) no
+    mesmo array estruturado de compilar_layout, escalado do quadro de
+    referência (parametrico["largura"] x parametrico["altura"]) para
+    largura x altura.
+
+    A caixa de cada questão cobre as alternativas com meio espaço de
+    margem; as faixas das alternativas têm a largura do passo entre bolhas,
+    centradas em cada bolha.
+    """
+    num_alternativas = parametrico["alternativas"]
+    sx = (largura or parametrico["largura"]) / parametrico["largura"]
+    sy = (altura or parametrico["altura"]) / parametrico["altura"]
+
+    linhas = []
+    for coluna, bloco in enumerate(parametrico["blocos"]):
+        ox, oy = bloco["origem"]
+        bw, bh = bloco["bolha"]
+        passo_coluna = bloco["passo_coluna"]
+        passo_linha = bloco["passo_linha"]
+        margem_x = (passo_coluna - bw) / 2
+        margem_y = (passo_linha - bh) / 4
+        for r in range(bloco["linhas"]):
+            by = oy + r * passo_linha
+            bx = ox + np.arange(num_alternativas) * passo_coluna
+            linhas.append((coluna, ox - margem_x, by - margem_y, num_alternativas * passo_coluna,
+                           bh + 2 * margem_y, bx, by, bw, bh))
+
+    layout = np.zeros(len(linhas), dtype=dtype_layout(num_alternativas))
+    layout["questao"] = np.arange(1, len(linhas) + 1)
+    for q, (coluna, x, y, w, h, bx, by, bw, bh) in enumerate(linhas):
+        layout["coluna"][q] = coluna
+        x0 = x + (bx - bx[0])
+        layout["caixa"][q] = np.rint([x * sx, y * sy, w * sx, h * sy])
+        layout["alternativas"][q] = np.rint(np.stack([
+            x0 * sx, np.full_like(bx, y * sy), (x0 + w / num_alternativas) * sx, np.full_like(bx, (y + h) * sy)
+        ], axis=-1))
+        layout["bolhas"][q] = np.rint(np.stack([
+            bx * sx, np.full_like(bx, by * sy), (bx + bw) * sx, np.full_like(bx, (by + bh) * sy)
+        ], axis=-1))
+    layout["valida"] = (layout["caixa"][:, 2] > 0) & (layout["caixa"][:, 3] > 0)
+
+    layout.setflags(write=False)
+    return layout
+
+
+def extensao_layout(layout):
+    """Retorna (largura, altura) mínimas de uma página que contenha todas as questões válidas."""
+    caixas = layout["caixa"][layout["valida"]]
+    if not len(caixas):
+        return 0, 0
+    return int((caixas[:, 0] + caixas[:, 2]).max()), int((caixas[:, 1] + caixas[:, 3]).max())
+
+
+def cabe_na_pagina(layout, largura, altura):
+    """Indica se todas as questões válidas do layout estão dentro da página."""
+    caixas = layout["caixa"][layout["valida"]]
+    if not len(caixas):
+        return True
+    larg_min, alt_min = extensao_layout(layout)
+    return bool(caixas[:, :2].min() >= 0 and larg_min <= largura and alt_min <= altura)
+
+
+def validar_layout(layout, largura, altura):
+    """
+    Confere o layout contra o tamanho da página e registra um aviso para
+    cada questão que sai dela.
+
+    Returns:
+        Lista com os números das questões fora (total ou parcialmente) da página
+    """
+    x, y, w, h = layout["caixa"].T
+    fora = layout["valida"] & ((x < 0) | (y < 0) | (x + w > largura) | (y + h > altura))
+    questoes = layout["questao"][fora].tolist()
+    if questoes:
+        logger.warning(
+            f"Layout não cabe na página {largura}x{altura}: questões {questoes} "
+            f"(extensão do layout {extensao_layout(layout)})"
+        )
+    return questoes
+
+
+def regiao_layout(layout, largura, altura, margem=0):
+    """
+    Retângulo (x0, y0, x1, y1) que envolve todas as questões válidas, com
+    margem em pixels e recortado à página. Serve para restringir o
+    alinhamento e a binarização à área da grade.
+    """
+    caixas = layout["caixa"][layout["valida"]]
+    if not len(caixas):
+        return 0, 0, largura, altura
+    x0 = max(0, int(caixas[:, 0].min()) - margem)
+    y0 = max(0, int(caixas[:, 1].min()) - margem)
+    x1 = min(largura, int((caixas[:, 0] + caixas[:, 2]).max()) + margem)
+    y1 = min(altura, int((caixas[:, 1] + caixas[:, 3]).max()) + margem)
+    return x0, y0, x1, y1
+
+
+def transladar_layout(layout, dx, dy):
+    """Cópia somente leitura do layout com todas as coordenadas deslocadas de (dx, dy)."""
+    novo = layout.copy()
+    novo["caixa"][:, 0] += dx
+    novo["caixa"][:, 1] += dy
+    for campo in ("alternativas", "bolhas"):
+        novo[campo][..., 0::2] += dx
+        novo[campo][..., 1::2] += dy
+    novo.setflags(write=False)
+    return novo
+
+
+def caixas_na_pagina(layout, altura, largura):
+    """
+    Ajusta as caixas das alternativas aos limites da página.
+
+    Como na leitura original por ROI, a caixa de uma questão que sai da
+    página é empurrada para dentro pela borda esquerda/superior (mantendo
+    a largura e a altura), cortada na borda direita/inferior e dividida de
+    novo em faixas iguais; as caixas dentro da página ficam como no layout.
+
+    Returns:
+        Tupla (caixas, estados): caixas é um array int64 (questões x
+        alternativas x 4) com (x0, y0, x1, y1), zerado nas questões que não
+        podem ser lidas; estados indica ROI_OK, ROI_INVALIDO ou ROI_FORA
+    """
+    caixas = layout["alternativas"].astype(np.int64)
+    x, y, w, h = layout["caixa"].astype(np.int64).T
+    fora = layout["valida"] & ((x < 0) | (y < 0) | (x + w > largura) | (y + h > altura))
+    if fora.any():
+        num_alternativas = caixas.shape[1]
+        x0 = np.maximum(x[fora], 0)
+        y0 = np.maximum(y[fora], 0)
+        w0 = np.minimum(w[fora], largura - x0)
+        h0 = np.minimum(h[fora], altura - y0)
+        alt = np.arange(num_alternativas)
+        sub_w = (np.maximum(w0, 0) // num_alternativas)[:, None]
+        inicio = x0[:, None] + alt * sub_w
+        fim = x0[:, None] + np.where(alt < num_alternativas - 1, (alt + 1) * sub_w, w0[:, None])
+        caixas[fora] = np.stack([
+            inicio, np.broadcast_to(y0[:, None], inicio.shape),
+            fim, np.broadcast_to((y0 + h0)[:, None], inicio.shape),
+        ], axis=-1)
+        logger.debug(f"Questões ajustadas à página {largura}x{altura}: {layout['questao'][fora].tolist()}")
+    estados = np.full(len(layout), ROI_OK, dtype=np.int8)
+    vazia = (caixas[:, -1, 2] <= caixas[:, 0, 0]) | (caixas[:, 0, 3] <= caixas[:, 0, 1])
+    estados[vazia] = ROI_FORA
+    estados[~layout["valida"]] = ROI_INVALIDO
+    caixas[estados != ROI_OK] = 0
+    return caixas, estados
+
+
+def obter_layout(config, n_questoes, num_alternativas, quadro="template"):
+    """
+    Retorna o layout compilado para n_questoes, compilando apenas na
+    primeira chamada para cada (n_questoes, num_alternativas, quadro) e
+    conteúdo das entradas da configuração que definem o layout: uma
+    configuração nova ou recalibrada compila outro.
+
+    No quadro "template" (páginas alinhadas pelo template do gabarito), um
+    layout calibrado em config["layouts_parametricos"] tem prioridade
+    sobre config["grid_rois"]. Se foi calibrado sobre o template, é
+    expandido para a área corrigida (largura_corrigida x altura_corrigida);
+    se foi calibrado sobre a página inteira, fica no quadro da calibração.
+
+    No quadro "marcadores" (páginas alinhadas pelos marcadores fiduciais do
+    preenchedor), só vale um layout calibrado no quadro dos marcadores, em
+    config["layouts_marcadores"], expandido para a área corrigida.
+
+    Returns:
+        Array estruturado (ver dtype_layout) ou None se o layout não existir
+    """
+    if quadro == "marcadores":
+        parametrico = config.get("layouts_marcadores", {}).get(str(n_questoes))
+    else:
+        parametrico = config.get("layouts_parametricos", {}).get(str(n_questoes))
+    grid_rois = None if parametrico or quadro == "marcadores" else config.get("grid_rois", {}).get(str(n_questoes))
+    entradas = json.dumps(
+        [parametrico, grid_rois, config.get("largura_corrigida", 800), config.get("altura_corrigida", 1200)],
+        sort_keys=True
+    )
+    chave = (str(n_questoes), num_alternativas, quadro, entradas)
+    with _layouts_lock:
+        if chave in _layouts:
+            return _layouts[chave]
+    if parametrico:
+        if parametrico["alternativas"] != num_alternativas:
+            logger.warning(
+                f"Layout calibrado de {n_questoes} questões tem {parametrico['alternativas']} "
+                f"alternativas impressas; usando-as em vez de {num_alternativas}"
+            )
+        if parametrico.get("referencia", "template") in ("template", "marcadores"):
+            layout = expandir_layout_parametrico(
+                parametrico, config.get("largura_corrigida", 800), config.get("altura_corrigida", 1200)
+            )
+        else:
+            layout = expandir_layout_parametrico(parametrico)
+    elif not grid_rois:
+        return None
+    else:
+        layout = compilar_layout(grid_rois, num_alternativas)
+    logger.debug(
+        f"Layout de {n_questoes} questões ({quadro}) compilado: {len(layout)} questões, "
+        f"extensão {extensao_layout(layout)}"
+    )
+    with _layouts_lock:
+        _layouts[chave] = layout
+    return layout
+
+
+def limpar_layouts():
+    """Descarta os layouts compilados, liberando a memória."""
+    with _layouts_lock:
+        _layouts.clear()
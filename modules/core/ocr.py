@@ -0,0 +1,388 @@
+import os
+import atexit
+import shutil
+import ctypes
+import ctypes.util
+import logging
+import threading
+import numpy as np
+from PIL import Image
+import pytesseract
+from pytesseract import Output
+from pytesseract.pytesseract import file_to_dict
+
+logger = logging.getLogger('GabaritoApp.OCR')
+
+# Nomes da libtesseract procurados pelo motor em processo (Linux, macOS e
+# a instalação do Windows, que traz a DLL ao lado do tesseract.exe)
+BIBLIOTECAS_TESSERACT = (
+    "libtesseract.so.5",
+    "libtesseract.so.4",
+    "libtesseract.5.dylib",
+    "libtesseract-5.dll",
+    "libtesseract-4.dll",
+)
+PSM_PADRAO = 3
+OEM_PADRAO = 3
+# Resolução que o executável assume para imagens sem DPI (as que o
+# pytesseract grava); usada para os dois motores lerem igual
+DPI_PADRAO = 70
+# Mosaico de recortes lidos em uma única chamada (ocr_mosaico): espaço em
+# branco entre os recortes, como fração da altura do maior deles, e maior
+# altura de um recorte que ainda vale a pena empilhar
+MARGEM_MOSAICO = 0.5
+ALTURA_MAX_MOSAICO = 400
+CABECALHO_TSV = "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext"
+
+_opcoes = {"motor": "auto", "biblioteca": None, "tessdata": None}
+_geracao = 0
+_biblioteca = None
+_biblioteca_lock = threading.Lock()
+_local = threading.local()
+_motores = []
+
+
+def _interpretar_config(config):
+    """
+    Lê as opções de linha de comando usadas com o pytesseract
+    (--psm, --oem, --dpi, -l e -c nome=valor).
+
+    Returns:
+        Tupla (psm, oem, dpi, idioma, variaveis)
+    """
+    psm, oem, dpi, idioma = PSM_PADRAO, OEM_PADRAO, DPI_PADRAO, None
+    variaveis = {}
+    partes = (config or "").split()
+    i = 0
+    while i < len(partes):
+        opcao = partes[i]
+        valor = partes[i + 1] if i + 1 < len(partes) else ""
+        if opcao == "--psm":
+            psm = int(valor)
+        elif opcao == "--oem":
+            oem = int(valor)
+        elif opcao == "--dpi":
+            dpi = int(valor)
+        elif opcao == "-l":
+            idioma = valor
+        elif opcao == "-c" and "=" in valor:
+            nome, _, conteudo = valor.partition("=")
+            variaveis[nome] = conteudo
+        else:
+            i += 1
+            continue
+        i += 2
+    return psm, oem, dpi, idioma, variaveis
+
+
+def _para_array(imagem):
+    """Converte PIL ou NumPy em um array uint8 contíguo em cinza ou RGB, como o pytesseract os enviaria."""
+    if isinstance(imagem, Image.Image):
+        if imagem.mode not in ("L", "RGB"):
+            imagem = imagem.convert("L" if imagem.mode in ("1", "LA", "I", "I;16", "F") else "RGB")
+        arr = np.asarray(imagem)
+    else:
+        arr = np.asarray(imagem)
+        if arr.dtype == np.bool_:
+            arr = arr.astype(np.uint8) * 255
+        elif arr.dtype != np.uint8:
+            arr = np.clip(arr, 0, 255).astype(np.uint8)
+        if arr.ndim == 3 and arr.shape[2] == 4:
+            arr = arr[..., :3]
+        elif arr.ndim == 3 and arr.shape[2] == 1:
+            arr = arr[..., 0]
+    return np.ascontiguousarray(arr)
+
+
+class MotorTesseractProcesso:
+    """Executa o tesseract em um subprocesso a cada chamada (pytesseract)."""
+
+    nome = "processo"
+
+    def image_to_string(self, imagem, lang=None, config=""):
+        return pytesseract.image_to_string(imagem, lang=lang, config=config)
+
+    def image_to_data(self, imagem, lang=None, config="", output_type=Output.STRING):
+        return pytesseract.image_to_data(imagem, lang=lang, config=config, output_type=output_type)
+
+
+class MotorTesseractCapi:
+    """
+    Usa a libtesseract no próprio processo, via ctypes. Mantém uma
+    TessBaseAPI inicializada por (idioma, oem, variáveis -c), então os
+    dados do idioma são carregados uma única vez; o modo de segmentação
+    (--psm) é trocado a cada chamada. Não é thread-safe: cada thread usa o
+    seu motor (ver obter_motor).
+    """
+
+    nome = "capi"
+
+    def __init__(self, lib, tessdata=None):
+        self._lib = lib
+        self._tessdata = tessdata.encode() if tessdata else None
+        self._apis = {}
+
+    def _api(self, idioma, oem, variaveis):
+        chave = (idioma, oem, tuple(sorted(variaveis.items())))
+        api = self._apis.get(chave)
+        if api is None:
+            api = self._lib.TessBaseAPICreate()
+            if self._lib.TessBaseAPIInit2(api, self._tessdata, idioma.encode(), oem) != 0:
+                self._lib.TessBaseAPIDelete(api)
+                raise RuntimeError(f"Falha ao inicializar o Tesseract com o idioma '{idioma}'")
+            for nome, valor in variaveis.items():
+                if not self._lib.TessBaseAPISetVariable(api, nome.encode(), valor.encode()):
+                    logger.warning(f"Variável do Tesseract desconhecida: {nome}")
+            self._apis[chave] = api
+            logger.debug(f"Motor Tesseract inicializado: {idioma}, oem {oem}, {variaveis}")
+        return api
+
+    def _preparar(self, imagem, lang, config):
+        psm, oem, dpi, idioma, variaveis = _interpretar_config(config)
+        api = self._api(lang or idioma or "eng", oem, variaveis)
+        arr = _para_array(imagem)
+        altura, largura = arr.shape[:2]
+        canais = 1 if arr.ndim == 2 else arr.shape[2]
+        self._lib.TessBaseAPISetPageSegMode(api, psm)
+        self._lib.TessBaseAPISetImage(api, arr.ctypes.data, largura, altura, canais, arr.strides[0])
+        self._lib.TessBaseAPISetSourceResolution(api, dpi)
+        return api
+
+    def _texto(self, api, ponteiro):
+        try:
+            return ctypes.string_at(ponteiro).decode("utf-8", "replace") if ponteiro else ""
+        finally:
+            if ponteiro:
+                self._lib.TessDeleteText(ponteiro)
+            self._lib.TessBaseAPIClear(api)
+
+    def image_to_string(self, imagem, lang=None, config=""):
+        api = self._preparar(imagem, lang, config)
+        return self._texto(api, self._lib.TessBaseAPIGetUTF8Text(api))
+
+    def image_to_data(self, imagem, lang=None, config="", output_type=Output.STRING):
+        api = self._preparar(imagem, lang, config)
+        if self._lib.TessBaseAPIRecognize(api, None) != 0:
+            self._lib.TessBaseAPIClear(api)
+            raise RuntimeError("Falha no reconhecimento do Tesseract")
+        tsv = CABECALHO_TSV + "\n" + self._texto(api, self._lib.TessBaseAPIGetTsvText(api, 0))
+        if output_type == Output.DICT:
+            return file_to_dict(tsv, "\t", -1)
+        if output_type == Output.BYTES:
+            return tsv.encode("utf-8")
+        return tsv
+
+    def encerrar(self):
+        for api in self._apis.values():
+            self._lib.TessBaseAPIEnd(api)
+            self._lib.TessBaseAPIDelete(api)
+        self._apis.clear()
+
+
+def _declarar_assinaturas(lib):
+    p, c, i = ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int
+    assinaturas = {
+        "TessVersion": (c, []),
+        "TessBaseAPICreate": (p, []),
+        "TessBaseAPIInit2": (i, [p, c, c, i]),
+        "TessBaseAPISetVariable": (i, [p, c, c]),
+        "TessBaseAPISetPageSegMode": (None, [p, i]),
+        "TessBaseAPISetImage": (None, [p, p, i, i, i, i]),
+        "TessBaseAPISetSourceResolution": (None, [p, i]),
+        "TessBaseAPIRecognize": (i, [p, p]),
+        "TessBaseAPIGetUTF8Text": (p, [p]),
+        "TessBaseAPIGetTsvText": (p, [p, i]),
+        "TessDeleteText": (None, [p]),
+        "TessBaseAPIClear": (None, [p]),
+        "TessBaseAPIEnd": (None, [p]),
+        "TessBaseAPIDelete": (None, [p]),
+    }
+    for nome, (retorno, argumentos) in assinaturas.items():
+        funcao = getattr(lib, nome)
+        funcao.restype = retorno
+        funcao.argtypes = argumentos
+
+
+def _carregar_biblioteca():
+    """
+    Carrega a libtesseract uma única vez por processo: o caminho de
+    configurar_ocr, a pasta do executável do pytesseract (Windows) e os
+    nomes usuais do sistema.
+
+    Returns:
+        Tupla (biblioteca ctypes, pasta tessdata ou None), ou None se não
+        for encontrada
+    """
+    global _biblioteca
+    with _biblioteca_lock:
+        if _biblioteca is not None:
+            return _biblioteca or None
+        candidatos = [_opcoes["biblioteca"]] if _opcoes["biblioteca"] else []
+        executavel = shutil.which(pytesseract.pytesseract.tesseract_cmd)
+        pasta = os.path.dirname(os.path.abspath(executavel)) if executavel else None
+        if pasta:
+            if hasattr(os, "add_dll_directory"):
+                os.add_dll_directory(pasta)
+            candidatos += [os.path.join(pasta, nome) for nome in BIBLIOTECAS_TESSERACT]
+        encontrada = ctypes.util.find_library("tesseract")
+        if encontrada:
+            candidatos.append(encontrada)
+        candidatos += BIBLIOTECAS_TESSERACT
+        for candidato in candidatos:
+            try:
+                lib = ctypes.CDLL(candidato)
+                _declarar_assinaturas(lib)
+            except (OSError, AttributeError):
+                continue
+            versao = lib.TessVersion().decode()
+            if int(versao.split(".")[0]) < 4:
+                continue
+            tessdata = _opcoes["tessdata"] or os.environ.get("TESSDATA_PREFIX")
+            if not tessdata and pasta and os.path.isdir(os.path.join(pasta, "tessdata")):
+                tessdata = os.path.join(pasta, "tessdata")
+            logger.info(f"libtesseract {versao} carregada de {candidato}")
+            _biblioteca = (lib, tessdata)
+            return _biblioteca
+        _biblioteca = False
+        return None
+
+
+def configurar_ocr(config):
+    """
+    Escolhe o motor de OCR a partir da configuração:
+    config["ocr_motor"] ("auto", "capi" ou "processo"),
+    config["tesseract_biblioteca"] (caminho da libtesseract) e
+    config["tessdata_path"]. Os motores já criados nas threads são
+    recriados na próxima chamada.
+    """
+    global _geracao, _biblioteca
+    novas = {
+        "motor": config.get("ocr_motor", "auto"),
+        "biblioteca": config.get("tesseract_biblioteca") or None,
+        "tessdata": config.get("tessdata_path") or None,
+    }
+    if novas != _opcoes:
+        with _biblioteca_lock:
+            if novas["biblioteca"] != _opcoes["biblioteca"] or novas["tessdata"] != _opcoes["tessdata"]:
+                _biblioteca = None
+            _opcoes.update(novas)
+            _geracao += 1
+
+
+def obter_motor():
+    """
+    Retorna o motor de OCR da thread atual, criando-o na primeira chamada:
+    a libtesseract em processo quando disponível ("auto") e o executável
+    via pytesseract caso contrário.
+    """
+    motor = getattr(_local, "motor", None)
+    if motor is not None and _local.geracao == _geracao:
+        return motor
+    if motor in _motores:
+        _motores.remove(motor)
+        motor.encerrar()
+    motor = None
+    if _opcoes["motor"] != "processo":
+        carregada = _carregar_biblioteca()
+        if carregada is not None:
+            motor = MotorTesseractCapi(*carregada)
+        elif _opcoes["motor"] == "capi":
+            logger.warning("libtesseract não encontrada; usando o executável do Tesseract")
+    if motor is None:
+        motor = MotorTesseractProcesso()
+    else:
+        _motores.append(motor)
+    _local.motor = motor
+    _local.geracao = _geracao
+    return motor
+
+
+@atexit.register
+def encerrar_motores():
+    """Libera os motores em processo de todas as threads (chamada na saída)."""
+    while _motores:
+        _motores.pop().encerrar()
+
+
+def image_to_string(imagem, lang=None, config="", output_type=Output.STRING):
+    """Como pytesseract.image_to_string, no motor da thread atual."""
+    texto = obter_motor().image_to_string(imagem, lang=lang, config=config)
+    return texto.encode("utf-8") if output_type == Output.BYTES else texto
+
+
+def image_to_data(imagem, lang=None, config="", output_type=Output.STRING):
+    """Como pytesseract.image_to_data (Output.STRING, BYTES ou DICT), no motor da thread atual."""
+    return obter_motor().image_to_data(imagem, lang=lang, config=config, output_type=output_type)
+
+
+def _cinza(imagem):
+    arr = _para_array(imagem)
+    return arr if arr.ndim == 2 else np.ascontiguousarray(arr.mean(axis=2).astype(np.uint8))
+
+
+def montar_mosaico(imagens, margem=MARGEM_MOSAICO):
+    """
+    Empilha imagens em cinza, uma abaixo da outra e alinhadas à esquerda,
+    separadas por faixas brancas para o Tesseract lê-las como linhas
+    distintas. Recortes de fundo escuro são invertidos: no mosaico, um
+    bloco escuro seria tomado por figura e não por texto.
+
+    Returns:
+        Tupla (mosaico, faixas): faixas tem (y0, y1) de cada imagem no mosaico
+    """
+    cinzas = [_cinza(imagem) for imagem in imagens]
+    cinzas = [255 - c if np.median(c) < 128 else c for c in cinzas]
+    espaco = max(8, int(max(c.shape[0] for c in cinzas) * margem))
+    largura = max(c.shape[1] for c in cinzas) + 2 * espaco
+    altura = sum(c.shape[0] for c in cinzas) + espaco * (len(cinzas) + 1)
+    mosaico = np.full((altura, largura), 255, dtype=np.uint8)
+    faixas = []
+    y = espaco
+    for c in cinzas:
+        mosaico[y:y + c.shape[0], espaco:espaco + c.shape[1]] = c
+        faixas.append((y, y + c.shape[0]))
+        y += c.shape[0] + espaco
+    return mosaico, faixas
+
+
+def ocr_mosaico(imagens, lang=None, config="--psm 6"):
+    """
+    Lê vários recortes pequenos (variantes de pré-processamento de um mesmo
+    recorte, ou recortes de várias páginas) em uma única chamada ao
+    Tesseract: os recortes são empilhados por montar_mosaico e cada palavra
+    reconhecida volta ao recorte em cuja faixa está o seu centro.
+
+    Args:
+        imagens: Lista de imagens PIL ou arrays NumPy
+        lang: Idioma do Tesseract
+        config: Opções do Tesseract; o modo de segmentação deve aceitar
+            várias linhas (--psm 4, 6 ou 11)
+
+    Returns:
+        Lista com um dicionário por imagem: texto (palavras na ordem de
+        leitura, separadas por espaço) e confianca (média das palavras,
+        de 0 a 1; 0.0 sem palavras)
+    """
+    if not imagens:
+        return []
+    mosaico, faixas = montar_mosaico(imagens)
+    dados = image_to_data(mosaico, lang=lang, config=config, output_type=Output.DICT)
+    inicios = np.array([y0 for y0, _ in faixas])
+    palavras = [[] for _ in imagens]
+    for i, texto in enumerate(dados["text"]):
+        texto = str(texto).strip()
+        if dados["level"][i] != 5 or not texto:
+            continue
+        centro = dados["top"][i] + dados["height"][i] / 2
+        indice = int(np.searchsorted(inicios, centro, side="right")) - 1
+        if indice < 0 or centro > faixas[indice][1]:
+            continue
+        palavras[indice].append((texto, max(0.0, float(dados["conf"][i]))))
+    resultados = []
+    for lista in palavras:
+        resultados.append({
+            "texto": " ".join(p[0] for p in lista),
+            "confianca": float(np.mean([p[1] for p in lista])) / 100 if lista else 0.0,
+        })
+    logger.debug(f"OCR em mosaico: {len(imagens)} recortes em uma chamada ({mosaico.shape[1]}x{mosaico.shape[0]})")
+    return resultados
@@ -0,0 +1,221 @@
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+import numpy as np
+
+logger = logging.getLogger('GabaritoApp.PageCache')
+
+DIRETORIO_PADRAO = os.path.join(tempfile.gettempdir(), "gabarito_app_cache", "paginas")
+TAMANHO_MAX_PADRAO_MB = 2048
+
+_hashes_arquivos = {}
+_hashes_lock = threading.Lock()
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def hash_arquivo(path, tamanho_bloco=1 << 20):
+    """
+    Retorna o SHA-256 do conteúdo do arquivo.
+
+    O resultado é memorizado por (caminho, tamanho, mtime), então cada
+    arquivo só é lido uma vez por execução enquanto não for alterado.
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    chave = (path, st.st_size, st.st_mtime_ns)
+    with _hashes_lock:
+        if chave in _hashes_arquivos:
+            return _hashes_arquivos[chave]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b""):
+            h.update(bloco)
+    digest = h.hexdigest()
+
+    with _hashes_lock:
+        _hashes_arquivos[chave] = digest
+    return digest
+
+
+class CachePaginas:
+    """
+    Cache em disco de páginas renderizadas, endereçado pelo conteúdo do
+    arquivo: a chave é (hash do arquivo, página, DPI, receita de
+    pré-processamento). Páginas binarizadas são guardadas com 1 bit por
+    pixel; as demais em escala de cinza comprimida. Quando o tamanho total
+    passa do limite, as entradas acessadas há mais tempo são removidas (LRU).
+    """
+
+    def __init__(self, diretorio=DIRETORIO_PADRAO, tamanho_max_mb=TAMANHO_MAX_PADRAO_MB):
+        self.diretorio = diretorio
+        self.tamanho_max = int(tamanho_max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._entradas = {}
+        self._total_bytes = 0
+        self._acertos = 0
+        self._falhas = 0
+        self._gravacoes = 0
+        self._remocoes = 0
+        os.makedirs(self.diretorio, exist_ok=True)
+        self._indexar()
+
+    def _indexar(self):
+        for raiz, _, arquivos in os.walk(self.diretorio):
+            for nome in arquivos:
+                if not nome.endswith(".npz"):
+                    continue
+                caminho = os.path.join(raiz, nome)
+                try:
+                    st = os.stat(caminho)
+                except OSError:
+                    continue
+                self._entradas[caminho] = [st.st_size, st.st_mtime]
+                self._total_bytes += st.st_size
+
+    def _caminho(self, hash_pdf, pagina, dpi, receita):
+        nome = hashlib.sha256(f"{hash_pdf}:{pagina}:{dpi}:{receita}".encode()).hexdigest()
+        return os.path.join(self.diretorio, nome[:2], f"{nome}.npz")
+
+    def contem(self, hash_pdf, pagina, dpi, receita):
+        """Indica se a página está no cache, sem carregá-la nem alterar as estatísticas."""
+        return os.path.exists(self._caminho(hash_pdf, pagina, dpi, receita))
+
+    def obter(self, hash_pdf, pagina, dpi, receita):
+        """Retorna a página (array uint8) ou None se não estiver no cache."""
+        caminho = self._caminho(hash_pdf, pagina, dpi, receita)
+        try:
+            with np.load(caminho) as dados:
+                forma = tuple(dados["forma"])
+                if bool(dados["binaria"]):
+                    bits = np.unpackbits(dados["dados"], count=forma[0] * forma[1])
+                    img_np = (bits.reshape(forma) * 255).astype(np.uint8)
+                else:
+                    img_np = dados["dados"].reshape(forma)
+        except FileNotFoundError:
+            with self._lock:
+                self._falhas += 1
+            return None
+        except Exception as e:
+            logger.warning(f"Entrada de cache corrompida ({caminho}): {e}")
+            self._remover(caminho)
+            with self._lock:
+                self._falhas += 1
+            return None
+
+        agora = None
+        try:
+            os.utime(caminho)
+            agora = os.stat(caminho).st_mtime
+        except OSError:
+            pass
+        with self._lock:
+            self._acertos += 1
+            if agora is not None and caminho in self._entradas:
+                self._entradas[caminho][1] = agora
+        return img_np
+
+    def gravar(self, hash_pdf, pagina, dpi, receita, img_np, binaria=False):
+        """Grava a página no cache e aplica a remoção LRU se necessário."""
+        caminho = self._caminho(hash_pdf, pagina, dpi, receita)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        if binaria:
+            dados = np.packbits(img_np > 127)
+        else:
+            dados = np.ascontiguousarray(img_np).ravel()
+        temp_path = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                np.savez_compressed(f, dados=dados, forma=np.array(img_np.shape), binaria=np.array(binaria))
+            os.replace(temp_path, caminho)
+            st = os.stat(caminho)
+        except OSError as e:
+            logger.warning(f"Falha ao gravar página no cache: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        with self._lock:
+            anterior = self._entradas.get(caminho)
+            if anterior:
+                self._total_bytes -= anterior[0]
+            self._entradas[caminho] = [st.st_size, st.st_mtime]
+            self._total_bytes += st.st_size
+            self._gravacoes += 1
+            excedeu = self._total_bytes > self.tamanho_max
+        if excedeu:
+            self._aplicar_lru()
+
+    def _aplicar_lru(self):
+        # Libera até 90% do limite para não remover a cada nova gravação
+        with self._lock:
+            alvo = int(self.tamanho_max * 0.9)
+            antigas = sorted(self._entradas.items(), key=lambda item: item[1][1])
+            removiveis = []
+            total = self._total_bytes
+            for caminho, (tamanho, _) in antigas:
+                if total <= alvo:
+                    break
+                removiveis.append(caminho)
+                total -= tamanho
+        for caminho in removiveis:
+            self._remover(caminho)
+
+    def _remover(self, caminho):
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+        with self._lock:
+            entrada = self._entradas.pop(caminho, None)
+            if entrada:
+                self._total_bytes -= entrada[0]
+                self._remocoes += 1
+
+    def limpar(self):
+        """Remove todas as entradas do cache."""
+        for caminho in list(self._entradas):
+            self._remover(caminho)
+
+    def estatisticas(self):
+        """Retorna contadores de uso e ocupação do cache."""
+        with self._lock:
+            consultas = self._acertos + self._falhas
+            return {
+                "diretorio": self.diretorio,
+                "entradas": len(self._entradas),
+                "bytes": self._total_bytes,
+                "tamanho_max_bytes": self.tamanho_max,
+                "acertos": self._acertos,
+                "falhas": self._falhas,
+                "gravacoes": self._gravacoes,
+                "remocoes": self._remocoes,
+                "taxa_acerto": self._acertos / consultas if consultas else 0.0,
+            }
+
+
+def obter_cache_paginas(config=None):
+    """
+    Retorna a instância compartilhada do cache de páginas configurada em
+    config.json (chaves cache_paginas_*), ou None se o cache estiver desativado.
+    """
+    if config is None:
+        from modules.utils import carregar_configuracoes
+        config = carregar_configuracoes()
+    if not config.get("cache_paginas_habilitado", True):
+        return None
+    diretorio = config.get("cache_paginas_diretorio") or DIRETORIO_PADRAO
+    tamanho_max_mb = config.get("cache_paginas_max_mb", TAMANHO_MAX_PADRAO_MB)
+    with _caches_lock:
+        cache = _caches.get(diretorio)
+        if cache is None:
+            try:
+                cache = CachePaginas(diretorio, tamanho_max_mb)
+            except OSError as e:
+                logger.warning(f"Cache de páginas indisponível: {e}")
+                return None
+            _caches[diretorio] = cache
+        return cache
@@ -1,7 +1,15 @@
 import fitz
 import os
 import sys
-from typing import List, Dict
+import uuid
+import logging
+import numpy as np
+from typing import List, Dict, Optional
+
+from modules.core.page_cache import hash_arquivo
+from modules.core.qr_folha import conteudo_qr, matriz_qr
+
+logger = logging.getLogger('GabaritoApp.PDFFiller')
 
 def resource_path(relative_path):
     """
@@ -13,22 +21,132 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
-def preencher_pdf_com_info(modelo_pdf_path: str, dados_alunos: List[Dict], output_path: str):
+# Modelo em que as posições dos marcadores foram medidas, e o seu número
+# de questões (layouts_marcadores do config.json). Em outros modelos eles
+# cairiam sobre o conteúdo, e o leitor não teria layout no quadro deles:
+# não são estampados. O QR é estampado em qualquer modelo (ver posicao_qr).
+MODELO_PADRAO = "modelo_gabarito_base.pdf"
+QUESTOES_MODELO_PADRAO = "26"
+
+# Centros (em pontos) dos marcadores fiduciais, na ordem superior esquerdo,
+# superior direito, inferior direito, inferior esquerdo: nos cantos do
+# cartão-resposta, dentro da moldura e fora dos campos preenchidos.
+MARCADORES_PT = [(45, 394), (550, 394), (550, 801.5), (45, 801.5)]
+LADO_MARCADOR_PT = 14
+
+def desenhar_marcadores(page, posicoes=MARCADORES_PT, lado=LADO_MARCADOR_PT):
+    """
+    Estampa quatro quadrados pretos sólidos na página, usados pelo leitor
+    (detector.detectar_marcadores) para alinhar a folha sem template matching.
+    """
+    meio = lado / 2
+    for x, y in posicoes:
+        page.draw_rect(fitz.Rect(x - meio, y - meio, x + meio, y + meio), color=(0, 0, 0), fill=(0, 0, 0), width=0)
+
+# Centro e lado (em pontos) do QR com a matrícula e os dados da folha: no
+# canto superior direito, ao lado do cabeçalho, onde cabe com módulos de
+# ~2 pt (legíveis em scans de 150 DPI).
+POSICAO_QR_PT = (532, 86)
+LADO_QR_PT = 64
+
+def desenhar_qr(page, texto, centro=POSICAO_QR_PT, lado=LADO_QR_PT):
+    """
+    Estampa um QR com o texto na página, desenhado em vetor (um retângulo
+    por módulo escuro), lido pelo leitor (qr_folha.ler_qr_folha) antes do OCR.
+    """
+    modulos = matriz_qr(texto)
+    passo = lado / modulos.shape[0]
+    x0, y0 = centro[0] - lado / 2, centro[1] - lado / 2
+    for i, j in zip(*modulos.nonzero()):
+        x, y = x0 + j * passo, y0 + i * passo
+        page.draw_rect(fitz.Rect(x, y, x + passo, y + passo), color=None, fill=(0, 0, 0), width=0)
+
+# Papel em branco exigido em volta do QR (uns dois módulos de zona de
+# silêncio), distância mínima da borda da página (área que as impressoras
+# não imprimem) e nível de cinza a partir do qual um pixel conta como papel
+MARGEM_QR_PT = 6
+BORDA_QR_PT = 12
+NIVEL_PAPEL = 240
+
+def posicao_qr(page, lado=LADO_QR_PT, margem=MARGEM_QR_PT, preferida=POSICAO_QR_PT):
+    """
+    Escolhe onde estampar o QR no modelo: em preferida, se ali houver papel
+    em branco (como no modelo padrão), ou no quadrado livre do lado do QR
+    mais a margem mais próximo dela, procurado na página renderizada a
+    72 DPI com uma imagem integral dos pixels de tinta.
+
+    Returns:
+        Centro (x, y) em pontos, ou None se não houver espaço livre
+    """
+    pix = page.get_pixmap(dpi=72, colorspace=fitz.csGRAY, alpha=False)
+    img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+    escala = pix.width / page.rect.width
+    tinta = np.zeros((img.shape[0] + 1, img.shape[1] + 1), dtype=np.int32)
+    tinta[1:, 1:] = (img < NIVEL_PAPEL).cumsum(axis=0).cumsum(axis=1)
+    n = int(np.ceil((lado + 2 * margem) * escala))
+    borda = int(np.ceil(BORDA_QR_PT * escala))
+    if n + 2 * borda > min(img.shape):
+        return None
+    somas = tinta[n:, n:] - tinta[:-n, n:] - tinta[n:, :-n] + tinta[:-n, :-n]
+    livres = np.zeros(somas.shape, dtype=bool)
+    livres[borda:somas.shape[0] - borda, borda:somas.shape[1] - borda] = True
+    livres &= somas == 0
+
+    # Janela de cada centro: o canto superior esquerdo fica meio lado antes
+    x, y = (int(round(c * escala - n / 2)) for c in preferida)
+    if 0 <= y < livres.shape[0] and 0 <= x < livres.shape[1] and livres[y, x]:
+        return preferida
+    ys, xs = np.nonzero(livres)
+    if not len(xs):
+        return None
+    mais_proxima = np.argmin((xs - x) ** 2 + (ys - y) ** 2)
+    return (float((xs[mais_proxima] + n / 2) / escala), float((ys[mais_proxima] + n / 2) / escala))
+
+def eh_modelo_padrao(modelo_pdf_path):
+    """
+    Indica se o modelo tem o mesmo conteúdo de MODELO_PADRAO, o único em
+    que os marcadores podem ser estampados.
+    """
+    padrao = resource_path(MODELO_PADRAO)
+    if not os.path.exists(modelo_pdf_path) or not os.path.exists(padrao):
+        return False
+    return hash_arquivo(modelo_pdf_path) == hash_arquivo(padrao)
+
+def preencher_pdf_com_info(modelo_pdf_path: str, dados_alunos: List[Dict], output_path: str, marcadores: bool = True,
+                           qr: bool = True, layout: Optional[str] = None, lote: Optional[str] = None,
+                           pagina_inicial: int = 1):
     """
     Gera um PDF com uma página para cada aluno, preenchendo suas informações nos locais definidos.
 
     :param modelo_pdf_path: Caminho do PDF base (modelo).
     :param dados_alunos: Lista de dicionários com os dados dos alunos.
     :param output_path: Caminho final para salvar o PDF combinado.
+    :param marcadores: Se True, estampa os marcadores fiduciais de alinhamento (só no modelo padrão).
+    :param qr: Se True, estampa o QR com matrícula, layout, página e lote (ver posicao_qr).
+    :param layout: Número de questões do modelo (10, 20, 30, 40 ou 26), gravado no QR.
+    :param lote: Identificador do lote gravado no QR; gerado se não for informado.
+    :param pagina_inicial: Número, no lote, da primeira página gerada.
     """
     modelo_pdf_path = resource_path(modelo_pdf_path)
 
     if not os.path.exists(modelo_pdf_path):
         raise FileNotFoundError(f"Modelo PDF não encontrado: {modelo_pdf_path}")
 
+    if marcadores and not eh_modelo_padrao(modelo_pdf_path):
+        logger.info(f"Modelo {os.path.basename(modelo_pdf_path)} não é o padrão; marcadores não serão estampados")
+        marcadores = False
+
+    centro_qr = None
+    if qr:
+        with fitz.open(modelo_pdf_path) as modelo:
+            centro_qr = posicao_qr(modelo[0])
+        if centro_qr is None:
+            logger.warning(f"Sem espaço livre para o QR no modelo {os.path.basename(modelo_pdf_path)}; QR não será estampado")
+
     pdf_final = fitz.open()
+    lote = lote or uuid.uuid4().hex[:8]
 
-    for aluno in dados_alunos:
+    for pagina, aluno in enumerate(dados_alunos, start=pagina_inicial):
         doc = fitz.open(modelo_pdf_path)
         page = doc[0]
 
@@ -74,6 +192,12 @@ def preencher_pdf_com_info(modelo_pdf_path: str, dados_alunos: List[Dict], outpu
                     page.insert_text(coordenadas["nasc_a3"], ano[2], fontname=fonte, fontsize=tamanho, color=(0, 0, 0))
                     page.insert_text(coordenadas["nasc_a4"], ano[3], fontname=fonte, fontsize=tamanho, color=(0, 0, 0))
 
+        if marcadores:
+            desenhar_marcadores(page)
+
+        if centro_qr is not None and aluno.get("matricula"):
+            desenhar_qr(page, conteudo_qr(aluno["matricula"], layout, pagina, lote), centro_qr)
+
         pdf_final.insert_pdf(doc)
         doc.close()
 
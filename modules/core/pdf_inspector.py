@@ -0,0 +1,197 @@
+import os
+import hashlib
+import logging
+import threading
+import fitz  # PyMuPDF
+
+from modules.core.page_cache import hash_arquivo
+
+logger = logging.getLogger('GabaritoApp.PDFInspector')
+
+# Estimativa grosseira do pipeline completo (renderização, alinhamento, OMR e OCR)
+SEGUNDOS_POR_MEGAPIXEL_PADRAO = 0.6
+# Fração mínima da página coberta pela imagem para considerá-la um scan
+COBERTURA_MIN_SCAN = 0.9
+
+_inspecoes = {}
+_inspecoes_lock = threading.Lock()
+
+
+def pagina_escaneada(page):
+    """
+    Indica se a página é um scan: uma única imagem embutida, desenhada uma
+    vez e cobrindo (quase) toda a página, sem desenhos ou texto visível por
+    cima. Uma camada de texto invisível de OCR não descaracteriza o scan.
+    """
+    if len(page.get_images(full=True)) != 1:
+        return False
+    area_pagina = abs(page.rect)
+    if not area_pagina:
+        return False
+    infos = page.get_image_info()
+    if len(infos) != 1:
+        return False
+    if abs(fitz.Rect(infos[0]["bbox"]) & page.rect) / area_pagina < COBERTURA_MIN_SCAN:
+        return False
+    return all(tipo in ("fill-image", "ignore-text") for tipo, _ in page.get_bboxlog())
+
+
+def inspecionar_pdf(pdf_path):
+    """
+    Lê apenas os metadados do PDF, sem rasterizar nenhuma página.
+
+    O resultado é memorizado por (caminho, tamanho, mtime).
+
+    Args:
+        pdf_path: Caminho do PDF
+
+    Returns:
+        Dicionário com paginas, tamanhos (em pontos), escaneadas (uma flag por
+        página), tipo ("escaneado", "vetorial" ou "misto") e fingerprint
+        (SHA-256 do conteúdo)
+    """
+    path = os.path.abspath(pdf_path)
+    st = os.stat(path)
+    chave = (path, st.st_size, st.st_mtime_ns)
+    with _inspecoes_lock:
+        if chave in _inspecoes:
+            return _inspecoes[chave]
+
+    tamanhos = []
+    escaneadas = []
+    with fitz.open(path) as pdf_document:
+        for page in pdf_document:
+            tamanhos.append((page.rect.width, page.rect.height))
+            escaneadas.append(pagina_escaneada(page))
+
+    if escaneadas and all(escaneadas):
+        tipo = "escaneado"
+    elif any(escaneadas):
+        tipo = "misto"
+    else:
+        tipo = "vetorial"
+
+    inspecao = {
+        "arquivo": path,
+        "paginas": len(tamanhos),
+        "tamanhos": tamanhos,
+        "escaneadas": escaneadas,
+        "tipo": tipo,
+        "fingerprint": hash_arquivo(path),
+        "bytes_arquivo": st.st_size,
+    }
+    with _inspecoes_lock:
+        _inspecoes[chave] = inspecao
+    return inspecao
+
+
+def inspecionar_arquivo(caminho):
+    """
+    Como inspecionar_pdf, mas aceita também imagens (JPEG/PNG/TIFF
+    multipágina) e pastas de scans, lendo apenas os cabeçalhos. Pastas são
+    memorizadas pelo nome, tamanho e mtime de cada scan.
+    """
+    from modules.core.converter import eh_pdf, listar_imagens_pasta, paginas_imagem
+
+    if eh_pdf(caminho):
+        return inspecionar_pdf(caminho)
+
+    path = os.path.abspath(caminho)
+    if os.path.isdir(path):
+        # O mtime da pasta não muda quando um scan é sobrescrito: a chave
+        # reúne nome, tamanho e mtime de cada arquivo
+        estado = []
+        for arquivo in listar_imagens_pasta(path):
+            st = os.stat(arquivo)
+            estado.append((os.path.basename(arquivo), st.st_size, st.st_mtime_ns))
+        chave = (path, tuple(estado))
+    else:
+        st = os.stat(path)
+        chave = (path, st.st_size, st.st_mtime_ns)
+    with _inspecoes_lock:
+        if chave in _inspecoes:
+            return _inspecoes[chave]
+
+    paginas = paginas_imagem(path)
+    arquivos = sorted({arquivo for arquivo, *_ in paginas})
+    if os.path.isdir(path):
+        h = hashlib.sha256()
+        for arquivo in arquivos:
+            h.update(f"{os.path.basename(arquivo)}:{hash_arquivo(arquivo)}".encode())
+        fingerprint = h.hexdigest()
+    else:
+        fingerprint = hash_arquivo(path)
+
+    inspecao = {
+        "arquivo": path,
+        "paginas": len(paginas),
+        "tamanhos": [(w * 72 / dpi, h * 72 / dpi) for _, _, w, h, dpi in paginas],
+        "escaneadas": [True] * len(paginas),
+        "tipo": "escaneado",
+        "fingerprint": fingerprint,
+        "bytes_arquivo": sum(os.path.getsize(arquivo) for arquivo in arquivos),
+    }
+    with _inspecoes_lock:
+        _inspecoes[chave] = inspecao
+    return inspecao
+
+
+def estimar_custo(inspecao, dpi, segundos_por_megapixel=SEGUNDOS_POR_MEGAPIXEL_PADRAO):
+    """
+    Estima o custo de processar um PDF inspecionado na resolução dada.
+
+    Returns:
+        Dicionário com megapixels totais, bytes da maior página em escala
+        de cinza e tempo estimado em segundos
+    """
+    escala = dpi / 72
+    pixels = [int(w * escala) * int(h * escala) for w, h in inspecao["tamanhos"]]
+    megapixels = sum(pixels) / 1e6
+    return {
+        "paginas": inspecao["paginas"],
+        "megapixels": megapixels,
+        "bytes_maior_pagina": max(pixels, default=0),
+        "tempo_estimado_s": megapixels * segundos_por_megapixel,
+    }
+
+
+def estimar_lote(pdf_paths, dpi, paginas_em_memoria=8, segundos_por_megapixel=SEGUNDOS_POR_MEGAPIXEL_PADRAO):
+    """
+    Inspeciona vários PDFs (ou imagens/pastas de scans) e soma as
+    estimativas de custo do lote.
+
+    Args:
+        pdf_paths: Lista de caminhos de PDF, imagem ou pasta
+        dpi: Resolução de processamento
+        paginas_em_memoria: Quantas páginas podem estar em memória ao mesmo tempo
+        segundos_por_megapixel: Coeficiente de tempo do pipeline
+
+    Returns:
+        Dicionário com totais de páginas, megapixels, tempo estimado, pico de
+        memória estimado, contagem por tipo de PDF e os arquivos que falharam
+    """
+    lote = {
+        "arquivos": len(pdf_paths),
+        "paginas": 0,
+        "megapixels": 0.0,
+        "tempo_estimado_s": 0.0,
+        "memoria_pico_bytes": 0,
+        "tipos": {"escaneado": 0, "vetorial": 0, "misto": 0},
+        "falhas": [],
+    }
+    maior_pagina = 0
+    for pdf_path in pdf_paths:
+        try:
+            inspecao = inspecionar_arquivo(pdf_path)
+        except Exception as e:
+            logger.warning(f"Falha ao inspecionar '{pdf_path}': {e}")
+            lote["falhas"].append(pdf_path)
+            continue
+        custo = estimar_custo(inspecao, dpi, segundos_por_megapixel)
+        lote["paginas"] += custo["paginas"]
+        lote["megapixels"] += custo["megapixels"]
+        lote["tempo_estimado_s"] += custo["tempo_estimado_s"]
+        lote["tipos"][inspecao["tipo"]] += 1
+        maior_pagina = max(maior_pagina, custo["bytes_maior_pagina"])
+    lote["memoria_pico_bytes"] = maior_pagina * paginas_em_memoria
+    return lote
@@ -0,0 +1,140 @@
+import logging
+import threading
+import cv2
+import numpy as np
+
+logger = logging.getLogger('GabaritoApp.QrFolha')
+
+# Identifica o formato do conteúdo do QR estampado por pdf_filler
+PREFIXO_QR = "GAB1"
+CAMPOS_QR = {"M": "matricula", "L": "layout", "P": "pagina", "B": "lote"}
+# Largura mínima da página reduzida em que o QR é procurado (~150 DPI em
+# A4): os módulos ainda têm alguns pixels e a busca custa bem menos que o OCR
+LARGURA_LEITURA_QR = 1240
+# Margem (fração do lado do QR) e ampliação do recorte lido de novo quando
+# o QR é localizado na página reduzida mas não decodificado
+MARGEM_RECORTE_QR = 0.25
+AMPLIACAO_RECORTE_QR = 2
+
+_local = threading.local()
+
+
+def conteudo_qr(matricula, layout=None, pagina=None, lote=None):
+    """
+    Monta o texto do QR de uma folha: "GAB1;M=<matricula>;L=<layout>;
+    P=<página>;B=<lote>", sem os campos vazios.
+    """
+    valores = {"M": matricula, "L": layout, "P": pagina, "B": lote}
+    partes = [PREFIXO_QR] + [f"{campo}={valor}" for campo, valor in valores.items() if valor not in (None, "")]
+    return ";".join(partes)
+
+
+def interpretar_qr(texto):
+    """
+    Lê o texto de um QR gerado por conteudo_qr.
+
+    Returns:
+        Dicionário com matricula, layout, pagina e lote (os ausentes
+        ficam None), ou None se o texto não for de uma folha
+    """
+    partes = (texto or "").split(";")
+    if partes[0] != PREFIXO_QR:
+        return None
+    dados = dict.fromkeys(CAMPOS_QR.values())
+    for parte in partes[1:]:
+        campo, _, valor = parte.partition("=")
+        if campo in CAMPOS_QR and valor:
+            dados[CAMPOS_QR[campo]] = valor
+    if dados["pagina"] is not None:
+        dados["pagina"] = int(dados["pagina"]) if dados["pagina"].isdigit() else None
+    return dados
+
+
+def matriz_qr(texto):
+    """
+    Codifica texto em um QR (correção de erros nível M).
+
+    Returns:
+        Array bool (módulos x módulos), True nos módulos escuros, sem a
+        zona de silêncio
+    """
+    parametros = cv2.QRCodeEncoder.Params()
+    parametros.correction_level = cv2.QRCodeEncoder_CORRECT_LEVEL_M
+    img = cv2.QRCodeEncoder.create(parametros).encode(texto)
+    escuros = img < 128
+    linhas = np.flatnonzero(escuros.any(axis=1))
+    colunas = np.flatnonzero(escuros.any(axis=0))
+    return escuros[linhas[0]:linhas[-1] + 1, colunas[0]:colunas[-1] + 1]
+
+
+def _detector():
+    # O detector baseado em ArUco localiza os padrões de posição com mais
+    # robustez que o clássico em módulos pequenos; um por thread
+    detector = getattr(_local, "detector", None)
+    if detector is None:
+        detector = cv2.QRCodeDetectorAruco()
+        _local.detector = detector
+    return detector
+
+
+def _decodificar(imagem):
+    """Retorna (texto, cantos) do QR da imagem; texto vazio se não decodificado."""
+    try:
+        texto, pontos, _ = _detector().detectAndDecode(imagem)
+    except cv2.error as e:
+        logger.debug(f"Falha na leitura do QR: {e}")
+        return "", None
+    return texto, None if pontos is None else pontos.reshape(-1, 2)
+
+
+def ler_qr_folha(imagem, largura=LARGURA_LEITURA_QR):
+    """
+    Procura o QR de uma folha na página reduzida.
+
+    Se o QR é localizado mas não decodificado (módulos de poucos pixels,
+    deformados pela binarização da conversão), a região é recortada da
+    página original, ampliada e lida de novo.
+
+    Args:
+        imagem: Página em cinza (array uint8)
+        largura: Largura (lado menor) mínima da página reduzida em que o
+            QR é procurado
+
+    Returns:
+        Tupla (dados, rotacao): dados como em interpretar_qr (None se não
+        houver QR de folha) e rotacao, o número de giros de 90 graus a
+        aplicar com np.rot90 para pôr a página de pé (0 sem QR)
+    """
+    # Redução só por fator inteiro: fatores fracionários borram as bordas
+    # dos módulos e o QR deixa de ser lido
+    divisor = max(1, min(imagem.shape[:2]) // largura)
+    reduzida = imagem
+    if divisor > 1:
+        reduzida = cv2.resize(imagem, None, fx=1 / divisor, fy=1 / divisor, interpolation=cv2.INTER_AREA)
+    texto, pontos = _decodificar(reduzida)
+    if pontos is None:
+        return None, 0
+    pontos = pontos * divisor
+    if not texto:
+        x0, y0 = pontos.min(axis=0)
+        x1, y1 = pontos.max(axis=0)
+        margem = (x1 - x0) * MARGEM_RECORTE_QR
+        x0, y0 = int(max(0, x0 - margem)), int(max(0, y0 - margem))
+        recorte = imagem[y0:int(y1 + margem), x0:int(x1 + margem)]
+        if recorte.size:
+            ampliado = cv2.resize(recorte, None, fx=AMPLIACAO_RECORTE_QR, fy=AMPLIACAO_RECORTE_QR,
+                                  interpolation=cv2.INTER_LINEAR)
+            texto, pontos_recorte = _decodificar(ampliado)
+            if texto and pontos_recorte is not None:
+                pontos = pontos_recorte / AMPLIACAO_RECORTE_QR
+    dados = interpretar_qr(texto) if texto else None
+    if dados is None:
+        return None, 0
+    # A borda superior do QR (do primeiro ao segundo canto) aponta para a
+    # direita na página de pé
+    dx, dy = pontos[1] - pontos[0]
+    if abs(dx) >= abs(dy):
+        rotacao = 0 if dx > 0 else 2
+    else:
+        rotacao = 1 if dy > 0 else 3
+    return dados, rotacao
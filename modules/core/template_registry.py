@@ -0,0 +1,264 @@
+import os
+import sys
+import logging
+import threading
+import cv2
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger('GabaritoApp.TemplateRegistry')
+
+# Mesmo valor usado pela busca piramidal em detector.py
+TAMANHO_TEMPLATE_GROSSO = 96
+# Maior lado da cópia reduzida do template usada no alinhamento por
+# características (ORB) e número máximo de pontos extraídos dela
+LADO_TEMPLATE_CARACTERISTICAS = 900
+MAX_PONTOS_TEMPLATE = 2000
+# Lado (na cópia reduzida) das janelas usadas para verificar um alinhamento
+LADO_JANELA_VERIFICACAO = 48
+# Largura da página reduzida usada para classificar o tipo de folha e
+# larguras do template, como fração dela, em que ele é procurado
+LARGURA_CLASSIFICACAO = 160
+PROPORCOES_CLASSIFICACAO = (0.75, 0.8, 0.85, 0.9, 0.95)
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def resource_path(relative_path):
+    """
+    Retorna o caminho absoluto para recursos, considerando o bundle do PyInstaller.
+    """
+    try:
+        base_path = sys._MEIPASS
+    except Exception:
+        base_path = os.path.abspath(".")
+    return os.path.join(base_path, relative_path)
+
+
+def _resolver_caminho(caminho):
+    if os.path.exists(caminho):
+        return os.path.abspath(caminho)
+    return resource_path(caminho)
+
+
+def _somente_leitura(arr):
+    arr.setflags(write=False)
+    return arr
+
+
+def janelas_verificacao(reduzido, referencia=None, lado=LADO_JANELA_VERIFICACAO, celulas=4, por_celula=3, limiar=0.7):
+    """
+    Escolhe janelas de textura forte espalhadas por uma grade celulas x
+    celulas sobre o template reduzido (uma por célula, no máximo, sem
+    sobreposição). Espalhadas assim, poucas
+    janelas bastam para perceber deslocamento, rotação ou escala errados.
+
+    Args:
+        reduzido: Template reduzido (caracteristicas["reduzido"])
+        referencia: Página já alinhada e retificada no quadro do template
+            reduzido; se dada, só ficam as janelas em que a página confere
+            com o template (regiões que o template tem e a folha não são
+            descartadas)
+        lado: Lado das janelas
+        celulas: Divisões da grade em cada direção
+        por_celula: Candidatas avaliadas em cada célula
+        limiar: Correlação mínima com a referência
+
+    Returns:
+        Array int32 (n x 4) com x, y, largura e altura de cada janela
+    """
+    altura, largura = reduzido.shape
+    if altura < celulas * lado or largura < celulas * lado:
+        return np.zeros((0, 4), dtype=np.int32)
+    gx = cv2.Sobel(reduzido, cv2.CV_32F, 1, 0)
+    gy = cv2.Sobel(reduzido, cv2.CV_32F, 0, 1)
+    energia = cv2.boxFilter(np.abs(gx) + np.abs(gy), -1, (lado, lado), normalize=True)
+    meio = lado // 2
+    janelas = []
+    for linha in range(celulas):
+        for coluna in range(celulas):
+            y0, y1 = max(meio, altura * linha // celulas), min(altura - lado + meio, altura * (linha + 1) // celulas)
+            x0, x1 = max(meio, largura * coluna // celulas), min(largura - lado + meio, largura * (coluna + 1) // celulas)
+            celula = energia[y0:y1, x0:x1].copy()
+            melhor = None
+            for _ in range(por_celula):
+                cy, cx = np.unravel_index(np.argmax(celula), celula.shape)
+                x, y = x0 + cx - meio, y0 + cy - meio
+                celula[max(0, cy - lado):cy + lado, max(0, cx - lado):cx + lado] = -1
+                janela = reduzido[y:y + lado, x:x + lado]
+                if janela.std() < 8:
+                    break
+                if any(abs(x - jx) < lado and abs(y - jy) < lado for jx, jy, _, _ in janelas):
+                    continue
+                if referencia is None:
+                    melhor = (x, y)
+                    break
+                regiao = referencia[max(0, y - 2):y + lado + 2, max(0, x - 2):x + lado + 2]
+                if regiao.shape[0] < lado or regiao.shape[1] < lado:
+                    continue
+                valor = cv2.minMaxLoc(cv2.matchTemplate(regiao, janela, cv2.TM_CCOEFF_NORMED))[1]
+                if valor >= limiar and (melhor is None or valor > melhor[2]):
+                    melhor = (x, y, valor)
+            if melhor is not None:
+                janelas.append((melhor[0], melhor[1], lado, lado))
+    return np.array(janelas, dtype=np.int32).reshape(-1, 4)
+
+
+def extrair_caracteristicas(cinza, lado=LADO_TEMPLATE_CARACTERISTICAS, max_pontos=MAX_PONTOS_TEMPLATE):
+    """
+    Extrai pontos e descritores ORB de uma cópia reduzida da imagem.
+
+    Returns:
+        Dicionário com pontos (array n x 2, em coordenadas da imagem
+        original), descritores (n x 32, uint8), reduzido (a cópia em que os
+        pontos foram extraídos), janelas (ver janelas_verificacao) e fator
+        de redução
+    """
+    fator = min(1.0, lado / max(cinza.shape))
+    reduzido = cinza if fator == 1.0 else cv2.resize(cinza, None, fx=fator, fy=fator, interpolation=cv2.INTER_AREA)
+    orb = cv2.ORB_create(nfeatures=max_pontos, fastThreshold=10)
+    kps, descritores = orb.detectAndCompute(reduzido, None)
+    pontos = np.array([kp.pt for kp in kps], dtype=np.float32).reshape(-1, 2) / fator
+    if descritores is None:
+        descritores = np.zeros((0, 32), dtype=np.uint8)
+    return {
+        "pontos": _somente_leitura(pontos),
+        "descritores": _somente_leitura(descritores),
+        "reduzido": _somente_leitura(np.ascontiguousarray(reduzido)),
+        "janelas": _somente_leitura(janelas_verificacao(reduzido)),
+        "fator": fator,
+    }
+
+
+def miniaturas_classificacao(cinza, largura=LARGURA_CLASSIFICACAO, proporcoes=PROPORCOES_CLASSIFICACAO):
+    """
+    Reduz o template a cada uma das proporções da largura da página
+    reduzida, para a classificação do tipo de folha.
+
+    Returns:
+        Lista de arrays uint8, um por proporção
+    """
+    miniaturas = []
+    for proporcao in proporcoes:
+        tw = max(1, int(largura * proporcao))
+        th = max(1, int(round(cinza.shape[0] * tw / cinza.shape[1])))
+        miniaturas.append(_somente_leitura(cv2.resize(cinza, (tw, th), interpolation=cv2.INTER_AREA)))
+    return miniaturas
+
+
+def carregar_template(caminho):
+    """
+    Carrega um template uma única vez por processo e pré-calcula as versões
+    usadas pelos detectores.
+
+    Os arrays devolvidos são somente leitura e compartilhados entre todas as
+    chamadas; quem precisar alterá-los deve fazer uma cópia.
+
+    Args:
+        caminho: Caminho do template (relativo ao app ou absoluto)
+
+    Returns:
+        Dicionário com caminho, cinza (array uint8), fator de redução,
+        grosso (nível reduzido da pirâmide, ou None se o template já é
+        pequeno), caracteristicas (ver extrair_caracteristicas) e
+        miniaturas (ver miniaturas_classificacao), ou None se o arquivo não
+        existir
+    """
+    path = _resolver_caminho(caminho)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        logger.warning(f"Template não encontrado: {caminho}")
+        return None
+    chave = (path, mtime)
+    with _templates_lock:
+        if chave in _templates:
+            return _templates[chave]
+
+    with Image.open(path) as img:
+        cinza = np.array(img.convert("L"))
+    fator = min(cinza.shape) / TAMANHO_TEMPLATE_GROSSO
+    grosso = None
+    if fator >= 2:
+        grosso = cv2.resize(cinza, None, fx=1 / fator, fy=1 / fator, interpolation=cv2.INTER_AREA)
+        _somente_leitura(grosso)
+
+    template = {
+        "caminho": path,
+        "cinza": _somente_leitura(cinza),
+        "fator": fator,
+        "grosso": grosso,
+        "caracteristicas": extrair_caracteristicas(cinza),
+        "miniaturas": miniaturas_classificacao(cinza),
+    }
+    with _templates_lock:
+        _templates[chave] = template
+    logger.debug(
+        f"Template carregado: {path} ({cinza.shape[1]}x{cinza.shape[0]}, "
+        f"{len(template['caracteristicas']['pontos'])} pontos ORB)"
+    )
+    return template
+
+
+def obter_template_gabarito(config, n_questoes=None):
+    """
+    Retorna o template do gabarito para o layout selecionado.
+
+    Usa config["template_path_atual"] (definido pela interface) quando
+    presente; caso contrário procura n_questoes em config["template_path"],
+    que pode ser um dicionário por número de questões ou um caminho único.
+    """
+    caminho = config.get("template_path_atual")
+    if not caminho:
+        caminhos = config.get("template_path")
+        if isinstance(caminhos, dict):
+            caminho = caminhos.get(str(n_questoes)) if n_questoes is not None else None
+        else:
+            caminho = caminhos
+    if not caminho:
+        return None
+    return carregar_template(caminho)
+
+
+def obter_templates_gabarito(config):
+    """
+    Retorna todos os templates de gabarito de config["template_path"] que
+    existem, por número de questões (as chaves do dicionário). Com um
+    caminho único, não há entre o que escolher e o resultado é vazio.
+    """
+    caminhos = config.get("template_path")
+    if not isinstance(caminhos, dict):
+        return {}
+    templates = {}
+    for chave, caminho in caminhos.items():
+        template = carregar_template(caminho) if caminho else None
+        if template is not None:
+            templates[chave] = template
+    return templates
+
+
+def obter_template_matricula(config):
+    """Retorna o template do cabeçalho da matrícula (config["matricula_template_path"])."""
+    caminho = config.get("matricula_template_path")
+    if not caminho:
+        return None
+    return carregar_template(caminho)
+
+
+def precarregar_templates(config):
+    """
+    Carrega todos os templates listados na configuração, ignorando os que
+    não existem. Útil para pagar o custo de leitura antes do processamento.
+    """
+    caminhos = config.get("template_path", {})
+    if isinstance(caminhos, dict):
+        caminhos = list(caminhos.values())
+    else:
+        caminhos = [caminhos]
+    caminhos.append(config.get("matricula_template_path"))
+    carregados = []
+    for caminho in caminhos:
+        if caminho and carregar_template(caminho) is not None:
+            carregados.append(caminho)
+    return carregados
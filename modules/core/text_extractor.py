@@ -1,14 +1,18 @@
 import os
 import cv2
 import numpy as np
-import pytesseract
 import re
 import logging
 from PIL import Image
 from scipy import ndimage
 
+from modules.core.ocr import image_to_string, ocr_mosaico, Output, ALTURA_MAX_MOSAICO
+
 logger = logging.getLogger('GabaritoApp.TextExtractor')
 
+# Configuração do Tesseract para ler recortes de matrícula empilhados em mosaico
+CONFIG_MOSAICO_MATRICULA = r'--psm 6 -c tessedit_char_whitelist=0123456789'
+
 def pre_processar_imagem_ocr(imagem_pil, equalizar=True, remover_ruido=True, binarizar=True):
     """
     Pré-processa a imagem para melhorar a extração de texto via OCR.
@@ -136,7 +140,7 @@ def extrair_texto_roi(imagem_pil, roi, pre_processar=True, config=''):
     if pre_processar:
         roi_img = pre_processar_imagem_ocr(roi_img)
     
-    texto = pytesseract.image_to_string(roi_img, config=config).strip()
+    texto = image_to_string(roi_img, config=config).strip()
     return texto
 
 def extrair_matricula(imagem_pil, roi=None, pre_processar=True):
@@ -173,13 +177,13 @@ def extrair_matricula(imagem_pil, roi=None, pre_processar=True):
     
     config = r'--psm 7 -c tessedit_char_whitelist=0123456789'
     
-    matricula = pytesseract.image_to_string(roi_img, config=config).strip()
+    matricula = image_to_string(roi_img, config=config).strip()
     
     matricula = ''.join(c for c in matricula if c.isdigit())
     
     return matricula
 
-def extrair_matricula_avancado(imagem_pil, roi=None, pre_processar=True, tentativas_multiplas=True, debug_folder=None):
+def extrair_matricula_avancado(imagem_pil, roi=None, pre_processar=True, tentativas_multiplas=True, debug_folder=None, mosaico=False, votacao=None):
     """
     Extrai o número de matrícula de uma imagem com técnicas avançadas.
     
@@ -189,6 +193,10 @@ def extrair_matricula_avancado(imagem_pil, roi=None, pre_processar=True, tentati
         pre_processar: Se True, aplica pré-processamento
         tentativas_multiplas: Se True, tenta várias configurações de OCR
         debug_folder: Pasta para salvar imagens de debug
+        mosaico: Se True, lê todas as variantes em uma única chamada
+            (ocr_mosaico) em vez de uma chamada por variante
+        votacao: VotacaoMatricula que recebe cada leitura; as leituras uma
+            a uma param quando ela é decidida
         
     Returns:
         Número de matrícula extraído
@@ -199,54 +207,32 @@ def extrair_matricula_avancado(imagem_pil, roi=None, pre_processar=True, tentati
         roi_img = imagem_pil
     
     resultados = []
+    config = r'--psm 7 -c tessedit_char_whitelist=0123456789'
     
     if pre_processar:
         roi_proc = pre_processar_imagem_ocr_avancado(roi_img)
         
         if debug_folder:
             roi_proc.save(os.path.join(debug_folder, "matricula_proc_padrao.png"))
-        config = r'--psm 7 -c tessedit_char_whitelist=0123456789'
-        
-        matricula = pytesseract.image_to_string(roi_proc, config=config).strip()
-        matricula = ''.join(c for c in matricula if c.isdigit())
-        
-        if matricula.isdigit() and len(matricula) >= 5:
-            return matricula
-        
-        resultados.append(matricula)
         
+        # A invertida conta como a mesma fonte da padrão na votação: o
+        # Tesseract (e o mosaico) já tentam a polaridade oposta
+        variantes = [("padrao", roi_proc)]
         if tentativas_multiplas:
             roi_inv = Image.fromarray(255 - np.array(roi_proc))
             if debug_folder:
                 roi_inv.save(os.path.join(debug_folder, "matricula_invertida.png"))
             
-            matricula = pytesseract.image_to_string(roi_inv, config=config).strip()
-            matricula = ''.join(c for c in matricula if c.isdigit())
-            resultados.append(matricula)
-            
             roi_np = np.array(roi_proc)
             kernel = np.ones((2, 2), np.uint8)
             roi_dilated = cv2.dilate(roi_np, kernel, iterations=1)
             if debug_folder:
                 cv2.imwrite(os.path.join(debug_folder, "matricula_dilatada.png"), roi_dilated)
             
-            matricula = pytesseract.image_to_string(Image.fromarray(roi_dilated), config=config).strip()
-            matricula = ''.join(c for c in matricula if c.isdigit())
-            resultados.append(matricula)
-            
             roi_eroded = cv2.erode(roi_np, kernel, iterations=1)
             if debug_folder:
                 cv2.imwrite(os.path.join(debug_folder, "matricula_erodida.png"), roi_eroded)
             
-            matricula = pytesseract.image_to_string(Image.fromarray(roi_eroded), config=config).strip()
-            matricula = ''.join(c for c in matricula if c.isdigit())
-            resultados.append(matricula)
-            
-            config_alt = r'--psm 8 -c tessedit_char_whitelist=0123456789'
-            matricula = pytesseract.image_to_string(roi_proc, config=config_alt).strip()
-            matricula = ''.join(c for c in matricula if c.isdigit())
-            resultados.append(matricula)
-            
             roi_gray = np.array(roi_img.convert("L"))
             clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(4, 4))
             roi_clahe = clahe.apply(roi_gray)
@@ -254,11 +240,6 @@ def extrair_matricula_avancado(imagem_pil, roi=None, pre_processar=True, tentati
             if debug_folder:
                 cv2.imwrite(os.path.join(debug_folder, "matricula_clahe_agressivo.png"), roi_bin)
             
-            matricula = pytesseract.image_to_string(Image.fromarray(roi_bin), config=config).strip()
-            matricula = ''.join(c for c in matricula if c.isdigit())
-            resultados.append(matricula)
-            
-            roi_gray = np.array(roi_img.convert("L"))
             roi_bilateral = cv2.bilateralFilter(roi_gray, 11, 17, 17)
             roi_adapt = cv2.adaptiveThreshold(
                 roi_bilateral, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
@@ -267,13 +248,42 @@ def extrair_matricula_avancado(imagem_pil, roi=None, pre_processar=True, tentati
             if debug_folder:
                 cv2.imwrite(os.path.join(debug_folder, "matricula_bilateral_adapt.png"), roi_adapt)
             
-            matricula = pytesseract.image_to_string(Image.fromarray(roi_adapt), config=config).strip()
-            matricula = ''.join(c for c in matricula if c.isdigit())
-            resultados.append(matricula)
+            variantes += [
+                ("padrao", roi_inv), ("dilatada", roi_dilated), ("erodida", roi_eroded),
+                ("clahe", roi_bin), ("bilateral", roi_adapt),
+            ]
+        
+        if mosaico and roi_img.size[1] <= ALTURA_MAX_MOSAICO:
+            lidos = ocr_mosaico([v for _, v in variantes], config=CONFIG_MOSAICO_MATRICULA)
+            for (nome, _), lido in zip(variantes, lidos):
+                resultados.append(''.join(c for c in lido["texto"] if c.isdigit()))
+                if votacao is not None:
+                    votacao.registrar(resultados[-1], f"avancado:{nome}")
+            if len(resultados[0]) >= 5:
+                return resultados[0]
+        else:
+            tentativas = [(nome, v, config) for nome, v in variantes]
+            if tentativas_multiplas:
+                tentativas.insert(4, ("padrao", roi_proc, r'--psm 8 -c tessedit_char_whitelist=0123456789'))
+            for nome, variante, config_tess in tentativas:
+                if votacao is not None and votacao.decidida:
+                    break
+                if isinstance(variante, np.ndarray):
+                    variante = Image.fromarray(variante)
+                matricula = image_to_string(variante, config=config_tess).strip()
+                matricula = ''.join(c for c in matricula if c.isdigit())
+                if votacao is not None:
+                    votacao.registrar(matricula, f"avancado:{nome}")
+                
+                if not resultados and matricula.isdigit() and len(matricula) >= 5:
+                    return matricula
+                
+                resultados.append(matricula)
     else:
-        config = r'--psm 7 -c tessedit_char_whitelist=0123456789'
-        matricula = pytesseract.image_to_string(roi_img, config=config).strip()
+        matricula = image_to_string(roi_img, config=config).strip()
         matricula = ''.join(c for c in matricula if c.isdigit())
+        if votacao is not None:
+            votacao.registrar(matricula, "avancado:padrao")
         resultados.append(matricula)
     
     resultados = [r for r in resultados if r.isdigit()]
@@ -328,7 +338,7 @@ def preprocess_roi_avancado(roi_pil, debug_folder=None, idx=0):
     
     return Image.fromarray(roi_morph)
 
-def extrair_matricula_com_multiplas_estrategias(imagem_original, config, debug_subdir=None):
+def extrair_matricula_com_multiplas_estrategias(imagem_original, config, debug_subdir=None, votacao=None, tecnicas_multiplas=True):
     """
     Tenta extrair a matrícula usando múltiplas estratégias, retornando o melhor resultado.
     
@@ -336,13 +346,20 @@ def extrair_matricula_com_multiplas_estrategias(imagem_original, config, debug_s
         imagem_original: Imagem PIL original
         config: Dicionário de configuração
         debug_subdir: Diretório para salvar imagens de debug
+        votacao: VotacaoMatricula que recebe cada leitura; se ela for
+            decidida pelos recortes, as técnicas múltiplas não são tentadas
+        tecnicas_multiplas: Se False, só os recortes (ROI fixa, template,
+            contornos e Hough) são lidos
             
     Returns:
         Texto da matrícula extraído
     """
-    from pytesseract import image_to_string, Output
     
     resultados = []
+    # Recortes encontrados pelas estratégias, lidos juntos no fim: em um
+    # mosaico (uma chamada ao Tesseract) ou um a um
+    recortes = []
+    usar_mosaico = config.get("ocr_mosaico", True)
     
     if "matricula_roi" in config:
         try:
@@ -354,13 +371,7 @@ def extrair_matricula_com_multiplas_estrategias(imagem_original, config, debug_s
             if debug_subdir:
                 roi_processada.save(os.path.join(debug_subdir, "matricula_roi_processada_1.png"))
             
-            config_tess = r"--psm 7 -c tessedit_char_whitelist=0123456789"
-            matricula = image_to_string(roi_processada, config=config_tess, output_type=Output.STRING).strip()
-            matricula = ''.join(c for c in matricula if c.isdigit())
-            
-            logger.info(f"Matrícula (ROI fixa) lida: '{matricula}'")
-            if matricula.isdigit() and len(matricula) >= 5:
-                resultados.append((matricula, 0.9))
+            recortes.append(("ROI fixa", roi_processada, 0.9))
         except Exception as e:
             logger.error(f"Erro na extração da matrícula (ROI fixa): {e}")
     
@@ -368,7 +379,11 @@ def extrair_matricula_com_multiplas_estrategias(imagem_original, config, debug_s
         try:
             from modules.core.detector import detectar_area_cabecalho_template, pre_processar_imagem
             
-            temp_cab = Image.open(config["matricula_template_path"])
+            from modules.core.template_registry import obter_template_matricula
+            
+            temp_cab = obter_template_matricula(config)
+            if temp_cab is None:
+                raise FileNotFoundError(config["matricula_template_path"])
             
             pil_img_proc = pre_processar_imagem(imagem_original, equalizar=True, ajustar_contraste=True)
             
@@ -400,13 +415,7 @@ def extrair_matricula_com_multiplas_estrategias(imagem_original, config, debug_s
                     debug_roi_ocr_path = os.path.join(debug_subdir, "debug_matricula_roi_used_2.png")
                     roi_processada.save(debug_roi_ocr_path)
                 
-                config_tess = r"--psm 7 -c tessedit_char_whitelist=0123456789"
-                matricula = image_to_string(roi_processada, config=config_tess, output_type=Output.STRING).strip()
-                matricula = ''.join(c for c in matricula if c.isdigit())
-                
-                logger.info(f"Matrícula (template-cabeçalho) lida: '{matricula}'")
-                if matricula.isdigit() and len(matricula) >= 5:
-                    resultados.append((matricula, score_cab))
+                recortes.append(("template-cabeçalho", roi_processada, score_cab))
         except Exception as e:
             logger.error(f"Erro no template de cabeçalho/matrícula: {e}")
     
@@ -424,13 +433,7 @@ def extrair_matricula_com_multiplas_estrategias(imagem_original, config, debug_s
             if debug_subdir:
                 roi_processada.save(os.path.join(debug_subdir, "matricula_contorno_processada.png"))
             
-            config_tess = r"--psm 7 -c tessedit_char_whitelist=0123456789"
-            matricula = image_to_string(roi_processada, config=config_tess, output_type=Output.STRING).strip()
-            matricula = ''.join(c for c in matricula if c.isdigit())
-            
-            logger.info(f"Matrícula (contornos) lida: '{matricula}'")
-            if matricula.isdigit() and len(matricula) >= 5:
-                resultados.append((matricula, 0.7))  
+            recortes.append(("contornos", roi_processada, 0.7))
     except Exception as e:
         logger.error(f"Erro na detecção por contornos: {e}")
     
@@ -448,25 +451,42 @@ def extrair_matricula_com_multiplas_estrategias(imagem_original, config, debug_s
             if debug_subdir:
                 roi_processada.save(os.path.join(debug_subdir, "matricula_hough_processada.png"))
             
-            config_tess = r"--psm 7 -c tessedit_char_whitelist=0123456789"
-            matricula = image_to_string(roi_processada, config=config_tess, output_type=Output.STRING).strip()
-            matricula = ''.join(c for c in matricula if c.isdigit())
-            
-            logger.info(f"Matrícula (Hough) lida: '{matricula}'")
-            if matricula.isdigit() and len(matricula) >= 5:
-                resultados.append((matricula, 0.6))
+            recortes.append(("Hough", roi_processada, 0.6))
     except Exception as e:
         logger.error(f"Erro na detecção por Hough: {e}")
     
     try:
-        logger.info("Tentando extração de matrícula com múltiplas técnicas...")
-        matricula = extrair_matricula_avancado(imagem_original, pre_processar=True, tentativas_multiplas=True, debug_folder=debug_subdir)
-        
-        if matricula.isdigit() and len(matricula) >= 5:
-            logger.info(f"Matrícula (técnicas múltiplas) lida: '{matricula}'")
-            resultados.append((matricula, 0.5))  
+        if usar_mosaico and all(r.size[1] <= ALTURA_MAX_MOSAICO for _, r, _ in recortes):
+            lidos = [lido["texto"] for lido in ocr_mosaico([r for _, r, _ in recortes], config=CONFIG_MOSAICO_MATRICULA)]
+        else:
+            config_tess = r"--psm 7 -c tessedit_char_whitelist=0123456789"
+            lidos = [image_to_string(r, config=config_tess, output_type=Output.STRING).strip() for _, r, _ in recortes]
+        for (nome, _, peso), matricula in zip(recortes, lidos):
+            matricula = ''.join(c for c in matricula if c.isdigit())
+            logger.info(f"Matrícula ({nome}) lida: '{matricula}'")
+            if votacao is not None:
+                votacao.registrar(matricula, nome)
+            if matricula.isdigit() and len(matricula) >= 5:
+                resultados.append((matricula, peso))
     except Exception as e:
-        logger.error(f"Erro na extração com múltiplas técnicas: {e}")
+        logger.error(f"Erro no OCR dos recortes da matrícula: {e}")
+    
+    if votacao is not None and votacao.decidida:
+        return votacao.decisao
+    
+    if tecnicas_multiplas:
+        try:
+            logger.info("Tentando extração de matrícula com múltiplas técnicas...")
+            matricula = extrair_matricula_avancado(
+                imagem_original, pre_processar=True, tentativas_multiplas=True, debug_folder=debug_subdir,
+                mosaico=usar_mosaico, votacao=votacao
+            )
+            
+            if matricula.isdigit() and len(matricula) >= 5:
+                logger.info(f"Matrícula (técnicas múltiplas) lida: '{matricula}'")
+                resultados.append((matricula, 0.5))  
+        except Exception as e:
+            logger.error(f"Erro na extração com múltiplas técnicas: {e}")
     
     if resultados:
         resultados.sort(key=lambda x: x[1], reverse=True)
@@ -0,0 +1,91 @@
+import re
+import logging
+
+logger = logging.getLogger('GabaritoApp.Votacao')
+
+# Leituras independentes que precisam concordar para a matrícula ser aceita
+QUORUM_PADRAO = 2
+
+
+class VotacaoMatricula:
+    """
+    Reúne as leituras da matrícula de uma página feitas pelas várias
+    estratégias e decide assim que quorum fontes independentes concordam
+    em um número válido. Leituras da mesma fonte (a mesma imagem com
+    outro modo de segmentação, por exemplo) contam uma vez só.
+
+    As estratégias consultam decidida entre uma leitura e outra para parar
+    cedo; sem quorum, melhor() devolve a leitura válida com mais fontes.
+    Cada leitura fica em historico com a etapa em curso (atributo etapa,
+    definido por quem conduz as estratégias) e uma marca opcional.
+    """
+
+    def __init__(self, quorum=QUORUM_PADRAO, validar=None):
+        self.quorum = max(1, int(quorum))
+        self._validar = validar or (lambda texto: texto.isdigit())
+        self._fontes = {}
+        self.leituras = 0
+        self.decisao = None
+        self.estrategia = None
+        self.etapa = None
+        self.historico = []
+
+    @property
+    def decidida(self):
+        return self.decisao is not None
+
+    def registrar(self, texto, fonte, marca=None):
+        """
+        Registra uma leitura (só os dígitos de texto contam).
+
+        Args:
+            texto: Texto lido pelo OCR
+            fonte: Identificação da estratégia e da imagem que gerou a leitura
+            marca: Detalhe guardado no histórico (a configuração do
+                Tesseract, por exemplo)
+
+        Returns:
+            True se a votação está decidida
+        """
+        self.leituras += 1
+        numero = re.sub(r'\D', '', texto or "")
+        self.historico.append((numero, fonte, self.etapa, marca))
+        if self.decidida:
+            return True
+        if not numero or not self._validar(numero):
+            return False
+        fontes = self._fontes.setdefault(numero, [])
+        if fonte not in fontes:
+            fontes.append(fonte)
+        if len(fontes) >= self.quorum:
+            self.decisao = numero
+            self.estrategia = fonte
+            logger.debug(f"Matrícula {numero} decidida por {fontes} após {self.leituras} leituras")
+        return self.decidida
+
+    def melhor(self):
+        """
+        Retorna (matricula, estrategia): a decisão, se houver, ou a leitura
+        válida com mais fontes (no empate, a registrada primeiro); ("", None)
+        sem leituras válidas.
+        """
+        if self.decidida:
+            return self.decisao, self.estrategia
+        if not self._fontes:
+            return "", None
+        numero, fontes = max(self._fontes.items(), key=lambda item: len(item[1]))
+        return numero, fontes[0]
+
+    def acertos(self, campo="etapa"):
+        """
+        Retorna, para cada etapa (campo="etapa") ou marca (campo="marca")
+        que registrou leituras, se alguma delas foi o número decidido.
+        Sem decisão, todas constam como False.
+        """
+        indice = 2 if campo == "etapa" else 3
+        resultado = {}
+        for leitura in self.historico:
+            chave = leitura[indice]
+            if chave is not None:
+                resultado[chave] = resultado.get(chave, False) or (self.decidida and leitura[0] == self.decisao)
+        return resultado
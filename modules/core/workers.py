@@ -1,5 +1,6 @@
 import sys
 import os
+import time
 from datetime import datetime
 import cv2
 import numpy as np
@@ -7,15 +8,46 @@ from PIL import Image, ImageDraw
 
 from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
 
-from modules.core.converter import converter_pdf_em_imagens
+from modules.core.converter import iterar_paginas_arquivo, ajustar_contraste_np, remover_ruido_e_binarizar_np
+from modules.core.page_cache import obter_cache_paginas
+from modules.core.ocr import configurar_ocr
+from modules.core.template_registry import obter_template_gabarito, obter_templates_gabarito, precarregar_templates
+from modules.core.alinhamento import CacheAlinhamento, METODOS_VERIFICAVEIS
+from modules.core.layout import (
+    obter_layout,
+    compilar_layout,
+    cabe_na_pagina,
+    validar_layout,
+    regiao_layout,
+    transladar_layout
+)
 from modules.core.detector import (
     detectar_respostas_por_grid,
+    detectar_respostas_lote,
+    binarizar_para_omr,
+    imagem_cinza_np,
     corrigir_perspectiva,
+    corrigir_perspectiva_regiao,
+    detectar_marcadores,
+    detectar_area_gabarito_caracteristicas,
+    score_alinhamento,
+    verificar_alinhamento,
+    janelas_confiaveis,
+    classificar_folha,
+    orientacao_marcadores,
+    densidade_tinta,
+    pagina_sem_marcacoes,
+    DENSIDADE_MIN_TINTA,
     detectar_area_gabarito_template,
     detectar_area_cabecalho_template,
     pre_processar_imagem
 )
-from modules.core.text_extractor import extrair_info_ocr, extrair_matricula, extrair_matricula_avancado
+from modules.core.text_extractor import (
+    extrair_info_ocr, extrair_matricula, extrair_matricula_avancado, extrair_matricula_com_multiplas_estrategias
+)
+from modules.core.votacao import VotacaoMatricula, QUORUM_PADRAO
+from modules.core.estrategias_matricula import ETAPAS_MATRICULA, obter_estatisticas_estrategias, perfil_matricula
+from modules.core.qr_folha import ler_qr_folha
 from modules.core.student_api import StudentAPIClient
 from modules.core.detector_matricula import DetectorMatricula
 from modules.utils import logger
@@ -33,6 +65,13 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
+# Os resultados guardam só uma miniatura da página corrigida
+# (PreviewThumbnail), não a página inteira de cada folha do lote
+PREVIEW_MAX_SIZE = (800, 800)
+# Margem em torno da grade no modo omr_somente_grade, para os filtros de
+# vizinhança (bilateral, limiar adaptativo, morfologia) não sentirem a borda
+MARGEM_GRADE = 16
+
 class WorkerSignals(QObject):
     progress = pyqtSignal(int)
     finished = pyqtSignal(list)
@@ -115,6 +154,11 @@ def preprocess_roi_avancado(roi_pil, debug_folder=None, idx=0):
             cv2.imwrite(debug_path, img)
     return Image.fromarray(processed_versions['combined'])
 
+def criar_preview(pil_img, tamanho=PREVIEW_MAX_SIZE):
+    preview = pil_img.copy()
+    preview.thumbnail(tamanho)
+    return preview
+
 class ProcessWorker(QRunnable):
     def __init__(self, pdf_paths, config, n_alternativas, dpi_escolhido, grid_rois, client: StudentAPIClient):
         super().__init__()
@@ -123,47 +167,698 @@ class ProcessWorker(QRunnable):
         self.n_alternativas = n_alternativas
         self.dpi_escolhido = dpi_escolhido
         self.grid_rois = grid_rois 
+        self.n_questoes = sum(len(bloco) for bloco in grid_rois)
         self.client = client
         self.signals = WorkerSignals()
         self.detector_matricula = DetectorMatricula(config)
 
-    def extrair_matricula_com_multiplas_estrategias(self, imagem_original, debug_subdir):
-        if self.config.get("scanned_by_printer", False):
-            matricula, confianca = self.detector_matricula.extrair_matricula_scaneada(imagem_original, debug_subdir)
-            if matricula:
-                logger.info(f"[Worker] Matrícula (scanner especializado enhanced) lida: '{matricula}' (conf: {confianca:.2f})")
-                return matricula
-        resultado = self.detector_matricula.processar_documento(imagem_original, debug_subdir)
-        matricula = resultado["matricula"]
-        if matricula:
-            logger.info(f"[Worker] Matrícula (detector enhanced) lida: '{matricula}' (conf: {resultado['confianca']:.2f})")
-            return matricula
-        logger.info("[Worker] Detector não encontrou matrícula, tentando métodos enhanced...")
-        from modules.core.text_extractor import extrair_matricula_com_multiplas_estrategias
-        matricula_enhanced = extrair_matricula_com_multiplas_estrategias(
-            imagem_original, self.config, debug_subdir
+    def extrair_matricula_com_multiplas_estrategias(self, imagem_original, debug_subdir, perfil=None):
+        """
+        Lê a matrícula pelas etapas de ETAPAS_MATRICULA, parando assim que
+        config["matricula_quorum"] leituras independentes concordam (ver
+        VotacaoMatricula):
+
+        - scanner_mosaico: variantes da ROI do detector, em mosaico;
+        - recortes: ROI fixa, template, contornos e Hough de text_extractor;
+        - tecnicas_multiplas: variantes da página de extrair_matricula_avancado;
+        - scanner_exaustivo: cada variante do detector com cada --psm;
+        - semantico: OCR da página inteira;
+        - fallback_avancado: página com pré-processamento avançado.
+
+        Com o histórico de estratégias ativo (ver
+        obter_estatisticas_estrategias), as etapas e as configurações do
+        --psm são tentadas na ordem de menor custo esperado até um acerto
+        para o perfil, e o resultado de cada uma é registrado no histórico.
+
+        Returns:
+            Tupla (matricula, estrategia): estrategia é a fonte da leitura
+            que decidiu (ou da melhor leitura, sem quorum); None se nenhuma
+            leitura foi válida
+        """
+        detector = self.detector_matricula
+        votacao = VotacaoMatricula(
+            self.config.get("matricula_quorum", QUORUM_PADRAO), validar=detector._validar_matricula
         )
-        if matricula_enhanced:
-            logger.info(f"[Worker] Matrícula (estratégias enhanced) lida: '{matricula_enhanced}'")
-            return matricula_enhanced
-        logger.info("[Worker] Tentando fallback final com pré-processamento avançado...")
-        try:
+        estatisticas = obter_estatisticas_estrategias(self.config) if perfil else None
+        etapas = list(ETAPAS_MATRICULA)
+        configs_psm = list(detector.tesseract_configs)
+        if estatisticas is not None:
+            etapas = estatisticas.ordenar(perfil, etapas)
+            # O tempo de cada --psm não é medido: elas são ordenadas pela taxa
+            # de acerto e, sem histórico, ficam na ordem do detector
+            configs_psm = estatisticas.ordenar(perfil, configs_psm, "psm")
+        preparado = []
+
+        def variantes():
+            if not preparado:
+                preparado.extend(detector.preparar_variantes(imagem_original, debug_subdir))
+            return preparado
+
+        def scanner_mosaico():
+            imagem_pil, roi_pil, imagens = variantes()
+            if roi_pil is not None:
+                detector.ler_variantes_mosaico(roi_pil, imagens, votacao)
+
+        def recortes():
+            extrair_matricula_com_multiplas_estrategias(
+                imagem_original, self.config, debug_subdir, votacao=votacao, tecnicas_multiplas=False
+            )
+
+        def tecnicas_multiplas():
+            extrair_matricula_avancado(
+                imagem_original, pre_processar=True, tentativas_multiplas=True, debug_folder=debug_subdir,
+                mosaico=self.config.get("ocr_mosaico", True), votacao=votacao
+            )
+
+        def scanner_exaustivo():
+            detector.ler_variantes_exaustivo(variantes()[2], votacao, configs_psm)
+
+        def semantico():
+            matricula, _ = detector._ocr_semantico_global(variantes()[0])
+            votacao.registrar(matricula, "semantico")
+
+        def fallback_avancado():
             from modules.core.text_extractor import pre_processar_imagem_ocr_avancado
             img_processed = pre_processar_imagem_ocr_avancado(imagem_original)
             if debug_subdir:
                 img_processed.save(os.path.join(debug_subdir, "fallback_processed.png"))
-            matricula_fallback = extrair_matricula_avancado(
+            extrair_matricula_avancado(
                 img_processed, 
                 pre_processar=False,
                 tentativas_multiplas=True, 
-                debug_folder=debug_subdir
+                debug_folder=debug_subdir,
+                mosaico=self.config.get("ocr_mosaico", True),
+                votacao=votacao
+            )
+
+        funcoes = {
+            "scanner_mosaico": scanner_mosaico,
+            "recortes": recortes,
+            "tecnicas_multiplas": tecnicas_multiplas,
+            "scanner_exaustivo": scanner_exaustivo,
+            "semantico": semantico,
+            "fallback_avancado": fallback_avancado,
+        }
+        tempos = {}
+        for etapa in etapas:
+            if votacao.decidida:
+                break
+            votacao.etapa = etapa
+            inicio = time.perf_counter()
+            try:
+                funcoes[etapa]()
+            except Exception as e:
+                logger.error(f"Erro na etapa {etapa} da matrícula: {e}")
+            tempos[etapa] = time.perf_counter() - inicio
+
+        if estatisticas is not None:
+            acertos = votacao.acertos()
+            for etapa, segundos in tempos.items():
+                estatisticas.registrar(perfil, etapa, acertos.get(etapa, False), segundos)
+            for config, acerto in votacao.acertos("marca").items():
+                estatisticas.registrar(perfil, config, acerto, grupo="psm")
+
+        matricula, estrategia = votacao.melhor()
+        if matricula:
+            logger.info(
+                f"[Worker] Matrícula lida: '{matricula}' ({estrategia}, "
+                f"{'consenso' if votacao.decidida else 'sem consenso'}, {votacao.leituras} leituras, "
+                f"etapas {list(tempos)})"
             )
-            if matricula_fallback:
-                logger.info(f"[Worker] Matrícula (fallback avançado) lida: '{matricula_fallback}'")
-                return matricula_fallback
+        return matricula, estrategia
+
+    def _detectar_pts_ref(self, imagem, tipo):
+        """
+        Localiza a área do gabarito na página, com o template do tipo de
+        folha (ver _preparar_tipo).
+
+        Returns:
+            Tupla (pts_ref, score, metodo), com metodo "marcadores",
+            "caracteristicas", "template", "config" ou None
+        """
+        pts_ref = None
+        score = 0.0
+        metodo = None
+        n_questoes = tipo["n_questoes"]
+        # Folhas geradas pelo preenchedor trazem marcadores fiduciais; o
+        # template matching fica para as folhas antigas. O quadro dos
+        # marcadores não é o do template: eles só alinham tipos com layout
+        # calibrado nesse quadro
+        if self.config.get("usar_marcadores", True) and "marcadores" in tipo["quadros"]:
+            pts_ref = detectar_marcadores(imagem)
+            if pts_ref is not None:
+                logger.debug(f"[Worker] Marcadores fiduciais encontrados: {pts_ref}")
+                return pts_ref, 1.0, "marcadores"
+        template = tipo["template"]
+        if template is not None:
+            min_score = 0.4 if self.config.get("scanned_by_printer", False) else 0.5
+            if self.config.get("alinhamento_caracteristicas", True):
+                try:
+                    pts_ref, score = detectar_area_gabarito_caracteristicas(imagem, template)
+                    metodo = "caracteristicas" if pts_ref else None
+                    logger.debug(f"[Worker] Alinhamento por características: score {score:.2f}")
+                except Exception as e:
+                    logger.error(f"Feature alignment failed: {e}")
+                    pts_ref, score = None, 0.0
+            if pts_ref is None or score < min_score:
+                try:
+                    imagem_proc = pre_processar_imagem(
+                        imagem, 
+                        equalizar=True, 
+                        ajustar_contraste=True, 
+                        remover_ruido=True
+                    )
+                    pts_tm, score_tm = detectar_area_gabarito_template(
+                        imagem_proc, template, 
+                        pre_processar=True, 
+                        multi_escala=True,
+                        rotacoes=True
+                    )
+                    logger.debug(f"[Worker] Enhanced template gabarito score: {score_tm:.2f}")
+                    # Os dois alinhamentos são comparados pela mesma medida
+                    if pts_tm and (pts_ref is None or score_alinhamento(imagem, pts_tm, template) > score):
+                        pts_ref, score, metodo = pts_tm, score_tm, "template"
+                except Exception as e:
+                    logger.error(f"Enhanced template matching failed: {e}")
+                    self.signals.message.emit(f"Aviso: falha no template gabarito enhanced: {e}")
+            if pts_ref is not None and score < min_score:
+                aviso = f"Baixa confiança no alinhamento do gabarito ({metodo}, score={score:.2f})"
+                self.signals.message.emit(aviso)
+                logger.debug(aviso)
+        elif "pts_ref" in self.config:
+            pts_ref = self.config["pts_ref"]
+            metodo = "config"
+        elif "template_path" in self.config:
+            self.signals.message.emit(f"Aviso: template do gabarito de {n_questoes} questões não encontrado")
+        return pts_ref, score, metodo
+
+    def _alinhar_pagina(self, imagem, tipo):
+        """
+        Alinha uma página conferindo antes, com verificar_alinhamento, o
+        alinhamento da página anterior do mesmo tipo de folha; a
+        localização completa (_detectar_pts_ref) só roda quando a hipótese
+        não confere.
+
+        Returns:
+            Tupla (pts_ref, score, metodo, reaproveitado)
+        """
+        template = tipo["template"]
+        cache = tipo["cache"]
+        hipotese = cache.hipotese(imagem.shape) if self.config.get("reaproveitar_alinhamento", True) else None
+        if hipotese is not None and template is not None:
+            pts_ref, score = verificar_alinhamento(imagem, hipotese["pts_ref"], template, hipotese["janelas"])
+            if pts_ref is not None:
+                cache.registrar(pts_ref, imagem.shape, hipotese["metodo"], reaproveitado=True)
+                return pts_ref, score, hipotese["metodo"], True
+            cache.rejeitar()
+            logger.debug(f"[Worker] Alinhamento anterior não confere (score={score:.2f}); localizando de novo")
+        pts_ref, score, metodo = self._detectar_pts_ref(imagem, tipo)
+        janelas = None
+        if pts_ref and metodo in METODOS_VERIFICAVEIS and template is not None:
+            janelas = janelas_confiaveis(imagem, pts_ref, template)
+        cache.registrar(pts_ref, imagem.shape, metodo, janelas)
+        return pts_ref, score, metodo, False
+
+    def _preparar_tipo(self, n_questoes, template, larg_corr, alt_corr):
+        """
+        Reúne o que a leitura de um tipo de folha precisa: template, um
+        cache de alinhamento próprio, para que páginas de tipos diferentes
+        intercaladas não descartem a hipótese umas das outras, e, para cada
+        quadro de alinhamento com layout (ver _quadro_layout), o layout e a
+        região da grade. O quadro "template" vale para páginas alinhadas
+        pelo template; o quadro "marcadores", para as alinhadas pelos
+        marcadores fiduciais do preenchedor, que delimitam outra área.
+
+        Returns:
+            Dicionário do tipo, ou None se não houver layout para n_questoes
+        """
+        layout = obter_layout(self.config, n_questoes, self.n_alternativas)
+        if str(n_questoes) == str(self.n_questoes) and (layout is None or len(layout) != self.n_questoes):
+            layout = compilar_layout(self.grid_rois, self.n_alternativas)
+        layout_marcadores = obter_layout(self.config, n_questoes, self.n_alternativas, "marcadores")
+        quadros = {
+            nome: self._quadro_layout(layout_quadro, larg_corr, alt_corr)
+            for nome, layout_quadro in (("template", layout), ("marcadores", layout_marcadores))
+            if layout_quadro is not None
+        }
+        if not quadros:
+            return None
+        return {
+            "n_questoes": str(n_questoes),
+            "template": template,
+            "quadros": quadros,
+            "cache": CacheAlinhamento(),
+            "pendentes_omr": [],
+            "paginas": 0,
+        }
+
+    @staticmethod
+    def _quadro_layout(layout, larg_corr, alt_corr):
+        """Layout de um quadro de alinhamento e a região da grade na área corrigida."""
+        regiao_grade = regiao_layout(layout, larg_corr, alt_corr, MARGEM_GRADE)
+        return {
+            "layout": layout,
+            "regiao_grade": regiao_grade,
+            "layout_grade": transladar_layout(layout, -regiao_grade[0], -regiao_grade[1]),
+            # grid_rois de alguns layouts está em coordenadas da página
+            # inteira, não da área corrigida
+            "cabe": cabe_na_pagina(layout, larg_corr, alt_corr),
+        }
+
+    def _tipo_do_layout(self, chave, tipos, larg_corr, alt_corr):
+        """
+        Retorna o tipo de folha do layout informado no QR, preparando-o na
+        primeira página do tipo.
+
+        Returns:
+            Dicionário do tipo (ver _preparar_tipo), ou None se o QR não
+            traz layout ou não há layout configurado para ele
+        """
+        if chave is None:
+            return None
+        if chave not in tipos:
+            tipo = self._preparar_tipo(chave, obter_templates_gabarito(self.config).get(chave), larg_corr, alt_corr)
+            if tipo is None:
+                logger.warning(f"[Worker] Layout {chave} do QR sem grade configurada; classificando a folha")
+                return None
+            tipos[chave] = tipo
+        return tipos[chave]
+
+    def _aplicar_omr_lote(self, pendentes, threshold_fill):
+        """Lê as respostas das páginas acumuladas e preenche cada page_dict."""
+        if not pendentes:
+            return
+        layout = pendentes[0][2]
+        _, respostas = detectar_respostas_lote([bin_np for _, bin_np, _ in pendentes], layout, threshold_fill)
+        for (page_dict, _, _), respostas_pagina in zip(pendentes, respostas):
+            page_dict["Respostas"] = respostas_pagina
+        logger.debug(f"[Worker] OMR em lote aplicado a {len(pendentes)} páginas")
+        pendentes.clear()
+
+    def _corrigir_pagina(self, img_np, pts_ref, regiao=None):
+        if not pts_ref:
+            return img_np
+        larg = self.config.get("largura_corrigida", 800)
+        alt = self.config.get("altura_corrigida", 1200)
+        if regiao is None:
+            corr = corrigir_perspectiva(img_np, pts_ref, larg, alt)
+        else:
+            corr = corrigir_perspectiva_regiao(img_np, pts_ref, larg, alt, regiao)
+        if self.config.get("scanned_by_printer", False):
+            kernel_sharpen = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
+            corr = cv2.filter2D(corr, -1, kernel_sharpen)
+            corr = cv2.bilateralFilter(corr, 5, 50, 50)
+        return corr
+
+    def _preparar_execucao(self, debug_dir):
+        """
+        Lê as opções do processamento e prepara o tipo de folha padrão e os
+        templates usados para classificar e endireitar as páginas.
+
+        Returns:
+            Dicionário com as opções, os tipos de folha (ver _preparar_tipo)
+            e os contadores da execução
+        """
+        larg_corr = self.config.get("largura_corrigida", 800)
+        alt_corr = self.config.get("altura_corrigida", 1200)
+        # O número de questões escolhido na interface é o tipo padrão; com
+        # classificar_folhas, cada página é comparada com todos os
+        # templates que têm layout e lida com o tipo reconhecido. Cada
+        # tipo tem seu layout, seu lote de OMR e seu cache de alinhamento
+        # (o alinhamento da página anterior do tipo é conferido primeiro)
+        tipo_padrao = self._preparar_tipo(
+            self.n_questoes, obter_template_gabarito(self.config, self.n_questoes), larg_corr, alt_corr
+        )
+        # Com corrigir_orientacao, a mesma comparação com os templates
+        # (ou, sem template reconhecido, os marcadores fiduciais) põe de
+        # pé as folhas alimentadas de lado ou invertidas
+        corrigir_orientacao = self.config.get("corrigir_orientacao", True)
+        templates_tipos = {}
+        if self.config.get("classificar_folhas", True):
+            templates_tipos = {
+                chave: template for chave, template in obter_templates_gabarito(self.config).items()
+                if chave == tipo_padrao["n_questoes"]
+                or obter_layout(self.config, chave, self.n_alternativas) is not None
+            }
+            if len(templates_tipos) < 2 and not corrigir_orientacao:
+                templates_tipos = {}
+        elif corrigir_orientacao and tipo_padrao["template"] is not None:
+            templates_tipos = {tipo_padrao["n_questoes"]: tipo_padrao["template"]}
+        return {
+            "debug_dir": debug_dir,
+            "threshold_fill": self.config.get("threshold_fill", 0.25),
+            # Com omr_lote_paginas > 1, páginas no mesmo quadro têm a leitura
+            # das bolhas feita em lotes, sem as imagens de debug por bolha;
+            # por padrão (0) cada página é lida na hora, com elas
+            "tamanho_lote_omr": self.config.get("omr_lote_paginas", 0),
+            # Com a página alinhada, só a região da grade é corrigida e
+            # binarizada; a página inteira é corrigida apenas no tamanho do preview
+            "somente_grade": self.config.get("omr_somente_grade", True),
+            "larg_corr": larg_corr,
+            "alt_corr": alt_corr,
+            "escala_preview": min(PREVIEW_MAX_SIZE[0] / larg_corr, PREVIEW_MAX_SIZE[1] / alt_corr, 1.0),
+            "tipo_padrao": tipo_padrao,
+            "tipos": {tipo_padrao["n_questoes"]: tipo_padrao},
+            "templates_tipos": templates_tipos,
+            "corrigir_orientacao": corrigir_orientacao,
+            # Folhas geradas pelo preenchedor de PDF trazem um QR com
+            # matrícula, layout e página: lido na página reduzida, ele dá a
+            # orientação e o tipo da folha e dispensa o OCR da matrícula
+            "ler_qr": self.config.get("ler_qr_folha", True),
+            # Versos em branco (scans frente e verso) são descartados por uma
+            # medida de tinta na página reduzida, ainda em cinza (binarizado
+            # pelo Otsu, um verso só com ruído ganharia tinta); as demais são
+            # binarizadas aqui, como faria a conversão. Folhas sem nenhuma
+            # bolha marcada têm as respostas lidas, mas dispensam o OCR. As
+            # duas aparecem nos resultados com o motivo em "Ignorada" e ficam
+            # fora da exportação
+            "ignorar_em_branco": self.config.get("ignorar_paginas_em_branco", True),
+            "ignorar_sem_marcacoes": self.config.get("ignorar_sem_marcacoes", True),
+            "paginas_ignoradas": {"em_branco": 0, "sem_marcacoes": 0},
+            "paginas_giradas": 0,
+            # Páginas por estratégia que decidiu a matrícula (None: nenhuma leitura válida)
+            "estrategias_matricula": {},
+        }
+
+    def _identificar_folha(self, execucao, img_np, rotulo):
+        """
+        Lê o QR da folha (se houver) e, sem ele, classifica a página pelos
+        templates; endireita a página e escolhe o tipo de folha.
+
+        Returns:
+            Tupla (img_np, tipo, scores_tipos, rotacao, dados_qr), com a
+            página já de pé
+        """
+        tipos = execucao["tipos"]
+        templates_tipos = execucao["templates_tipos"]
+        corrigir_orientacao = execucao["corrigir_orientacao"]
+        tipo = execucao["tipo_padrao"]
+        scores_tipos = {}
+        chave = None
+        rotacao = 0
+        dados_qr = None
+        tipo_qr = None
+        if execucao["ler_qr"]:
+            dados_qr, rotacao = ler_qr_folha(img_np)
+            if not corrigir_orientacao:
+                rotacao = 0
+        if dados_qr is None and templates_tipos:
+            chave, scores_tipos, rotacao = classificar_folha(img_np, templates_tipos, girar=corrigir_orientacao)
+        if (corrigir_orientacao and dados_qr is None and chave is None and not rotacao
+                and self.config.get("usar_marcadores", True)):
+            rotacao = orientacao_marcadores(img_np) or 0
+        if rotacao:
+            img_np = np.ascontiguousarray(np.rot90(img_np, rotacao))
+            execucao["paginas_giradas"] += 1
+            logger.info(f"[Worker] {rotulo} girada de {rotacao * 90} graus")
+        if dados_qr is not None:
+            logger.debug(f"[Worker] QR de {rotulo}: {dados_qr}")
+            tipo_qr = self._tipo_do_layout(dados_qr["layout"], tipos, execucao["larg_corr"], execucao["alt_corr"])
+            if tipo_qr is None and templates_tipos:
+                # QR sem layout utilizável: a página já está de pé
+                chave, scores_tipos, _ = classificar_folha(img_np, templates_tipos, girar=False)
+        if tipo_qr is not None:
+            tipo = tipo_qr
+        elif templates_tipos:
+            if chave is not None:
+                if chave not in tipos:
+                    template = tipo["template"] if chave == tipo["n_questoes"] else templates_tipos[chave]
+                    tipos[chave] = self._preparar_tipo(chave, template, execucao["larg_corr"], execucao["alt_corr"])
+                tipo = tipos[chave]
+            else:
+                logger.debug(f"[Worker] Tipo de folha não reconhecido ({scores_tipos}); usando {tipo['n_questoes']} questões")
+        return img_np, tipo, scores_tipos, rotacao, dados_qr
+
+    def _quadro_da_pagina(self, tipo, pts_ref, metodo_alinhamento):
+        """
+        Escolhe o quadro de layout do tipo pelo método de alinhamento.
+
+        Returns:
+            Tupla (nome_quadro, quadro, pts_ref, metodo_alinhamento)
+        """
+        nome_quadro = "marcadores" if metodo_alinhamento == "marcadores" else "template"
+        quadro = tipo["quadros"].get(nome_quadro)
+        if quadro is None:
+            # Tipo só com layout no quadro dos marcadores, e a página não
+            # os tem: o alinhamento não vale para ele
+            nome_quadro = "marcadores"
+            quadro = tipo["quadros"][nome_quadro]
+            pts_ref, metodo_alinhamento = None, None
+        return nome_quadro, quadro, pts_ref, metodo_alinhamento
+
+    def _imagens_pagina(self, execucao, img_np, pts_ref, quadro):
+        """
+        Corrige a perspectiva da página alinhada.
+
+        Returns:
+            Tupla (pil_img_corrigida, pil_img_omr, layout_omr, usar_corrigida):
+            a página corrigida (só no tamanho do preview, com
+            omr_somente_grade), a imagem em que as bolhas são lidas e o
+            layout no quadro dela
+        """
+        usar_corrigida = bool(pts_ref) and quadro["cabe"]
+        if usar_corrigida and execucao["somente_grade"]:
+            pil_img_omr = Image.fromarray(self._corrigir_pagina(img_np, pts_ref, quadro["regiao_grade"]))
+            escala = execucao["escala_preview"]
+            pil_img_corrigida = Image.fromarray(corrigir_perspectiva(
+                img_np, pts_ref,
+                max(1, int(execucao["larg_corr"] * escala)), max(1, int(execucao["alt_corr"] * escala))
+            ))
+            return pil_img_corrigida, pil_img_omr, quadro["layout_grade"], True
+        pil_img_corrigida = Image.fromarray(self._corrigir_pagina(img_np, pts_ref))
+        pil_img_omr = pil_img_corrigida if usar_corrigida else Image.fromarray(img_np)
+        return pil_img_corrigida, pil_img_omr, quadro["layout"], usar_corrigida
+
+    def _ler_respostas(self, execucao, tipo, pil_img_omr, layout_omr, usar_corrigida, debug_subdir):
+        """
+        Lê as bolhas da página, na hora ou (com omr_lote_paginas > 1)
+        deixando-a para o lote do tipo, e confere se alguma foi marcada.
+
+        Returns:
+            Tupla (respostas, sem_marcacoes, omr_bin): respostas fica vazio
+            até o lote ser aplicado; omr_bin é a grade binarizada (None se
+            não foi preciso binarizá-la aqui)
+        """
+        tamanho_lote_omr = execucao["tamanho_lote_omr"]
+        ignorar_sem_marcacoes = execucao["ignorar_sem_marcacoes"]
+        omr_bin = None
+        sem_marcacoes = False
+        if tamanho_lote_omr > 1 or (ignorar_sem_marcacoes and usar_corrigida):
+            omr_bin = binarizar_para_omr(imagem_cinza_np(pil_img_omr)) > 0
+            # Sem alinhamento o layout não cai sobre as bolhas
+            sem_marcacoes = ignorar_sem_marcacoes and usar_corrigida and pagina_sem_marcacoes(omr_bin, layout_omr)
+        if tamanho_lote_omr > 1:
+            pendentes_omr = tipo["pendentes_omr"]
+            if pendentes_omr and (pendentes_omr[0][1].shape != omr_bin.shape or pendentes_omr[0][2] is not layout_omr):
+                self._aplicar_omr_lote(pendentes_omr, execucao["threshold_fill"])
+            return {}, sem_marcacoes, omr_bin
+        respostas = detectar_respostas_por_grid(
+            imagem=pil_img_omr,
+            grid_rois=layout_omr,
+            num_alternativas=self.n_alternativas,
+            threshold_fill=execucao["threshold_fill"],
+            debug=True,
+            debug_folder=debug_subdir
+        )
+        respostas_ordenadas = {}
+        for q in sorted(respostas.keys(), key=lambda x: int(x.split()[1])):
+            respostas_ordenadas[q] = respostas[q]
+        return respostas_ordenadas, sem_marcacoes, omr_bin
+
+    def _buscar_aluno(self, matricula_texto, info_ocr):
+        """
+        Busca os dados do aluno na API e, sem resposta, na base local, e
+        completa info_ocr com eles.
+
+        Returns:
+            Dicionário dados_api (vazio se o aluno não foi encontrado)
+        """
+        dados_api = {}
+        logger.info(f"[Worker] Buscando estudante para matrícula {matricula_texto} (enhanced)")
+        try:
+            resultado = self.client.buscar_por_matriculas([matricula_texto])
+            dados_api = resultado[0] if resultado else {}
+            if dados_api:
+                logger.info(f"[Worker] Dados API encontrados: {dados_api}")
+            else:
+                logger.info(f"[Worker] API não retornou dados para matrícula {matricula_texto}")
         except Exception as e:
-            logger.error(f"Erro no fallback avançado: {e}")
-        return ""
+            logger.warning(f"[Worker] Erro ao buscar na API: {e}")
+            dados_api = {}
+        if not dados_api:
+            logger.info(f"[Worker] API não encontrou matrícula {matricula_texto}. Buscando localmente...")
+            try:
+                aluno_local = buscar_por_matricula_excel(matricula_texto)
+                if aluno_local:
+                    dados_api = {
+                        "name": aluno_local.nome,
+                        "school": aluno_local.escola,
+                        "class": aluno_local.turma,
+                        "turn": aluno_local.turno,
+                        "birthDate": aluno_local.data_nascimento
+                    }
+                    logger.info(f"[Worker] Dados locais encontrados: {dados_api}")
+                else:
+                    logger.info(f"[Worker] Matrícula {matricula_texto} não encontrada localmente")
+            except Exception as e:
+                logger.error(f"[Worker] Erro ao buscar localmente: {e}")
+        if dados_api:
+            info_ocr["nome_aluno"] = dados_api.get("name", info_ocr.get("nome_aluno", ""))
+            info_ocr["escola"] = dados_api.get("school", info_ocr.get("escola", ""))
+            info_ocr["turma"] = dados_api.get("class", info_ocr.get("turma", ""))
+            info_ocr["turno"] = dados_api.get("turn", "")
+            info_ocr["data_nascimento"] = dados_api.get("birthDate", "")
+        return dados_api
+
+    @staticmethod
+    def _montar_resultado(rotulo, nome_pdf, preview, processing_info, respostas=None, info_ocr=None,
+                          matricula="", dados_api=None, ignorada=None):
+        """Monta a linha de resultado de uma página (lida ou ignorada)."""
+        info_ocr = info_ocr or {}
+        page_dict = {
+            "Página": rotulo,
+            "Arquivo": nome_pdf,
+            "PreviewThumbnail": criar_preview(preview),
+            "Respostas": respostas or {},
+            "OCR": {
+                "nome_aluno": info_ocr.get("nome_aluno", ""),
+                "escola": info_ocr.get("escola", ""),
+                "turma": info_ocr.get("turma", ""),
+                "matricula": matricula,
+                "dados_api": dados_api or {}
+            },
+            "ProcessingInfo": processing_info
+        }
+        if ignorada:
+            page_dict["Ignorada"] = ignorada
+        return page_dict
+
+    def _processar_pagina(self, execucao, img_original_np, idx, i, nome_pdf, dpi_used, avisados):
+        """
+        Processa uma página: descarte de versos em branco, identificação e
+        orientação da folha, alinhamento, leitura das bolhas, da matrícula
+        e dos dados do aluno.
+
+        Returns:
+            Dicionário de resultado da página (ver _montar_resultado)
+        """
+        rotulo = f"PDF {idx+1} Pag {i+1}"
+        processing_info = {
+            "dpi_used": dpi_used,
+            "threshold_fill": execucao["threshold_fill"],
+            "densidade_tinta": None,
+            "printer_scan_mode": self.config.get("scanned_by_printer", False),
+        }
+        if execucao["ignorar_em_branco"]:
+            densidade = densidade_tinta(img_original_np)
+            processing_info["densidade_tinta"] = densidade
+            if densidade < DENSIDADE_MIN_TINTA:
+                execucao["paginas_ignoradas"]["em_branco"] += 1
+                logger.info(f"[Worker] Página {i+1} de {nome_pdf} em branco (tinta {densidade:.4f}); ignorada")
+                return self._montar_resultado(
+                    rotulo, nome_pdf, Image.fromarray(img_original_np), processing_info, ignorada="em_branco"
+                )
+            img_original_np = remover_ruido_e_binarizar_np(ajustar_contraste_np(img_original_np))
+
+        img_original_np, tipo, scores_tipos, rotacao, dados_qr = self._identificar_folha(
+            execucao, img_original_np, f"Página {i+1} de {nome_pdf}"
+        )
+        tipo["paginas"] += 1
+        pts_ref, score, metodo_alinhamento, reaproveitado = self._alinhar_pagina(img_original_np, tipo)
+        nome_quadro, quadro, pts_ref, metodo_alinhamento = self._quadro_da_pagina(tipo, pts_ref, metodo_alinhamento)
+        pil_img_corrigida, pil_img_omr, layout_omr, usar_corrigida = self._imagens_pagina(
+            execucao, img_original_np, pts_ref, quadro
+        )
+        if ((tipo["n_questoes"], nome_quadro) not in avisados
+                and validar_layout(layout_omr, pil_img_omr.width, pil_img_omr.height)):
+            avisados.add((tipo["n_questoes"], nome_quadro))
+            self.signals.message.emit(
+                f"Aviso: o layout de {tipo['n_questoes']} questões não cabe na página "
+                f"{pil_img_omr.width}x{pil_img_omr.height} de {nome_pdf}"
+            )
+        debug_subdir = os.path.join(execucao["debug_dir"], f"{nome_pdf}_pag_{i+1}")
+        os.makedirs(debug_subdir, exist_ok=True)
+        logger.debug(f"[Worker] Processing page {i+1} of {nome_pdf} with enhanced methods")
+        pil_img_original = Image.fromarray(img_original_np)
+        pil_img_original.save(os.path.join(debug_subdir, "debug_full_page_original.png"))
+        pil_img_corrigida.save(os.path.join(debug_subdir, "debug_full_page_corrected.png"))
+        logger.debug(f"[Worker] Enhanced debug images saved for page {i+1}")
+
+        respostas, sem_marcacoes, omr_bin = self._ler_respostas(
+            execucao, tipo, pil_img_omr, layout_omr, usar_corrigida, debug_subdir
+        )
+        info_ocr = {}
+        matricula_texto, matricula_estrategia = "", None
+        if sem_marcacoes:
+            execucao["paginas_ignoradas"]["sem_marcacoes"] += 1
+            logger.info(f"[Worker] Página {i+1} de {nome_pdf} sem bolhas marcadas; OCR dispensado")
+        else:
+            info_ocr = extrair_info_ocr(pil_img_corrigida)
+            if dados_qr is not None and dados_qr["matricula"]:
+                matricula_texto, matricula_estrategia = dados_qr["matricula"], "qr"
+            else:
+                matricula_texto, matricula_estrategia = self.extrair_matricula_com_multiplas_estrategias(
+                    pil_img_original, debug_subdir, perfil_matricula(self.config, tipo["n_questoes"])
+                )
+            estrategias = execucao["estrategias_matricula"]
+            estrategias[matricula_estrategia] = estrategias.get(matricula_estrategia, 0) + 1
+        dados_api = {}
+        if matricula_texto.isdigit():
+            dados_api = self._buscar_aluno(matricula_texto, info_ocr)
+        elif not sem_marcacoes:
+            logger.warning(f"[Worker] Matrícula inválida ou não encontrada: '{matricula_texto}'")
+
+        processing_info.update({
+            # Com o alinhamento reaproveitado, score é a correlação
+            # das janelas de verificação, em outra escala
+            "template_score": None if reaproveitado else score,
+            "alinhamento": metodo_alinhamento,
+            "alinhamento_score": None if reaproveitado else score,
+            "alinhamento_reaproveitado": reaproveitado,
+            "verificacao_score": score if reaproveitado else None,
+            "tipo_folha": tipo["n_questoes"],
+            "tipo_folha_scores": scores_tipos,
+            "rotacao": rotacao * 90,
+            "matricula_estrategia": matricula_estrategia,
+            "qr": dados_qr,
+        })
+        page_dict = self._montar_resultado(
+            rotulo, nome_pdf, pil_img_corrigida, processing_info, respostas, info_ocr,
+            matricula_texto, dados_api, "sem_marcacoes" if sem_marcacoes else None
+        )
+        if execucao["tamanho_lote_omr"] > 1:
+            pendentes_omr = tipo["pendentes_omr"]
+            pendentes_omr.append((page_dict, omr_bin, layout_omr))
+            if len(pendentes_omr) >= execucao["tamanho_lote_omr"]:
+                self._aplicar_omr_lote(pendentes_omr, execucao["threshold_fill"])
+        logger.debug(f"[Worker] Page {i+1} processing completed successfully")
+        return page_dict
+
+    def _finalizar_execucao(self, execucao):
+        """Aplica os lotes de OMR pendentes e registra os resumos da execução."""
+        paginas_ignoradas = execucao["paginas_ignoradas"]
+        if any(paginas_ignoradas.values()):
+            self.signals.message.emit(
+                f"{sum(paginas_ignoradas.values())} páginas ignoradas: "
+                f"{paginas_ignoradas['em_branco']} em branco, {paginas_ignoradas['sem_marcacoes']} sem marcações"
+            )
+        if execucao["paginas_giradas"]:
+            logger.info(f"[Worker] {execucao['paginas_giradas']} páginas endireitadas antes do alinhamento")
+        if execucao["estrategias_matricula"]:
+            logger.info(f"[Worker] Matrículas por estratégia: {execucao['estrategias_matricula']}")
+        estatisticas_estrategias = obter_estatisticas_estrategias(self.config)
+        if estatisticas_estrategias is not None:
+            estatisticas_estrategias.salvar()
+            logger.info(f"[Worker] Estratégias de leitura da matrícula:\n{estatisticas_estrategias.relatorio()}")
+        for chave, tipo in execucao["tipos"].items():
+            self._aplicar_omr_lote(tipo["pendentes_omr"], execucao["threshold_fill"])
+            logger.info(
+                f"[Worker] Folhas de {chave} questões: {tipo['paginas']} páginas, "
+                f"alinhamento {tipo['cache'].estatisticas()}"
+            )
+        cache_paginas = obter_cache_paginas(self.config)
+        if cache_paginas:
+            logger.info(f"[Worker] Cache de páginas: {cache_paginas.estatisticas()}")
 
     def run(self):
         try:
@@ -171,14 +866,15 @@ class ProcessWorker(QRunnable):
             debug_dir = os.path.join("debug", debug_exec_id)
             os.makedirs(debug_dir, exist_ok=True)
             logger.debug(f"[Worker] Enhanced debug folder created: {debug_dir}")
-            threshold_fill = self.config.get("threshold_fill", 0.25)
             if "grid_rois" not in self.config:
                 msg = "Configuração 'grid_rois' não encontrada."
                 self.signals.error.emit(msg)
                 logger.error(msg)
                 self.signals.finished.emit([])
                 return
-            grid_rois = self.grid_rois
+            precarregar_templates(self.config)
+            configurar_ocr(self.config)
+            execucao = self._preparar_execucao(debug_dir)
             pdf_count = len(self.pdf_paths)
             passo = 80 // max(pdf_count, 1)
             all_pages = []
@@ -189,143 +885,29 @@ class ProcessWorker(QRunnable):
                 if self.config.get("scanned_by_printer", False):
                     dpi_used = max(self.dpi_escolhido, 200)
                     logger.debug(f"[Worker] Using enhanced DPI {dpi_used} for printer scan")
-                imagens = converter_pdf_em_imagens(pdf_path, dpi=dpi_used)
-                if not imagens:
+                paginas_processadas = 0
+                avisados = set()
+                paginas = iterar_paginas_arquivo(
+                    pdf_path,
+                    dpi=dpi_used,
+                    pre_processar=not execucao["ignorar_em_branco"],
+                    formato="numpy",
+                    paralelo=True,
+                    n_workers=self.config.get("workers_conversao", 0),
+                    cache=obter_cache_paginas(self.config),
+                    extrair_embutidas=self.config.get("extrair_imagens_embutidas", True)
+                )
+                for i, img_original_np in paginas:
+                    paginas_processadas += 1
+                    all_pages.append(self._processar_pagina(execucao, img_original_np, idx, i, nome_pdf, dpi_used, avisados))
+                if not paginas_processadas:
                     msg = f"Falha ao converter PDF: {nome_pdf}"
                     self.signals.error.emit(msg)
                     logger.error(msg)
                     continue
-                imagens_originais = list(imagens)
-                pts_ref = None
-                if "template_path" in self.config:
-                    try:
-                        template_path = resource_path(self.config["template_path"])
-                        template = Image.open(template_path)
-                        imagem_proc = pre_processar_imagem(
-                            imagens[0], 
-                            equalizar=True, 
-                            ajustar_contraste=True, 
-                            remover_ruido=True
-                        )
-                        pts_ref, score = detectar_area_gabarito_template(
-                            imagem_proc, template, 
-                            pre_processar=True, 
-                            multi_escala=True,
-                            rotacoes=True
-                        )
-                        logger.debug(f"[Worker] Enhanced template gabarito score: {score:.2f}")
-                        min_score = 0.4 if self.config.get("scanned_by_printer", False) else 0.5
-                        if score < min_score:
-                            aviso = f"Baixa confiança no template gabarito (score={score:.2f})"
-                            self.signals.message.emit(aviso)
-                            logger.debug(aviso)
-                    except Exception as e:
-                        logger.error(f"Enhanced template matching failed: {e}")
-                        self.signals.message.emit(f"Aviso: falha no template gabarito enhanced: {e}")
-                elif "pts_ref" in self.config:
-                    pts_ref = self.config["pts_ref"]
-                if pts_ref:
-                    larg = self.config.get("largura_corrigida", 800)
-                    alt = self.config.get("altura_corrigida", 1200)
-                    imagens_corrigidas = []
-                    for pil_img in imagens:
-                        np_img = np.array(pil_img)
-                        corr = corrigir_perspectiva(np_img, pts_ref, larg, alt)
-                        if self.config.get("scanned_by_printer", False):
-                            kernel_sharpen = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
-                            corr = cv2.filter2D(corr, -1, kernel_sharpen)
-                            corr = cv2.bilateralFilter(corr, 5, 50, 50)
-                        imagens_corrigidas.append(Image.fromarray(corr))
-                    imagens = imagens_corrigidas
-                    logger.debug(f"[Worker] Enhanced perspective correction applied for {nome_pdf}")
-                for i, pil_img_corrigida in enumerate(imagens):
-                    debug_subdir = os.path.join(debug_dir, f"{nome_pdf}_pag_{i+1}")
-                    os.makedirs(debug_subdir, exist_ok=True)
-                    logger.debug(f"[Worker] Processing page {i+1} of {nome_pdf} with enhanced methods")
-                    debug_full_page = os.path.join(debug_subdir, "debug_full_page_original.png")
-                    imagens_originais[i].save(debug_full_page)
-                    debug_corrected_page = os.path.join(debug_subdir, "debug_full_page_corrected.png")
-                    pil_img_corrigida.save(debug_corrected_page)
-                    logger.debug(f"[Worker] Enhanced debug images saved for page {i+1}")
-                    respostas = detectar_respostas_por_grid(
-                        imagem=pil_img_corrigida,
-                        grid_rois=grid_rois,
-                        num_alternativas=self.n_alternativas,
-                        threshold_fill=threshold_fill,
-                        debug=True, 
-                        debug_folder=debug_subdir
-                    )
-                    respostas_ordenadas = {}
-                    questoes_sorted = sorted(respostas.keys(), key=lambda x: int(x.split()[1]))
-                    for q in questoes_sorted:
-                        respostas_ordenadas[q] = respostas[q]
-                    info_ocr = extrair_info_ocr(pil_img_corrigida)
-                    pil_img_original = imagens_originais[i]
-                    matricula_texto = self.extrair_matricula_com_multiplas_estrategias(
-                        pil_img_original, debug_subdir
-                    )
-                    dados_api = {}
-                    if matricula_texto.isdigit():
-                        logger.info(f"[Worker] Buscando estudante para matrícula {matricula_texto} (enhanced)")
-                        try:
-                            resultado = self.client.buscar_por_matriculas([matricula_texto])
-                            dados_api = resultado[0] if resultado else {}
-                            if dados_api:
-                                logger.info(f"[Worker] Dados API encontrados: {dados_api}")
-                            else:
-                                logger.info(f"[Worker] API não retornou dados para matrícula {matricula_texto}")
-                        except Exception as e:
-                            logger.warning(f"[Worker] Erro ao buscar na API: {e}")
-                            dados_api = {}
-                        if not dados_api:
-                            logger.info(f"[Worker] API não encontrou matrícula {matricula_texto}. Buscando localmente...")
-                            try:
-                                aluno_local = buscar_por_matricula_excel(matricula_texto)
-                                if aluno_local:
-                                    dados_api = {
-                                        "name": aluno_local.nome,
-                                        "school": aluno_local.escola,
-                                        "class": aluno_local.turma,
-                                        "turn": aluno_local.turno,
-                                        "birthDate": aluno_local.data_nascimento
-                                    }
-                                    logger.info(f"[Worker] Dados locais encontrados: {dados_api}")
-                                else:
-                                    logger.info(f"[Worker] Matrícula {matricula_texto} não encontrada localmente")
-                            except Exception as e:
-                                logger.error(f"[Worker] Erro ao buscar localmente: {e}")
-                        if dados_api:
-                            info_ocr["nome_aluno"] = dados_api.get("name", info_ocr.get("nome_aluno", ""))
-                            info_ocr["escola"] = dados_api.get("school", info_ocr.get("escola", ""))
-                            info_ocr["turma"] = dados_api.get("class", info_ocr.get("turma", ""))
-                            info_ocr["turno"] = dados_api.get("turn", "")
-                            info_ocr["data_nascimento"] = dados_api.get("birthDate", "")
-                    else:
-                        logger.warning(f"[Worker] Matrícula inválida ou não encontrada: '{matricula_texto}'")
-                    page_dict = {
-                        "Página": f"PDF {idx+1} Pag {i+1}",
-                        "Arquivo": nome_pdf,
-                        "PreviewImage": pil_img_corrigida,
-                        "Respostas": respostas_ordenadas,
-                        "OCR": {
-                            "nome_aluno": info_ocr.get("nome_aluno", ""),
-                            "escola": info_ocr.get("escola", ""),
-                            "turma": info_ocr.get("turma", ""),
-                            "matricula": matricula_texto,
-                            "dados_api": dados_api
-                        },
-                        "ProcessingInfo": {
-                            "dpi_used": dpi_used,
-                            "threshold_fill": threshold_fill,
-                            "template_score": score if 'score' in locals() else 0.0,
-                            "printer_scan_mode": self.config.get("scanned_by_printer", False)
-                        }
-                    }
-                    all_pages.append(page_dict)
-                    logger.debug(f"[Worker] Page {i+1} processing completed successfully")
                 self.signals.progress.emit((idx+1) * passo)
                 logger.debug(f"[Worker] PDF {idx+1}/{pdf_count} completed")
-            logger.info(f"[Worker] Enhanced processing completed. Total pages: {len(all_pages)}")
+            self._finalizar_execucao(execucao)
             
             # Depois de processar tudo:
             logger.info(f"[Worker] Enhanced processing completed. Total pages: {len(all_pages)}")
@@ -340,7 +922,8 @@ class ProcessWorker(QRunnable):
             else:
                 try:
                     logger.info("[Worker] Iniciando exportação para Google Sheets...")
-                    importar_para_google_sheets(all_pages, google_sheet_id, "credentials.json")
+                    paginas_lidas = [pagina for pagina in all_pages if not pagina.get("Ignorada")]
+                    importar_para_google_sheets(paginas_lidas, google_sheet_id, "credentials.json")
                 except Exception as e:
                     logger.error(f"[Worker] Erro ao exportar para Google Sheets: {e}", exc_info=True)
 
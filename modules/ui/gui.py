@@ -14,7 +14,8 @@ from PyQt6.QtWidgets import (
     QDialog, QPushButton, QFrame, QStackedWidget, QLineEdit
 )
 
-from modules.core.converter import converter_pdf_em_imagens
+from modules.core.converter import listar_imagens_pasta
+from modules.core.pdf_inspector import inspecionar_arquivo, estimar_lote, SEGUNDOS_POR_MEGAPIXEL_PADRAO
 from modules.core.workers import ProcessWorker
 from modules.core.dialogs import ResultadoDialog
 from modules.core.exporter import importar_para_planilha
@@ -41,13 +42,44 @@ class PDFLoaderWorker(QRunnable):
 
     def run(self):
         try:
-            imagens = converter_pdf_em_imagens(self.pdf_path, dpi=50)
-            num_paginas = len(imagens)
+            num_paginas = inspecionar_arquivo(self.pdf_path)["paginas"]
             self.signals.finished.emit(self.pdf_path, num_paginas)
         except Exception as e:
             self.signals.error.emit(f"Falha ao carregar '{self.pdf_path}': {e}")
 
 
+class InspecaoLoteSignals(QObject):
+    finished = pyqtSignal(dict)
+    error = pyqtSignal(str)
+
+
+class InspecaoLoteWorker(QRunnable):
+    """Lê só os metadados dos PDFs selecionados e estima tempo e memória do lote."""
+
+    def __init__(self, pdf_paths, dpi, config):
+        super().__init__()
+        self.pdf_paths = list(pdf_paths)
+        self.dpi = dpi
+        self.config = config
+        self.signals = InspecaoLoteSignals()
+
+    def run(self):
+        try:
+            n_workers = self.config.get("workers_conversao", 0) or os.cpu_count() or 1
+            # Blocos em andamento no pool de conversão (2 por processo, 4 páginas cada) + página atual
+            paginas_em_memoria = 2 * n_workers * 4 + 1 if n_workers > 1 else 1
+            lote = estimar_lote(
+                self.pdf_paths,
+                self.dpi,
+                paginas_em_memoria=paginas_em_memoria,
+                segundos_por_megapixel=self.config.get("segundos_por_megapixel", SEGUNDOS_POR_MEGAPIXEL_PADRAO)
+            )
+            lote["pdf_paths"] = self.pdf_paths
+            self.signals.finished.emit(lote)
+        except Exception as e:
+            self.signals.error.emit(f"Falha ao inspecionar os PDFs: {e}")
+
+
 class SelectedPDFsDialog(QDialog):
     def __init__(self, pdf_paths, parent=None):
         super().__init__(parent)
@@ -329,10 +361,14 @@ class GabaritoApp(QMainWindow):
         btn_sel = ModernButton("Selecionar PDFs", "file-plus", True)
         btn_sel.clicked.connect(self.selecionar_pdfs)
 
+        btn_pasta = ModernButton("Selecionar Pasta", "folder", False)
+        btn_pasta.clicked.connect(self.selecionar_pasta_scans)
+
         btn_vis = ModernButton("Visualizar Selecionados", "eye", False)
         btn_vis.clicked.connect(self.open_selected_dialog)
 
         btn_layout.addWidget(btn_sel)
+        btn_layout.addWidget(btn_pasta)
         btn_layout.addWidget(btn_vis)
 
         ll.addWidget(btn_container)
@@ -387,6 +423,7 @@ class GabaritoApp(QMainWindow):
         self.res_combo.addItem("200 DPI", 200)
         self.res_combo.addItem("300 DPI", 300)
         self.res_combo.setCurrentIndex(2)
+        self.res_combo.currentIndexChanged.connect(lambda _: self.iniciar_inspecao())
         res_layout.addWidget(self.res_combo)
         rl.addWidget(grp_res)
 
@@ -468,18 +505,58 @@ class GabaritoApp(QMainWindow):
 
     def selecionar_pdfs(self):
         files, _ = QFileDialog.getOpenFileNames(
-            self, "Selecionar arquivos PDF", "", "PDF Files (*.pdf)"
+            self, "Selecionar arquivos", "",
+            "Documentos (*.pdf *.tif *.tiff *.jpg *.jpeg *.png);;PDF Files (*.pdf);;Scans (*.tif *.tiff *.jpg *.jpeg *.png)"
         )
         if not files:
             return
 
+        self.definir_documentos(files)
+
+    def selecionar_pasta_scans(self):
+        pasta = QFileDialog.getExistingDirectory(self, "Selecionar pasta de scans (JPEG/PNG/TIFF)")
+        if not pasta:
+            return
+        if not listar_imagens_pasta(pasta):
+            QMessageBox.warning(self, "Aviso", "A pasta não contém imagens JPEG, PNG ou TIFF.")
+            return
+        # A pasta inteira é tratada como um único documento, uma página por imagem
+        self.definir_documentos(self.pdf_paths + [pasta])
+
+    def definir_documentos(self, files):
         self.pdf_paths = files
         self.limpar_thumbnails()
         self.criar_thumbnails()
 
-        self.card_pdfs.set_value(str(len(files)))
+        self.card_pdfs.set_value(str(len(self.pdf_paths)))
         self.card_quest.set_value("0")
-        self.atualizar_status("PDFs selecionados.", "info")
+        self.atualizar_status("Documentos selecionados.", "info")
+        self.iniciar_inspecao()
+
+    def iniciar_inspecao(self):
+        if not self.pdf_paths:
+            self.total_paginas = 0
+            self.card_quest.set_value("0")
+            return
+        worker = InspecaoLoteWorker(self.pdf_paths, self.res_combo.currentData(), self.config)
+        worker.signals.finished.connect(self.inspecao_concluida)
+        worker.signals.error.connect(lambda e: self.atualizar_status(e, "warning"))
+        self.threadpool.start(worker)
+
+    def inspecao_concluida(self, lote):
+        # Ignora resultados de uma seleção anterior
+        if lote["pdf_paths"] != self.pdf_paths:
+            return
+        self.total_paginas = lote["paginas"]
+        self.card_quest.set_value(str(lote["paginas"]))
+        minutos = lote["tempo_estimado_s"] / 60
+        memoria_mb = lote["memoria_pico_bytes"] / (1024 * 1024)
+        msg = f"{lote['paginas']} páginas: ~{minutos:.1f} min, ~{memoria_mb:.0f} MB de memória"
+        if lote["falhas"]:
+            msg += f" ({len(lote['falhas'])} PDF(s) ilegíveis)"
+            self.atualizar_status(msg, "warning")
+        else:
+            self.atualizar_status(msg, "info")
 
     def limpar_thumbnails(self):
         while self.thumb_layout.count():
@@ -538,6 +615,7 @@ class GabaritoApp(QMainWindow):
             self.limpar_thumbnails()
             self.criar_thumbnails()
             self.card_pdfs.set_value(str(len(self.pdf_paths)))
+            self.iniciar_inspecao()
 
     def abrir_preview(self, pdf_path):
         dlg = PDFPreviewDialog(pdf_path, self)
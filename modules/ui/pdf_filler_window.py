@@ -7,9 +7,10 @@ from PyQt6.QtWidgets import (
 )
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QColor
-from modules.core.pdf_filler import preencher_pdf_com_info
+from modules.core.pdf_filler import preencher_pdf_com_info, eh_modelo_padrao, QUESTOES_MODELO_PADRAO
 from PyPDF2 import PdfMerger
 import tempfile
+import uuid
 from modules.utils import resource_path
 
 
@@ -128,6 +129,17 @@ class PDFFillerWindow(QDialog):
         model_control_layout.addWidget(self.model_name)
         model_control_layout.addStretch()
 
+        # Layout gravado no QR de cada folha: o leitor usa a grade indicada
+        # sem precisar reconhecer o tipo da folha (ver atualizar_layout_modelo)
+        model_control_layout.addWidget(QLabel("Questões:"))
+        self.layout_combo = QComboBox()
+        self.layout_combo.addItem("Não informado", None)
+        for n_questoes in sorted({"10", "20", "30", "40", QUESTOES_MODELO_PADRAO}, key=int):
+            self.layout_combo.addItem(n_questoes, n_questoes)
+        self.layout_combo.setToolTip("Número de questões do modelo, gravado no QR de cada folha")
+        model_control_layout.addWidget(self.layout_combo)
+        self.atualizar_layout_modelo()
+
         btn_selecionar_modelo = self.create_button("Selecionar Modelo PDF", self.btn_primary_style, self.btn_primary_hover, self.btn_primary_pressed)
         btn_selecionar_modelo.clicked.connect(self.selecionar_modelo_pdf)
         model_control_layout.addWidget(btn_selecionar_modelo)
@@ -440,6 +452,12 @@ class PDFFillerWindow(QDialog):
     def atualizar_label_modelo(self):
         nome = os.path.basename(self.modelo_path) if self.modelo_path else "Nenhum modelo selecionado"
         self.model_name.setText(nome)
+        self.atualizar_layout_modelo()
+
+    def atualizar_layout_modelo(self):
+        # O layout do modelo padrão é conhecido; nos outros, o usuário o escolhe
+        padrao = bool(self.modelo_path) and eh_modelo_padrao(self.modelo_path)
+        self.layout_combo.setCurrentIndex(self.layout_combo.findData(QUESTOES_MODELO_PADRAO) if padrao else 0)
 
     def on_aluno_selected(self):
         selected_rows = self.alunos_table.selectionModel().selectedRows()
@@ -705,6 +723,8 @@ class PDFFillerWindow(QDialog):
             merger = PdfMerger()
             arquivos_temp = []
             erros = 0
+            # As páginas do arquivo final compartilham o lote do QR e são numeradas em sequência
+            lote = uuid.uuid4().hex[:8]
 
             for i, aluno in enumerate(alunos_turma):
                 try:
@@ -714,7 +734,10 @@ class PDFFillerWindow(QDialog):
 
                     temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
                     temp_file.close()
-                    preencher_pdf_com_info(self.modelo_path, [aluno], temp_file.name)
+                    preencher_pdf_com_info(
+                        self.modelo_path, [aluno], temp_file.name,
+                        layout=self.layout_combo.currentData(), lote=lote, pagina_inicial=len(arquivos_temp) + 1
+                    )
                     merger.append(temp_file.name)
                     arquivos_temp.append(temp_file.name)
                 except Exception as e:
@@ -794,7 +817,10 @@ class PDFFillerWindow(QDialog):
         try:
             nome_arquivo = f"{turma.replace(' ', '_')}_gabaritos.pdf"
             caminho_saida = os.path.join(pasta_saida, nome_arquivo)
-            preencher_pdf_com_info(self.modelo_path, [a.dict() for a in alunos_filtrados], caminho_saida)
+            preencher_pdf_com_info(
+                self.modelo_path, [a.dict() for a in alunos_filtrados], caminho_saida,
+                layout=self.layout_combo.currentData()
+            )
 
             QMessageBox.information(self, "Sucesso", f"PDF gerado com sucesso em:\n{caminho_saida}")
 
@@ -15,7 +15,8 @@ from PyQt6.QtWidgets import (
 )
 from PyQt6.QtCore import Qt, QSize, QTimer, QThread, pyqtSignal, QObject, QRunnable, QThreadPool, QByteArray, QPropertyAnimation, QEasingCurve
 from PyQt6.QtGui import QPixmap, QImage, QColor, QFont, QPalette, QIcon
-from modules.core.converter import converter_pdf_em_imagens
+from modules.core.converter import contar_paginas_arquivo, iterar_paginas_arquivo, eh_pdf
+from modules.core.page_cache import obter_cache_paginas
 from modules.ui.icon_provider import IconProvider
 from PIL import Image, ImageOps
 from PIL.ImageQt import ImageQt
@@ -282,19 +283,18 @@ class PDFLoaderThread(QThread):
             logger.info(f"Iniciando carregamento do PDF: {self.pdf_path}")
             start_time = time.time()
             
-            # Carregar o PDF
-            pages = converter_pdf_em_imagens(self.pdf_path, dpi=self.dpi)
+            # Contar páginas sem rasterizar; as páginas são geradas uma a uma
+            total_pages = contar_paginas_arquivo(self.pdf_path)
             
-            if not pages:
+            if not total_pages:
                 logger.error(f"Falha ao carregar o PDF: {self.pdf_path}")
                 self.signals.error.emit("Não foi possível carregar o PDF.")
                 return
             
-            logger.info(f"PDF carregado com {len(pages)} páginas em {time.time() - start_time:.2f} segundos")
+            logger.info(f"PDF aberto com {total_pages} páginas em {time.time() - start_time:.2f} segundos")
             
             # Processar cada página
-            total_pages = len(pages)
-            for i, page in enumerate(pages):
+            for i, page in iterar_paginas_arquivo(self.pdf_path, dpi=self.dpi, cache=obter_cache_paginas()):
                 if self._abort:
                     logger.info("Carregamento de PDF abortado")
                     return
@@ -515,8 +515,8 @@ class PDFPreviewDialog(QDialog):
         
         layout.addWidget(header_frame)
 
-        # Se PDF_VIEW_AVAILABLE, tenta carregar com QPdfView
-        if PDF_VIEW_AVAILABLE:
+        # Se PDF_VIEW_AVAILABLE, tenta carregar com QPdfView (apenas PDFs; imagens usam o visualizador próprio)
+        if PDF_VIEW_AVAILABLE and eh_pdf(pdf_path):
             try:
                 logger.info("Tentando usar QPdfView")
                 doc = QPdfDocument(self)
@@ -26,14 +26,18 @@ class _ThumbWorker(QThread):
 
     def run(self):  # noqa: D401  ‑ Qt style
         try:
-            from modules.core.converter import converter_pdf_em_imagens
-
-            pages = converter_pdf_em_imagens(self._pdf_path, dpi=70)
-            if not pages:
-                self.error.emit("Falha ao converter o PDF em imagem.")
+            from modules.core.converter import iterar_paginas_arquivo
+            from modules.core.page_cache import obter_cache_paginas
+
+            primeira = next(
+                iterar_paginas_arquivo(self._pdf_path, dpi=70, paginas=[0], cache=obter_cache_paginas()),
+                None
+            )
+            if primeira is None:
+                self.error.emit("Falha ao converter o documento em imagem.")
                 return
 
-            img = pages[0]
+            _, img = primeira
             img.thumbnail(THUMB_SIZE, Image.Resampling.LANCZOS)
             qimg = ImageQt(img)
             pix = QPixmap.fromImage(qimg)
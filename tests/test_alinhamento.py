@@ -0,0 +1,118 @@
+import cv2
+import numpy as np
+import pytest
+
+from modules.core.alinhamento import CacheAlinhamento
+from modules.core.detector import janelas_confiaveis, verificar_alinhamento
+from modules.core.template_registry import extrair_caracteristicas
+
+ORIGEM = (200, 150)
+
+
+def _template(largura=600, altura=400):
+    rng = np.random.default_rng(1)
+    img = np.full((altura, largura), 255, dtype=np.uint8)
+    for _ in range(80):
+        x, y = rng.integers(0, largura - 40), rng.integers(0, altura - 40)
+        cv2.rectangle(img, (int(x), int(y)), (int(x + rng.integers(6, 40)), int(y + rng.integers(6, 40))), 0, 2)
+    for i in range(8):
+        cv2.putText(img, f"Q{i} ABCDE", (20 + 70 * (i % 4), 60 + 90 * (i // 4)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, 0, 1)
+    return img
+
+
+@pytest.fixture(scope="module")
+def template():
+    cinza = _template()
+    return {"cinza": cinza, "caracteristicas": extrair_caracteristicas(cinza)}
+
+
+def _pagina(template_cinza, transformacao=None):
+    pagina = np.full((800, 1000), 255, dtype=np.uint8)
+    h, w = template_cinza.shape
+    x, y = ORIGEM
+    pagina[y:y + h, x:x + w] = template_cinza
+    if transformacao is not None:
+        pagina = cv2.warpAffine(pagina, transformacao, (1000, 800), borderValue=255)
+    return pagina
+
+
+def _cantos(template_cinza, transformacao=None):
+    h, w = template_cinza.shape
+    x, y = ORIGEM
+    cantos = np.array([[x, y], [x + w, y], [x + w, y + h], [x, y + h]], dtype=np.float64)
+    if transformacao is not None:
+        cantos = cantos @ transformacao[:, :2].T + transformacao[:, 2]
+    return cantos
+
+
+def test_alinhamento_que_vale_e_mantido(template):
+    pts_ref = [tuple(p) for p in _cantos(template["cinza"])]
+    pts, score = verificar_alinhamento(_pagina(template["cinza"]), pts_ref, template)
+    assert pts == pts_ref
+    assert score > 0.9
+
+
+def test_corrige_deslocamento_e_rotacao_com_uma_semelhanca(template):
+    # A folha seguinte escorregou e girou um pouco no scanner
+    transformacao = cv2.getRotationMatrix2D((500, 400), 1.0, 1.0)
+    transformacao[:, 2] += (6, -4)
+    pagina = _pagina(template["cinza"], transformacao)
+    pts_anterior = [tuple(p) for p in _cantos(template["cinza"])]
+
+    pts, score = verificar_alinhamento(pagina, pts_anterior, template)
+    assert pts is not None and score > 0.5
+    np.testing.assert_allclose(pts, _cantos(template["cinza"], transformacao), atol=2)
+
+
+def test_rejeita_pagina_de_outro_tipo(template):
+    outra = _pagina(np.flipud(template["cinza"]))
+    pts, score = verificar_alinhamento(outra, [tuple(p) for p in _cantos(template["cinza"])], template)
+    assert pts is None
+    assert score < 0.5
+
+
+def test_janelas_confiaveis_descartam_o_que_falta_na_folha(template):
+    pts_ref = [tuple(p) for p in _cantos(template["cinza"])]
+    todas = janelas_confiaveis(_pagina(template["cinza"]), pts_ref, template)
+    assert len(todas) >= 8
+
+    # Metade direita do template ausente na folha (por exemplo, preenchida
+    # por outro formulário): as janelas de lá não servem de verificação
+    parcial = template["cinza"].copy()
+    parcial[:, 300:] = 255
+    janelas = janelas_confiaveis(_pagina(parcial), pts_ref, template)
+    assert 0 < len(janelas) < len(todas)
+    assert (janelas[:, 0] + janelas[:, 2] <= 300 + 2).all()
+
+    # Com as janelas confiáveis, a página parcial ainda é verificada
+    pts, _ = verificar_alinhamento(_pagina(parcial), pts_ref, template, janelas=janelas)
+    assert pts is not None
+
+
+def test_cache_normaliza_pelo_tamanho_da_pagina():
+    cache = CacheAlinhamento()
+    assert cache.hipotese((100, 200)) is None
+    janelas = np.zeros((3, 4), dtype=np.int32)
+    cache.registrar([(20, 10), (180, 10), (180, 90), (20, 90)], (100, 200), "caracteristicas", janelas)
+
+    hipotese = cache.hipotese((200, 400))
+    assert hipotese["pts_ref"] == [(40, 20), (360, 20), (360, 180), (40, 180)]
+    assert hipotese["metodo"] == "caracteristicas" and hipotese["janelas"] is janelas
+
+    # O reaproveitamento refina os pontos mas mantém as janelas da página localizada
+    cache.registrar([(22, 10), (182, 10), (182, 90), (22, 90)], (100, 200), "caracteristicas", None, reaproveitado=True)
+    assert cache.hipotese((100, 200))["janelas"] is janelas
+    cache.rejeitar()
+    assert cache.estatisticas() == {
+        "reaproveitados": 1, "localizados": 1, "rejeitados": 1, "taxa_reaproveitamento": 0.5,
+    }
+
+
+def test_cache_nao_reaproveita_metodos_nao_verificaveis():
+    cache = CacheAlinhamento()
+    cache.registrar([(0, 0), (1, 0), (1, 1), (0, 1)], (10, 10), "marcadores")
+    assert cache.hipotese((10, 10)) is None
+    cache.registrar([(0, 0), (1, 0), (1, 1), (0, 1)], (10, 10), "template")
+    cache.registrar(None, (10, 10), "template")
+    assert cache.hipotese((10, 10)) is None
@@ -0,0 +1,60 @@
+import cv2
+import numpy as np
+import pytest
+
+from modules.core.calibracao import calibrar_layout, detectar_bolhas
+from modules.core.layout import expandir_layout_parametrico
+
+ORIGENS = [(60, 80), (460, 80)]
+PASSO_COLUNA = 40
+PASSO_LINHA = 36
+LINHAS = 6
+RAIO = 12
+
+
+def _gabarito_em_branco(alternativas=5):
+    img = np.full((400, 800), 255, dtype=np.uint8)
+    for ox, oy in ORIGENS:
+        for r in range(LINHAS):
+            for a in range(alternativas):
+                cx, cy = ox + a * PASSO_COLUNA, oy + r * PASSO_LINHA
+                cv2.circle(img, (cx, cy), RAIO, 0, 2)
+                # A letra da alternativa dentro da bolha
+                cv2.rectangle(img, (cx - 3, cy - 4), (cx + 3, cy + 4), 0, 1)
+    # Texto impresso que não é bolha
+    cv2.putText(img, "NOME DO ALUNO", (60, 360), cv2.FONT_HERSHEY_SIMPLEX, 1, 0, 2)
+    return img
+
+
+def test_detecta_somente_as_bolhas():
+    bolhas = detectar_bolhas(_gabarito_em_branco())
+    assert len(bolhas) == 2 * LINHAS * 5
+    assert np.all(np.abs(bolhas[:, 2:] - (2 * RAIO + 1)) <= 2)
+
+
+def test_calibra_blocos_e_passos():
+    parametrico = calibrar_layout(_gabarito_em_branco(), referencia="marcadores")
+    assert (parametrico["largura"], parametrico["altura"]) == (800, 400)
+    assert parametrico["referencia"] == "marcadores"
+    assert parametrico["alternativas"] == 5
+    assert len(parametrico["blocos"]) == 2
+    for bloco, (ox, oy) in zip(parametrico["blocos"], ORIGENS):
+        assert bloco["linhas"] == LINHAS
+        assert bloco["passo_coluna"] == pytest.approx(PASSO_COLUNA, abs=0.5)
+        assert bloco["passo_linha"] == pytest.approx(PASSO_LINHA, abs=0.5)
+        assert bloco["origem"][0] + bloco["bolha"][0] / 2 == pytest.approx(ox, abs=1)
+        assert bloco["origem"][1] + bloco["bolha"][1] / 2 == pytest.approx(oy, abs=1)
+
+
+def test_layout_expandido_cobre_as_bolhas_impressas():
+    layout = expandir_layout_parametrico(calibrar_layout(_gabarito_em_branco()))
+    assert len(layout) == 2 * LINHAS
+    centros = (layout["bolhas"][..., :2] + layout["bolhas"][..., 2:]) / 2
+    ox, oy = ORIGENS[1]
+    esperados = [(ox + a * PASSO_COLUNA, oy + 2 * PASSO_LINHA) for a in range(5)]
+    np.testing.assert_allclose(centros[LINHAS + 2], esperados, atol=1.5)
+
+
+def test_imagem_sem_grade():
+    with pytest.raises(ValueError):
+        calibrar_layout(np.full((200, 200), 255, dtype=np.uint8))
@@ -0,0 +1,177 @@
+import io
+import os
+import types
+
+import cv2
+import fitz
+import numpy as np
+from PIL import Image
+
+from modules.core.converter import (
+    ajustar_contraste, ajustar_contraste_np, contar_paginas_arquivo, contar_paginas_pdf, converter_pdf_em_imagens,
+    extrair_scan_embutido, iterar_paginas_arquivo, iterar_paginas_imagem, iterar_paginas_pdf,
+    iterar_paginas_pdf_paralelo, listar_imagens_pasta, paginas_imagem, pixmap_para_numpy, remover_ruido_e_binarizar,
+    remover_ruido_e_binarizar_np, renderizar_pagina_cinza
+)
+from modules.core.page_cache import CachePaginas
+
+
+def _pdf_vetorial(caminho, n_paginas=3):
+    """Páginas A5 com um texto e uma faixa diferentes em cada uma."""
+    with fitz.open() as doc:
+        for n in range(n_paginas):
+            page = doc.new_page(width=420, height=595)
+            page.insert_text((40, 60 + 40 * n), f"Pagina {n + 1}", fontsize=20)
+            page.draw_rect(fitz.Rect(40, 200 + 60 * n, 380, 230 + 60 * n), color=None, fill=(0.3, 0.3, 0.3))
+        doc.save(str(caminho))
+    return str(caminho)
+
+
+def test_iterar_paginas_pdf_gera_uma_pagina_por_vez(tmp_path):
+    pdf = _pdf_vetorial(tmp_path / "a.pdf")
+    paginas = iterar_paginas_pdf(pdf, dpi=72)
+    assert isinstance(paginas, types.GeneratorType)
+    indice, primeira = next(paginas)
+    assert indice == 0 and primeira.size == (420, 595)
+    assert contar_paginas_pdf(pdf) == 3
+
+
+def test_iterar_paginas_pdf_igual_a_conversao_completa(tmp_path):
+    pdf = _pdf_vetorial(tmp_path / "a.pdf")
+    completas = converter_pdf_em_imagens(pdf, dpi=72)
+    geradas = list(iterar_paginas_pdf(pdf, dpi=72, formato="numpy"))
+    assert [n for n, _ in geradas] == [0, 1, 2]
+    for pil_img, (_, img_np) in zip(completas, geradas):
+        np.testing.assert_array_equal(np.array(pil_img), img_np)
+
+
+def test_selecao_de_paginas_e_dpi_por_pagina(tmp_path):
+    pdf = _pdf_vetorial(tmp_path / "a.pdf")
+    geradas = list(iterar_paginas_pdf(pdf, dpi=72, paginas=[2, 7, 0, -1], dpi_por_pagina={0: 144}, formato="numpy"))
+    assert [n for n, _ in geradas] == [2, 0]
+    assert geradas[0][1].shape == (595, 420)
+    assert geradas[1][1].shape == (1190, 840)
+
+
+def test_pixmap_para_numpy_igual_ao_png(tmp_path):
+    pdf = _pdf_vetorial(tmp_path / "a.pdf")
+    with fitz.open(pdf) as doc:
+        # 101 dpi: largura ímpar, com preenchimento no fim de cada linha do pixmap
+        pix = renderizar_pagina_cinza(doc[1], 101)
+        img_np = pixmap_para_numpy(pix)
+        assert img_np.base is not None
+        png = np.array(Image.open(io.BytesIO(pix.tobytes("png"))).convert("L"))
+    np.testing.assert_array_equal(img_np, png)
+
+
+def test_preprocessamento_np_igual_ao_pil():
+    img_np = np.random.default_rng(0).integers(40, 230, (120, 90), dtype=np.uint8)
+    img_np[30:60, 20:70] //= 4
+    pil = remover_ruido_e_binarizar(ajustar_contraste(Image.fromarray(img_np)))
+    binaria = remover_ruido_e_binarizar_np(ajustar_contraste_np(img_np))
+    assert np.mean(np.array(pil) != binaria) < 0.01
+
+
+def test_paralelo_gera_as_mesmas_paginas_na_mesma_ordem(tmp_path):
+    pdf = _pdf_vetorial(tmp_path / "a.pdf", n_paginas=7)
+    paginas = [6, 0, 3, 2, 5, 1, 4]
+    sequencial = list(iterar_paginas_pdf(pdf, dpi=50, paginas=paginas, formato="numpy"))
+    paralelo = list(iterar_paginas_pdf_paralelo(
+        pdf, dpi=50, paginas=paginas, formato="numpy", n_workers=2, paginas_por_tarefa=2
+    ))
+    assert [n for n, _ in paralelo] == paginas
+    for (_, esperada), (_, obtida) in zip(sequencial, paralelo):
+        np.testing.assert_array_equal(obtida, esperada)
+
+
+def test_paralelo_com_cache_parcial(tmp_path):
+    pdf = _pdf_vetorial(tmp_path / "a.pdf", n_paginas=7)
+    cache = CachePaginas(str(tmp_path / "cache"))
+    list(iterar_paginas_pdf(pdf, dpi=50, paginas=[1, 4], formato="numpy", cache=cache))
+    sequencial = list(iterar_paginas_pdf(pdf, dpi=50, formato="numpy"))
+    paralelo = list(iterar_paginas_pdf_paralelo(pdf, dpi=50, formato="numpy", n_workers=2, paginas_por_tarefa=2,
+                                                cache=cache))
+    assert [n for n, _ in paralelo] == list(range(7))
+    for (_, esperada), (_, obtida) in zip(sequencial, paralelo):
+        np.testing.assert_array_equal(obtida, esperada)
+    assert cache.estatisticas()["entradas"] == 7
+
+
+def _scan(largura, altura):
+    """Scan sintético: fundo claro com blocos escuros e um degradê."""
+    img = np.full((altura, largura), 235, dtype=np.uint8)
+    img[altura // 8:altura // 4, largura // 8:largura // 2] = 30
+    img[altura // 2:altura // 2 + altura // 10, :] = np.linspace(0, 255, largura, dtype=np.uint8)
+    return img
+
+
+def _pdf_scan(caminho, img, retangulo=None):
+    with fitz.open() as doc:
+        page = doc.new_page(width=420, height=595)
+        jpeg = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 95])[1].tobytes()
+        page.insert_image(retangulo or page.rect, stream=jpeg)
+        page = doc.new_page(width=420, height=595)
+        page.insert_text((40, 60), "Vetorial", fontsize=20)
+        doc.save(str(caminho))
+    return str(caminho)
+
+
+def _renderizada(pdf, dpi):
+    with fitz.open(pdf) as doc:
+        return pixmap_para_numpy(renderizar_pagina_cinza(doc[0], dpi)).copy()
+
+
+def test_scan_embutido_igual_a_renderizacao(tmp_path):
+    pdf = _pdf_scan(tmp_path / "scan.pdf", _scan(1400, 1984))
+    with fitz.open(pdf) as doc:
+        nativa = extrair_scan_embutido(doc[0])
+        reduzida = extrair_scan_embutido(doc[0], dpi=100)
+        assert extrair_scan_embutido(doc[1], dpi=100) is None
+    assert nativa.shape == (1984, 1400)
+    renderizada = _renderizada(pdf, 100)
+    assert reduzida.shape == renderizada.shape
+    assert np.mean(np.abs(reduzida.astype(int) - renderizada)) < 3
+
+
+def test_scan_parcial_colado_na_posicao(tmp_path):
+    # Scan deslocado: cobre a página só em parte, o resto fica branco
+    pdf = _pdf_scan(tmp_path / "parcial.pdf", _scan(600, 840), fitz.Rect(12, 15, 420, 595))
+    with fitz.open(pdf) as doc:
+        extraida = extrair_scan_embutido(doc[0], dpi=144)
+    renderizada = _renderizada(pdf, 144)
+    assert extraida.shape == renderizada.shape
+    assert np.mean(np.abs(extraida.astype(int) - renderizada)) < 3
+    assert (extraida[:29] == 255).all() and (extraida[:, :23] == 255).all()
+
+
+def test_tiff_multipagina_e_pasta_de_scans(tmp_path):
+    quadros = [Image.fromarray(_scan(300, 400)), Image.fromarray(255 - _scan(300, 400))]
+    quadros[0].save(tmp_path / "lote.tif", save_all=True, append_images=quadros[1:], dpi=(150, 150))
+    assert contar_paginas_arquivo(str(tmp_path / "lote.tif")) == 2
+    paginas = list(iterar_paginas_arquivo(str(tmp_path / "lote.tif"), dpi=75, pre_processar=False, formato="numpy"))
+    assert [n for n, _ in paginas] == [0, 1]
+    assert paginas[0][1].shape == (200, 150)
+    assert paginas[0][1].mean() > paginas[1][1].mean()
+
+    pasta = tmp_path / "scans"
+    pasta.mkdir()
+    cv2.imwrite(str(pasta / "b.png"), _scan(300, 400))
+    cv2.imwrite(str(pasta / "a.jpg"), 255 - _scan(300, 400))
+    (pasta / "leia-me.txt").write_text("ignorado")
+    assert [os.path.basename(c) for c in listar_imagens_pasta(str(pasta))] == ["a.jpg", "b.png"]
+    paginas = list(iterar_paginas_arquivo(str(pasta), dpi=300, formato="numpy"))
+    assert [n for n, _ in paginas] == [0, 1]
+    assert set(np.unique(paginas[1][1])) <= {0, 255}
+
+
+def test_jpeg_lido_reduzido_e_sem_orientacao_exif(tmp_path):
+    scan = _scan(1600, 2000)
+    exif = Image.Exif()
+    exif[0x0112] = 6  # girar 90 graus ao exibir
+    Image.fromarray(scan).save(tmp_path / "scan.jpg", quality=95, dpi=(400, 400), exif=exif)
+    paginas_arquivo = paginas_imagem(str(tmp_path / "scan.jpg"))
+    assert paginas_arquivo == [(str(tmp_path / "scan.jpg"), 0, 1600, 2000, 400.0)]
+    _, img_np = next(iterar_paginas_imagem(str(tmp_path / "scan.jpg"), dpi=100, pre_processar=False, formato="numpy"))
+    assert img_np.shape == (500, 400)
+    esperada = cv2.resize(scan, (400, 500), interpolation=cv2.INTER_AREA)
+    assert np.mean(np.abs(img_np.astype(int) - esperada)) < 3
@@ -0,0 +1,255 @@
+import cv2
+import numpy as np
+
+from modules.core.detector import (
+    DENSIDADE_MIN_TINTA, binarizar_para_omr, calcular_razoes_lote, calcular_razoes_preenchimento, classificar_folha,
+    corrigir_perspectiva, corrigir_perspectiva_regiao, densidade_tinta, detectar_area_gabarito_caracteristicas,
+    detectar_area_gabarito_template, detectar_marcadores, detectar_respostas_lote, detectar_respostas_por_grid,
+    orientacao_marcadores, pagina_sem_marcacoes,
+)
+from modules.core.layout import expandir_layout_parametrico
+from modules.core.template_registry import extrair_caracteristicas, miniaturas_classificacao
+
+ORIGEM = (200, 150)
+
+
+def _template(largura=600, altura=400):
+    rng = np.random.default_rng(1)
+    img = np.full((altura, largura), 255, dtype=np.uint8)
+    for _ in range(80):
+        x, y = rng.integers(0, largura - 40), rng.integers(0, altura - 40)
+        cv2.rectangle(img, (int(x), int(y)), (int(x + rng.integers(6, 40)), int(y + rng.integers(6, 40))), 0, 2)
+    for i in range(8):
+        cv2.putText(img, f"Q{i} ABCDE", (20 + 70 * (i % 4), 60 + 90 * (i // 4)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, 0, 1)
+    return img
+
+
+def _pagina(template_cinza, escala=1.0):
+    pagina = np.full((800, 1000), 255, dtype=np.uint8)
+    h, w = template_cinza.shape
+    x, y = ORIGEM
+    pagina[y:y + h, x:x + w] = template_cinza
+    if escala != 1.0:
+        pagina = cv2.resize(pagina, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+    return pagina
+
+
+def test_busca_piramidal_igual_a_exaustiva():
+    template = _template()
+    for escala in (1.0, 1 / 1.1):
+        pagina = _pagina(template, escala)
+        pts_exaustiva, score_exaustiva = detectar_area_gabarito_template(
+            pagina, template, pre_processar=False, piramide=False
+        )
+        pts_piramide, score_piramide = detectar_area_gabarito_template(
+            pagina, template, pre_processar=False, piramide=True
+        )
+        np.testing.assert_allclose(pts_piramide, pts_exaustiva, atol=2)
+        assert score_piramide >= score_exaustiva - 0.02
+        np.testing.assert_allclose(pts_piramide[0], np.array(ORIGEM) * escala, atol=3)
+
+
+def _caixas_aleatorias(rng, altura, largura, n_questoes=12, n_alternativas=5):
+    x0 = rng.integers(0, largura - 1, (n_questoes, n_alternativas))
+    y0 = rng.integers(0, altura - 1, (n_questoes, n_alternativas))
+    x1 = np.minimum(x0 + rng.integers(0, 30, x0.shape), largura)
+    y1 = np.minimum(y0 + rng.integers(0, 20, y0.shape), altura)
+    return np.stack([x0, y0, x1, y1], axis=-1)
+
+
+def _razoes_por_roi(imagem_bin, caixas):
+    """Cálculo original: countNonZero em cada recorte."""
+    razoes = np.zeros(caixas.shape[:-1])
+    for indice in np.ndindex(*caixas.shape[:-1]):
+        x0, y0, x1, y1 = caixas[indice]
+        area = (x1 - x0) * (y1 - y0)
+        if area > 0:
+            razoes[indice] = cv2.countNonZero(imagem_bin[y0:y1, x0:x1]) / area
+    return razoes
+
+
+def test_razoes_iguais_a_contagem_por_roi():
+    rng = np.random.default_rng(2)
+    paginas = [np.where(rng.random((160, 120)) < p, 255, 0).astype(np.uint8) for p in (0.1, 0.5, 0.9)]
+    caixas = _caixas_aleatorias(rng, 160, 120)
+    caixas[0, 0] = (5, 5, 5, 15)  # caixa vazia
+    caixas[1, 0] = (0, 0, 120, 160)  # página inteira
+    esperadas = np.stack([_razoes_por_roi(pagina, caixas) for pagina in paginas])
+
+    for pagina, esperada in zip(paginas, esperadas):
+        np.testing.assert_allclose(calcular_razoes_preenchimento(pagina, caixas), esperada)
+    np.testing.assert_allclose(calcular_razoes_lote(paginas, caixas), esperadas)
+    np.testing.assert_allclose(calcular_razoes_lote(np.stack(paginas) > 0, caixas), esperadas)
+
+
+def _layout_bolhas(linhas=10):
+    return expandir_layout_parametrico({
+        "largura": 500, "altura": 600, "referencia": "template", "alternativas": 5,
+        "blocos": [
+            {"origem": [60, 40], "bolha": [20, 14], "passo_coluna": 34, "passo_linha": 28, "linhas": linhas},
+            {"origem": [300, 40], "bolha": [20, 14], "passo_coluna": 34, "passo_linha": 28, "linhas": linhas},
+        ],
+    })
+
+
+def _folha_respondida(layout, marcadas):
+    """Folha em cinza com o contorno de todas as bolhas e as marcadas preenchidas."""
+    folha = np.full((600, 500), 245, dtype=np.uint8)
+    for q, bolhas in enumerate(layout["bolhas"]):
+        for alternativa, (x0, y0, x1, y1) in enumerate(bolhas.tolist()):
+            centro, eixos = ((x0 + x1) // 2, (y0 + y1) // 2), ((x1 - x0) // 2, (y1 - y0) // 2)
+            preenchida = alternativa in marcadas.get(q, ())
+            cv2.ellipse(folha, centro, eixos, 0, 0, 360, 40, -1 if preenchida else 1)
+    return folha
+
+
+def test_leitura_em_lote_igual_a_leitura_por_pagina():
+    layout = _layout_bolhas()
+    rng = np.random.default_rng(4)
+    gabarito = {q: (int(rng.integers(0, 5)),) for q in range(len(layout))}
+    folhas = [
+        _folha_respondida(layout, gabarito),
+        _folha_respondida(layout, {0: (0, 2), 3: (4,)}),
+        _folha_respondida(layout, {}),
+    ]
+    por_pagina = [detectar_respostas_por_grid(folha, layout, threshold_fill=0.25) for folha in folhas]
+    razoes, em_lote = detectar_respostas_lote([binarizar_para_omr(folha) for folha in folhas], layout, 0.25)
+
+    assert razoes.shape == (3, len(layout), 5)
+    assert em_lote == por_pagina
+    assert [em_lote[0][f"Questao {q + 1}"] for q in gabarito] == ["ABCDE"[a] for a, in gabarito.values()]
+    assert em_lote[1]["Questao 1"] == "N" and em_lote[1]["Questao 4"] == "E"
+    assert set(em_lote[2].values()) == {"Não marcado"}
+
+
+def test_correcao_da_regiao_igual_ao_recorte_da_pagina_corrigida():
+    pagina = _pagina(_template())
+    pts_ref = [(212, 143), (795, 161), (806, 560), (190, 548)]
+    inteira = corrigir_perspectiva(pagina, pts_ref, 800, 1200)
+    x0, y0, x1, y1 = 120, 300, 680, 1050
+    regiao = corrigir_perspectiva_regiao(pagina, pts_ref, 800, 1200, (x0, y0, x1, y1))
+    assert regiao.shape == (y1 - y0, x1 - x0)
+    diferenca = np.abs(regiao.astype(int) - inteira[y0:y1, x0:x1])
+    assert diferenca.max() <= 2 and diferenca.mean() < 0.05
+
+
+CENTROS_MARCADORES = [(80, 90), (920, 90), (920, 1310), (80, 1310)]
+
+
+def _pagina_com_marcadores(lado=24, marcadores=True, centros=CENTROS_MARCADORES):
+    """Folha 1000x1400 com quatro marcadores quadrados, bolhas preenchidas e texto."""
+    pagina = np.full((1400, 1000), 250, dtype=np.uint8)
+    if marcadores:
+        for cx, cy in centros:
+            cv2.rectangle(pagina, (cx - lado // 2, cy - lado // 2), (cx + lado // 2, cy + lado // 2), 0, -1)
+    for i in range(12):
+        cv2.circle(pagina, (200 + 50 * (i % 6), 300 + 40 * (i // 6)), 11, 0, -1 if i % 3 == 0 else 1)
+    cv2.putText(pagina, "GABARITO", (300, 200), cv2.FONT_HERSHEY_SIMPLEX, 1.5, 0, 3)
+    return pagina
+
+
+def test_detecta_os_marcadores_em_ordem():
+    pts_ref = detectar_marcadores(_pagina_com_marcadores())
+    np.testing.assert_allclose(pts_ref, CENTROS_MARCADORES, atol=1)
+
+
+def test_marcadores_sob_perspectiva():
+    destino = np.float32([(30, 50), (980, 20), (960, 1390), (10, 1350)])
+    M = cv2.getPerspectiveTransform(np.float32([(0, 0), (1000, 0), (1000, 1400), (0, 1400)]), destino)
+    pagina = cv2.warpPerspective(_pagina_com_marcadores(), M, (1000, 1400), borderValue=250)
+    esperados = cv2.perspectiveTransform(np.float32([CENTROS_MARCADORES]), M)[0]
+    np.testing.assert_allclose(detectar_marcadores(pagina), esperados, atol=1.5)
+
+
+def test_pagina_sem_marcadores():
+    assert detectar_marcadores(_pagina_com_marcadores(marcadores=False)) is None
+
+
+def test_caracteristicas_localizam_o_template_sob_perspectiva():
+    cinza = _template()
+    template = {"cinza": cinza, "caracteristicas": extrair_caracteristicas(cinza)}
+    x, y = ORIGEM
+    h, w = cinza.shape
+    cantos = np.float32([(x, y), (x + w, y), (x + w, y + h), (x, y + h)])
+    # Folha girada ~8 graus (fora da faixa do template matching) e em perspectiva
+    esperados = np.float32([(240, 120), (830, 200), (790, 610), (185, 525)])
+    M = cv2.getPerspectiveTransform(cantos, esperados)
+    pagina = cv2.warpPerspective(_pagina(cinza), M, (1000, 800), borderValue=255)
+
+    pts_ref, score = detectar_area_gabarito_caracteristicas(pagina, template)
+    np.testing.assert_allclose(pts_ref, esperados, atol=3)
+    assert score > 0.5
+
+    assert detectar_area_gabarito_caracteristicas(np.full((800, 1000), 255, dtype=np.uint8), template) == (None, 0.0)
+
+
+def _folha_tipo(semente, largura=850, altura=1000):
+    """Template de um tipo de folha: cabeçalho e blocos em posições próprias de cada tipo."""
+    rng = np.random.default_rng(semente)
+    img = np.full((altura, largura), 255, dtype=np.uint8)
+    cv2.rectangle(img, (20, 20), (largura - 20, 140), 0, 3)
+    for _ in range(40):
+        x, y = int(rng.integers(20, largura - 140)), int(rng.integers(180, altura - 140))
+        cv2.rectangle(img, (x, y), (x + int(rng.integers(40, 120)), y + int(rng.integers(40, 120))), 0, -1)
+    return img
+
+
+def _templates_tipos():
+    return {chave: {"miniaturas": miniaturas_classificacao(_folha_tipo(semente))}
+            for chave, semente in ((10, 1), (20, 2))}
+
+
+def _pagina_do_tipo(semente):
+    pagina = np.full((1400, 1000), 255, dtype=np.uint8)
+    pagina[200:1200, 75:925] = _folha_tipo(semente)
+    return pagina
+
+
+def test_classificar_folha_escolhe_o_tipo():
+    templates = _templates_tipos()
+    chave, scores, rotacao = classificar_folha(_pagina_do_tipo(2), templates)
+    assert chave == 20 and rotacao == 0
+    assert scores[20] > scores[10] + 0.1
+
+    chave, scores, _ = classificar_folha(_pagina_do_tipo(3), templates)
+    assert chave is None
+
+
+def test_classificar_folha_endireita_a_pagina():
+    templates = _templates_tipos()
+    pagina = _pagina_do_tipo(1)
+    for k in (1, 2, 3):
+        girada = np.rot90(pagina, k)
+        chave, _, rotacao = classificar_folha(girada, templates, girar=True)
+        assert chave == 10
+        np.testing.assert_array_equal(np.rot90(girada, rotacao), pagina)
+
+
+def test_orientacao_pelos_marcadores():
+    # Na folha de pé o quadro dos marcadores fica na metade de baixo
+    pagina = _pagina_com_marcadores(centros=[(80, 600), (920, 600), (920, 1310), (80, 1310)])
+    assert orientacao_marcadores(pagina) == 0
+    for k in (1, 2, 3):
+        girada = np.rot90(pagina, k)
+        np.testing.assert_array_equal(np.rot90(girada, orientacao_marcadores(girada)), pagina)
+    # Quadro centrado: a orientação fica indefinida
+    assert orientacao_marcadores(_pagina_com_marcadores()) is None
+    assert orientacao_marcadores(_pagina_com_marcadores(marcadores=False)) is None
+
+
+def test_densidade_de_tinta_separa_versos_em_branco():
+    rng = np.random.default_rng(5)
+    # Verso: papel acinzentado com ruído e a transparência da frente
+    verso = np.clip(rng.normal(225, 6, (1400, 1000)), 0, 255).astype(np.uint8)
+    verso[200:1200, 75:925][_folha_tipo(1) < 128] -= 25
+    assert densidade_tinta(verso) < DENSIDADE_MIN_TINTA
+    assert densidade_tinta(_pagina_do_tipo(1)) > 10 * DENSIDADE_MIN_TINTA
+
+
+def test_pagina_sem_marcacoes():
+    layout = _layout_bolhas()
+    em_branco = binarizar_para_omr(_folha_respondida(layout, {}))
+    assert pagina_sem_marcacoes(em_branco, layout)
+    uma_marcada = binarizar_para_omr(_folha_respondida(layout, {7: (2,)}))
+    assert not pagina_sem_marcacoes(uma_marcada, layout)
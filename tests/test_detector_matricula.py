@@ -0,0 +1,48 @@
+import numpy as np
+from PIL import Image
+
+from modules.core import detector_matricula
+from modules.core.ocr import ALTURA_MAX_MOSAICO
+
+
+class _Votacao:
+    def __init__(self):
+        self.registros = []
+
+    def registrar(self, texto, marca, config=None):
+        self.registros.append((texto, marca))
+
+
+def _variantes():
+    return [(tecnica, np.full((30, 120), 255, dtype=np.uint8)) for tecnica in ("otsu", "clahe", "invertida")]
+
+
+def test_mosaico_le_todas_as_variantes_em_uma_chamada(tmp_path, monkeypatch):
+    chamadas = []
+
+    def ocr_mosaico(imagens, lang=None, config=""):
+        chamadas.append(len(imagens))
+        return [{"texto": "2023O001"}, {"texto": "12"}, {"texto": "2O23OOO1"}]
+
+    monkeypatch.setattr(detector_matricula, "ocr_mosaico", ocr_mosaico)
+    detector = detector_matricula.DetectorMatricula(debug_dir=str(tmp_path))
+    votacao = _Votacao()
+    resultados = detector.ler_variantes_mosaico(Image.new("L", (120, 30), 255), _variantes(), votacao)
+
+    assert chamadas == [3]
+    assert resultados == [("20230001", 0.8), ("20230001", 0.8)]
+    assert votacao.registros == [
+        ("20230001", "scanner:otsu"), ("12", "scanner:clahe"), ("20230001", "scanner:invertida")
+    ]
+
+
+def test_mosaico_desligado_ou_roi_alta_demais(tmp_path, monkeypatch):
+    def ocr_mosaico(imagens, lang=None, config=""):
+        raise AssertionError("mosaico não deveria ser lido")
+
+    monkeypatch.setattr(detector_matricula, "ocr_mosaico", ocr_mosaico)
+    desligado = detector_matricula.DetectorMatricula({"ocr_mosaico": False}, debug_dir=str(tmp_path))
+    assert desligado.ler_variantes_mosaico(Image.new("L", (120, 30), 255), _variantes()) == []
+    ligado = detector_matricula.DetectorMatricula(debug_dir=str(tmp_path))
+    roi_alta = Image.new("L", (120, ALTURA_MAX_MOSAICO + 1), 255)
+    assert ligado.ler_variantes_mosaico(roi_alta, _variantes()) == []
@@ -0,0 +1,55 @@
+import json
+
+from modules.core.estrategias_matricula import (
+    ETAPAS_MATRICULA, EstatisticasEstrategias, obter_estatisticas_estrategias, perfil_matricula,
+)
+
+
+def test_sem_historico_mantem_a_ordem_fixa(tmp_path):
+    estatisticas = EstatisticasEstrategias(str(tmp_path / "e.json"))
+    assert estatisticas.ordenar("26|pdf", list(ETAPAS_MATRICULA)) == list(ETAPAS_MATRICULA)
+    assert estatisticas.ordenar("26|pdf", ["b", "a"], grupo="tesseract") == ["b", "a"]
+
+
+def test_etapa_barata_que_acerta_passa_a_frente(tmp_path):
+    estatisticas = EstatisticasEstrategias(str(tmp_path / "e.json"))
+    for _ in range(30):
+        estatisticas.registrar("26|scanner", "scanner_mosaico", False, 0.05)
+        estatisticas.registrar("26|scanner", "recortes", False, 0.1)
+        estatisticas.registrar("26|scanner", "tecnicas_multiplas", True, 0.2)
+    ordem = estatisticas.ordenar("26|scanner", list(ETAPAS_MATRICULA))
+    assert ordem[0] == "tecnicas_multiplas"
+    # Outros perfis não são afetados
+    assert estatisticas.ordenar("26|pdf", list(ETAPAS_MATRICULA)) == list(ETAPAS_MATRICULA)
+
+
+def test_grava_e_recarrega(tmp_path):
+    caminho = tmp_path / "sub" / "e.json"
+    estatisticas = EstatisticasEstrategias(str(caminho))
+    estatisticas.salvar()
+    assert not caminho.exists()
+    estatisticas.registrar("26|pdf", "recortes", True, 0.25)
+    estatisticas.salvar()
+
+    recarregadas = EstatisticasEstrategias(str(caminho))
+    linha = recarregadas.estatisticas()["26|pdf"]["etapas"][0]
+    assert (linha["estrategia"], linha["tentativas"], linha["acertos"]) == ("recortes", 1, 1)
+    assert linha["custo_medio"] == 0.25
+
+    recarregadas.limpar("26|pdf")
+    recarregadas.salvar()
+    assert json.loads(caminho.read_text(encoding="utf-8")) == {"perfis": {}}
+
+
+def test_arquivo_ilegivel_recomeca(tmp_path):
+    caminho = tmp_path / "e.json"
+    caminho.write_text("{quebrado", encoding="utf-8")
+    assert EstatisticasEstrategias(str(caminho)).estatisticas() == {}
+
+
+def test_perfil_e_instancia_compartilhada(tmp_path):
+    config = {"matricula_estatisticas_arquivo": str(tmp_path / "e.json"), "scanned_by_printer": True}
+    assert perfil_matricula(config, 26) == "26|scanner"
+    assert perfil_matricula({}, 26) == "26|pdf"
+    assert obter_estatisticas_estrategias(config) is obter_estatisticas_estrategias(config)
+    assert obter_estatisticas_estrategias({"matricula_ordem_adaptativa": False}) is None
@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+
+from modules.core.layout import (
+    ROI_FORA, ROI_INVALIDO, ROI_OK, caixas_na_pagina, compilar_layout, expandir_layout_parametrico,
+    limpar_layouts, obter_layout,
+)
+
+GRID = [
+    [{"x": 10, "y": 20, "width": 100, "height": 10}, {"x": 10, "y": 40, "width": 0, "height": 10}],
+    [{"x": 200, "y": 20, "width": 103, "height": 10}],
+]
+
+
+def _parametrico(referencia="template", alternativas=4):
+    return {
+        "largura": 1000, "altura": 500, "referencia": referencia, "alternativas": alternativas,
+        "blocos": [{"origem": [100, 50], "bolha": [20, 10], "passo_coluna": 40, "passo_linha": 30, "linhas": 3}],
+    }
+
+
+@pytest.fixture(autouse=True)
+def _sem_cache():
+    limpar_layouts()
+    yield
+    limpar_layouts()
+
+
+def test_compilar_divide_as_alternativas():
+    layout = compilar_layout(GRID, 4)
+    assert layout["questao"].tolist() == [1, 2, 3]
+    assert layout["coluna"].tolist() == [0, 0, 1]
+    assert layout["valida"].tolist() == [True, False, True]
+    # A última faixa absorve o resto da largura
+    assert layout["alternativas"][2, :, 0].tolist() == [200, 225, 250, 275]
+    assert layout["alternativas"][2, -1, 2] == 303
+    assert not layout.flags.writeable
+
+
+def test_expandir_escala_para_a_area_corrigida():
+    layout = expandir_layout_parametrico(_parametrico(), 2000, 1000)
+    assert len(layout) == 3
+    assert layout["bolhas"][0, 0].tolist() == [200, 100, 240, 120]
+    assert layout["bolhas"][1, 1].tolist() == [280, 160, 320, 180]
+
+
+def test_caixas_fora_da_pagina():
+    caixas, estados = caixas_na_pagina(compilar_layout(GRID, 4), altura=100, largura=150)
+    assert estados.tolist() == [ROI_OK, ROI_INVALIDO, ROI_FORA]
+    assert not caixas[1:].any()
+
+
+def test_precedencia_do_layout_calibrado():
+    config = {"grid_rois": {"3": GRID}, "largura_corrigida": 2000, "altura_corrigida": 1000}
+    assert obter_layout(config, 3, 4)["caixa"][0].tolist() == [10, 20, 100, 10]
+
+    limpar_layouts()
+    config["layouts_parametricos"] = {"3": _parametrico()}
+    calibrado = obter_layout(config, 3, 4)
+    assert calibrado["bolhas"][0, 0].tolist() == [200, 100, 240, 120]
+    assert obter_layout(config, 3, 4) is calibrado
+
+    # Calibrado sobre a página inteira: fica no quadro da calibração
+    limpar_layouts()
+    config["layouts_parametricos"] = {"3": _parametrico("pagina")}
+    assert obter_layout(config, 3, 4)["bolhas"][0, 0].tolist() == [100, 50, 120, 60]
+
+
+def test_quadro_dos_marcadores_nao_usa_grid_rois():
+    config = {"grid_rois": {"3": GRID}, "layouts_parametricos": {"3": _parametrico()},
+              "largura_corrigida": 2000, "altura_corrigida": 1000}
+    assert obter_layout(config, 3, 4, quadro="marcadores") is None
+
+    config["layouts_marcadores"] = {"3": _parametrico("marcadores", alternativas=5)}
+    marcadores = obter_layout(config, 3, 4, quadro="marcadores")
+    assert marcadores["alternativas"].shape[1] == 5
+    assert obter_layout(config, 3, 4) is not marcadores
+
+
+def test_layout_inexistente():
+    assert obter_layout({}, 3, 4) is None
+    assert np.array_equal(obter_layout({"grid_rois": {"3": GRID}}, "3", 4)["questao"], [1, 2, 3])
+
+
+def test_configuracao_alterada_compila_outro_layout():
+    config = {"grid_rois": {"3": GRID}}
+    original = obter_layout(config, 3, 4)
+    assert obter_layout(dict(config), 3, 4) is original
+
+    outra_grade = [[dict(roi, x=roi["x"] + 5) for roi in coluna] for coluna in GRID]
+    assert obter_layout({"grid_rois": {"3": outra_grade}}, 3, 4)["caixa"][0].tolist() == [15, 20, 100, 10]
+
+    config["layouts_parametricos"] = {"3": _parametrico()}
+    config["largura_corrigida"], config["altura_corrigida"] = 2000, 1000
+    assert obter_layout(config, 3, 4)["bolhas"][0, 0].tolist() == [200, 100, 240, 120]
+    config["largura_corrigida"], config["altura_corrigida"] = 1000, 500
+    assert obter_layout(config, 3, 4)["bolhas"][0, 0].tolist() == [100, 50, 120, 60]
+
+
+def _faixas_originais(roi, num_alternativas, altura, largura):
+    """Faixas de uma ROI como a leitura original por questão as recortava."""
+    x, y = max(0, roi["x"]), max(0, roi["y"])
+    w, h = min(roi["width"], largura - x), min(roi["height"], altura - y)
+    sub_w = w // num_alternativas
+    return [
+        [x + a * sub_w, y, x + ((a + 1) * sub_w if a < num_alternativas - 1 else w), y + h]
+        for a in range(num_alternativas)
+    ]
+
+
+def test_caixa_parcialmente_fora_e_empurrada_como_na_leitura_original():
+    grade = [[
+        {"x": -12, "y": 5, "width": 100, "height": 10},
+        {"x": 90, "y": -3, "width": 80, "height": 10},
+        {"x": 20, "y": 95, "width": 40, "height": 10},
+    ]]
+    caixas, estados = caixas_na_pagina(compilar_layout(grade, 4), altura=100, largura=150)
+    assert estados.tolist() == [ROI_OK] * 3
+    for caixa, roi in zip(caixas, grade[0]):
+        assert caixa.tolist() == _faixas_originais(roi, 4, 100, 150)
+    # A largura da primeira caixa é mantida, não cortada na borda
+    assert caixas[0, -1, 2] - caixas[0, 0, 0] == 100
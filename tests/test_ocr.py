@@ -0,0 +1,61 @@
+import numpy as np
+from PIL import Image
+
+from modules.core import ocr
+
+
+def test_interpretar_config():
+    assert ocr._interpretar_config("--psm 7 --oem 1 -l por -c tessedit_char_whitelist=0123456789 --dpi 300") == (
+        7, 1, 300, "por", {"tessedit_char_whitelist": "0123456789"}
+    )
+    assert ocr._interpretar_config("") == (ocr.PSM_PADRAO, ocr.OEM_PADRAO, ocr.DPI_PADRAO, None, {})
+    # Opções desconhecidas são ignoradas
+    assert ocr._interpretar_config("--foo --psm 6")[0] == 6
+
+
+def test_para_array():
+    assert ocr._para_array(Image.new("1", (4, 3))).shape == (3, 4)
+    assert ocr._para_array(Image.new("RGBA", (4, 3))).shape == (3, 4, 3)
+    binaria = ocr._para_array(np.eye(3, dtype=bool))
+    assert binaria.dtype == np.uint8 and binaria.max() == 255
+    assert ocr._para_array(np.full((2, 2), 300.0)).max() == 255
+
+
+def test_mosaico_empilha_e_inverte_fundo_escuro():
+    claro = np.full((10, 30), 250, dtype=np.uint8)
+    escuro = np.full((20, 15), 5, dtype=np.uint8)
+    mosaico, faixas = ocr.montar_mosaico([claro, escuro])
+    assert faixas == [(10, 20), (30, 50)]
+    assert mosaico.shape == (60, 50)
+    assert (mosaico[30:50, 10:25] == 250).all()
+
+
+def test_ocr_mosaico_devolve_cada_palavra_ao_seu_recorte(monkeypatch):
+    recortes = [np.full((10, 30), 255, dtype=np.uint8), np.full((20, 15), 255, dtype=np.uint8)]
+    _, faixas = ocr.montar_mosaico(recortes)
+    palavras = [("123", faixas[0][0], 90), ("456", faixas[1][0] + 5, 70), ("789", faixas[1][0] + 5, 50),
+                ("lixo", faixas[1][1] + 2, 99)]
+
+    def image_to_data(imagem, lang=None, config="", output_type=None):
+        return {
+            "level": [5] * len(palavras),
+            "text": [p[0] for p in palavras],
+            "top": [p[1] for p in palavras],
+            "height": [4] * len(palavras),
+            "conf": [p[2] for p in palavras],
+        }
+
+    monkeypatch.setattr(ocr, "image_to_data", image_to_data)
+    resultados = ocr.ocr_mosaico(recortes)
+    assert resultados == [{"texto": "123", "confianca": 0.9}, {"texto": "456 789", "confianca": 0.6}]
+    assert ocr.ocr_mosaico([]) == []
+
+
+def test_motor_de_processo_quando_configurado(monkeypatch):
+    monkeypatch.setattr(ocr, "_opcoes", dict(ocr._opcoes))
+    ocr.configurar_ocr({"ocr_motor": "processo"})
+    try:
+        assert ocr.obter_motor().nome == "processo"
+        assert ocr.obter_motor() is ocr.obter_motor()
+    finally:
+        ocr.configurar_ocr({})
@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+
+from modules.core.page_cache import CachePaginas, hash_arquivo
+
+
+def test_hash_arquivo_muda_com_o_conteudo(tmp_path):
+    arquivo = tmp_path / "a.pdf"
+    arquivo.write_bytes(b"um")
+    primeiro = hash_arquivo(str(arquivo))
+    assert hash_arquivo(str(arquivo)) == primeiro
+    arquivo.write_bytes(b"outro conteudo")
+    assert hash_arquivo(str(arquivo)) != primeiro
+
+
+def test_grava_e_obtem_cinza_e_binaria(tmp_path):
+    cache = CachePaginas(str(tmp_path))
+    cinza = np.arange(200, dtype=np.uint8).reshape(10, 20)
+    binaria = np.where(np.eye(12, 17, dtype=bool), 255, 0).astype(np.uint8)
+    cache.gravar("h", 0, 150, "cinza", cinza)
+    cache.gravar("h", 1, 150, "bin", binaria, binaria=True)
+
+    np.testing.assert_array_equal(cache.obter("h", 0, 150, "cinza"), cinza)
+    np.testing.assert_array_equal(cache.obter("h", 1, 150, "bin"), binaria)
+    assert cache.obter("h", 0, 300, "cinza") is None
+    assert cache.obter("h", 0, 150, "outra") is None
+    estatisticas = cache.estatisticas()
+    assert (estatisticas["acertos"], estatisticas["falhas"], estatisticas["entradas"]) == (2, 2, 2)
+
+
+def test_lru_remove_a_entrada_acessada_ha_mais_tempo(tmp_path):
+    ruido = np.random.default_rng(0).integers(0, 256, (100, 100), dtype=np.uint8)
+    cache = CachePaginas(str(tmp_path), tamanho_max_mb=1)
+    cache.gravar("h", 0, 150, "cinza", ruido)
+    tamanho = cache.estatisticas()["bytes"]
+    cache.tamanho_max = int(tamanho * 2.5)
+    cache.gravar("h", 1, 150, "cinza", ruido)
+    antigo = os.path.getmtime(cache._caminho("h", 1, 150, "cinza")) - 10
+    os.utime(cache._caminho("h", 1, 150, "cinza"), (antigo, antigo))
+    cache._entradas[cache._caminho("h", 1, 150, "cinza")][1] = antigo
+    cache.gravar("h", 2, 150, "cinza", ruido)
+
+    assert not cache.contem("h", 1, 150, "cinza")
+    assert cache.contem("h", 0, 150, "cinza") and cache.contem("h", 2, 150, "cinza")
+
+
+def test_entrada_corrompida_e_descartada(tmp_path):
+    cache = CachePaginas(str(tmp_path))
+    cache.gravar("h", 0, 150, "cinza", np.zeros((4, 4), dtype=np.uint8))
+    with open(cache._caminho("h", 0, 150, "cinza"), "wb") as f:
+        f.write(b"lixo")
+    assert cache.obter("h", 0, 150, "cinza") is None
+    assert not cache.contem("h", 0, 150, "cinza")
+
+
+def test_indexa_entradas_existentes(tmp_path):
+    CachePaginas(str(tmp_path)).gravar("h", 0, 150, "cinza", np.zeros((4, 4), dtype=np.uint8))
+    assert CachePaginas(str(tmp_path)).estatisticas()["entradas"] == 1
@@ -0,0 +1,48 @@
+import fitz
+
+from modules.core.converter import iterar_paginas_arquivo
+from modules.core.pdf_filler import (
+    LADO_QR_PT, MODELO_PADRAO, POSICAO_QR_PT, posicao_qr, preencher_pdf_com_info,
+)
+from modules.core.qr_folha import ler_qr_folha
+
+
+def _modelo(caminho):
+    """Modelo com conteúdo no canto em que o QR do modelo padrão fica."""
+    with fitz.open() as doc:
+        page = doc.new_page(width=595, height=842)
+        page.draw_rect(fitz.Rect(400, 20, 590, 200), color=None, fill=(0, 0, 0))
+        page.insert_text((72, 300), "Cartão-resposta", fontsize=14)
+        doc.save(str(caminho))
+    return str(caminho)
+
+
+def test_qr_vai_para_o_espaco_livre_mais_proximo(tmp_path):
+    with fitz.open(_modelo(tmp_path / "modelo.pdf")) as doc:
+        cx, cy = posicao_qr(doc[0])
+    livre = fitz.Rect(cx - LADO_QR_PT / 2, cy - LADO_QR_PT / 2, cx + LADO_QR_PT / 2, cy + LADO_QR_PT / 2)
+    assert not livre.intersects(fitz.Rect(400, 20, 590, 200))
+    assert abs(cx - POSICAO_QR_PT[0]) + abs(cy - POSICAO_QR_PT[1]) < 200
+
+
+def test_modelo_padrao_mantem_a_posicao_medida():
+    with fitz.open(MODELO_PADRAO) as doc:
+        assert posicao_qr(doc[0]) == POSICAO_QR_PT
+
+
+def test_pagina_sem_espaco_livre():
+    with fitz.open() as doc:
+        page = doc.new_page()
+        page.draw_rect(page.rect, color=None, fill=(0.5, 0.5, 0.5))
+        assert posicao_qr(page) is None
+
+
+def test_qr_com_o_layout_escolhido_em_outro_modelo(tmp_path):
+    saida = str(tmp_path / "folhas.pdf")
+    preencher_pdf_com_info(_modelo(tmp_path / "modelo.pdf"), [{"nome": "A", "matricula": "20230001"}],
+                           saida, layout="30", lote="L1")
+    (_, pagina), = iterar_paginas_arquivo(saida, dpi=150, formato="numpy", cache=None)
+    assert ler_qr_folha(pagina) == ({"matricula": "20230001", "layout": "30", "pagina": 1, "lote": "L1"}, 0)
+    # Os marcadores só são estampados no modelo padrão
+    with fitz.open(saida) as doc:
+        assert not [d for d in doc[0].get_drawings() if d["rect"].width == d["rect"].height == 14]
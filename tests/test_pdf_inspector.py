@@ -0,0 +1,74 @@
+import os
+
+import cv2
+import fitz
+import numpy as np
+
+from modules.core.pdf_inspector import estimar_custo, estimar_lote, inspecionar_arquivo, inspecionar_pdf
+
+
+def _png(largura=60, altura=80, valor=200):
+    return cv2.imencode(".png", np.full((altura, largura), valor, dtype=np.uint8))[1].tobytes()
+
+
+def _pdf(caminho, paginas):
+    """paginas: lista de 'scan', 'parcial' ou 'vetorial'."""
+    with fitz.open() as doc:
+        for tipo in paginas:
+            page = doc.new_page(width=595, height=842)
+            if tipo == "scan":
+                page.insert_image(page.rect, stream=_png())
+            elif tipo == "parcial":
+                page.insert_image(fitz.Rect(0, 0, 300, 400), stream=_png())
+            else:
+                page.insert_text((72, 72), "Gabarito")
+        doc.save(str(caminho))
+    return str(caminho)
+
+
+def test_classifica_paginas_escaneadas(tmp_path):
+    escaneado = inspecionar_pdf(_pdf(tmp_path / "scan.pdf", ["scan", "scan"]))
+    assert escaneado["tipo"] == "escaneado" and escaneado["paginas"] == 2
+    assert escaneado["tamanhos"] == [(595, 842)] * 2
+
+    misto = inspecionar_pdf(_pdf(tmp_path / "misto.pdf", ["scan", "parcial", "vetorial"]))
+    assert misto["tipo"] == "misto"
+    assert misto["escaneadas"] == [True, False, False]
+
+    assert inspecionar_pdf(_pdf(tmp_path / "vetor.pdf", ["vetorial"]))["tipo"] == "vetorial"
+
+
+def test_memo_invalida_quando_o_pdf_muda(tmp_path):
+    caminho = _pdf(tmp_path / "a.pdf", ["vetorial"])
+    assert inspecionar_pdf(caminho) is inspecionar_pdf(caminho)
+    _pdf(tmp_path / "a.pdf", ["scan", "scan", "scan"])
+    assert inspecionar_pdf(caminho)["paginas"] == 3
+
+
+def test_pasta_reinspecionada_quando_um_scan_e_sobrescrito(tmp_path):
+    pasta = tmp_path / "scans"
+    pasta.mkdir()
+    (pasta / "1.png").write_bytes(_png(60, 80))
+    (pasta / "2.png").write_bytes(_png(60, 80))
+    primeira = inspecionar_arquivo(str(pasta))
+    assert primeira["paginas"] == 2 and primeira["tipo"] == "escaneado"
+
+    # Sobrescrever um scan não muda o mtime da pasta
+    mtime_pasta = os.stat(pasta).st_mtime_ns
+    (pasta / "2.png").write_bytes(_png(120, 160, valor=10))
+    os.utime(pasta, ns=(mtime_pasta, mtime_pasta))
+    segunda = inspecionar_arquivo(str(pasta))
+    assert segunda is not primeira
+    assert segunda["fingerprint"] != primeira["fingerprint"]
+
+
+def test_estimativas(tmp_path):
+    caminho = _pdf(tmp_path / "a.pdf", ["scan", "scan"])
+    custo = estimar_custo(inspecionar_pdf(caminho), 72, segundos_por_megapixel=1.0)
+    assert custo["bytes_maior_pagina"] == 595 * 842
+    assert custo["tempo_estimado_s"] == custo["megapixels"] == 2 * 595 * 842 / 1e6
+
+    lote = estimar_lote([caminho, str(tmp_path / "inexistente.pdf")], 72, paginas_em_memoria=4)
+    assert lote["paginas"] == 2 and lote["tipos"]["escaneado"] == 1
+    assert lote["falhas"] == [str(tmp_path / "inexistente.pdf")]
+    assert lote["memoria_pico_bytes"] == 4 * 595 * 842
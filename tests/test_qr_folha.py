@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from modules.core.qr_folha import conteudo_qr, interpretar_qr, ler_qr_folha, matriz_qr
+
+
+def _folha_com_qr(texto, modulo=8, lado=(1754, 1240)):
+    """Página A4 (150 DPI) de pé com o QR no canto superior direito."""
+    pagina = np.full(lado, 255, dtype=np.uint8)
+    qr = np.kron(matriz_qr(texto), np.ones((modulo, modulo), dtype=bool))
+    x = lado[1] - 80 - qr.shape[1]
+    pagina[80:80 + qr.shape[0], x:x + qr.shape[1]][qr] = 0
+    return pagina
+
+
+def test_conteudo_e_interpretacao():
+    texto = conteudo_qr("20231234", layout="26", pagina=3, lote="")
+    assert texto == "GAB1;M=20231234;L=26;P=3"
+    assert interpretar_qr(texto) == {"matricula": "20231234", "layout": "26", "pagina": 3, "lote": None}
+    assert interpretar_qr("https://exemplo") is None
+    assert interpretar_qr(None) is None
+    assert interpretar_qr("GAB1;P=x;Z=1")["pagina"] is None
+
+
+def test_matriz_sem_zona_de_silencio():
+    matriz = matriz_qr("GAB1;M=1")
+    assert matriz.dtype == np.bool_ and matriz.shape[0] == matriz.shape[1]
+    # Versão 1 (21 módulos), com o padrão de posição encostado no canto
+    assert matriz.shape == (21, 21)
+    assert matriz[0, :7].all() and matriz[:7, 0].all() and not matriz[1, 1:6].any()
+
+
+@pytest.mark.parametrize("giros", [0, 1, 2, 3])
+def test_le_qr_e_orientacao(giros):
+    texto = conteudo_qr("20231234", layout="26", pagina=1, lote="L7")
+    pagina = _folha_com_qr(texto)
+    # Página digitalizada girada; rot90 com o giro lido a põe de pé
+    escaneada = np.rot90(pagina, -giros)
+    dados, rotacao = ler_qr_folha(np.ascontiguousarray(escaneada))
+    assert dados == {"matricula": "20231234", "layout": "26", "pagina": 1, "lote": "L7"}
+    assert np.array_equal(np.rot90(escaneada, rotacao), pagina)
+
+
+def test_le_qr_em_pagina_de_alta_resolucao():
+    pagina = _folha_com_qr(conteudo_qr("555"), modulo=20, lado=(3508, 2480))
+    dados, rotacao = ler_qr_folha(pagina)
+    assert dados["matricula"] == "555" and rotacao == 0
+
+
+def test_pagina_sem_qr():
+    assert ler_qr_folha(np.full((1754, 1240), 255, dtype=np.uint8)) == (None, 0)
@@ -0,0 +1,67 @@
+import cv2
+import numpy as np
+import pytest
+
+from modules.core.template_registry import (
+    carregar_template, janelas_verificacao, obter_template_gabarito, obter_templates_gabarito,
+)
+
+
+def _folha(largura=600, altura=400, semente=0):
+    rng = np.random.default_rng(semente)
+    img = np.full((altura, largura), 255, dtype=np.uint8)
+    for _ in range(60):
+        x, y = rng.integers(0, largura - 40), rng.integers(0, altura - 40)
+        cv2.rectangle(img, (int(x), int(y)), (int(x + rng.integers(8, 40)), int(y + rng.integers(8, 40))), 0, 2)
+    return img
+
+
+@pytest.fixture
+def template_png(tmp_path):
+    caminho = tmp_path / "gabarito.png"
+    cv2.imwrite(str(caminho), _folha())
+    return str(caminho)
+
+
+def test_carrega_uma_vez_e_devolve_arrays_somente_leitura(template_png):
+    template = carregar_template(template_png)
+    assert carregar_template(template_png) is template
+    assert template["cinza"].shape == (400, 600)
+    assert template["grosso"] is not None and min(template["grosso"].shape) == 96
+    assert len(template["caracteristicas"]["pontos"]) > 0
+    with pytest.raises(ValueError):
+        template["cinza"][0, 0] = 0
+
+
+def test_template_inexistente(tmp_path):
+    assert carregar_template(str(tmp_path / "nao_existe.png")) is None
+
+
+def test_selecao_por_numero_de_questoes(template_png, tmp_path):
+    config = {"template_path": {"20": template_png, "30": str(tmp_path / "nao_existe.png")}}
+    assert obter_template_gabarito(config, 20)["caminho"] == template_png
+    assert obter_template_gabarito(config, 30) is None
+    assert obter_template_gabarito(config) is None
+    assert list(obter_templates_gabarito(config)) == ["20"]
+
+    config["template_path_atual"] = template_png
+    assert obter_template_gabarito(config, 30)["caminho"] == template_png
+
+
+def test_janelas_espalhadas_e_sem_sobreposicao():
+    reduzido = _folha()
+    janelas = janelas_verificacao(reduzido, lado=48, celulas=4)
+    assert 8 <= len(janelas) <= 16
+    for i, (x, y, w, h) in enumerate(janelas):
+        assert reduzido[y:y + h, x:x + w].std() >= 8
+        for jx, jy, _, _ in janelas[i + 1:]:
+            assert abs(x - jx) >= 48 or abs(y - jy) >= 48
+
+
+def test_janelas_descartam_regioes_ausentes_na_folha():
+    reduzido = _folha()
+    referencia = reduzido.copy()
+    referencia[:, :300] = 255
+    janelas = janelas_verificacao(reduzido, referencia=referencia)
+    assert len(janelas) > 0
+    assert (janelas[:, 0] >= 300 - 2).all()
@@ -0,0 +1,39 @@
+from PIL import Image, ImageDraw
+
+from modules.core import text_extractor
+
+
+def _roi_matricula():
+    imagem = Image.new("L", (200, 40), 255)
+    ImageDraw.Draw(imagem).text((10, 12), "20230001", fill=0)
+    return imagem
+
+
+def test_variantes_lidas_em_um_mosaico(monkeypatch):
+    chamadas = []
+
+    def ocr_mosaico(imagens, lang=None, config=""):
+        chamadas.append(len(imagens))
+        return [{"texto": t} for t in ("2023", "20230001", "", "20230001", "2O23", "1")]
+
+    def image_to_string(*args, **kwargs):
+        raise AssertionError("variantes não deveriam ser lidas uma a uma")
+
+    monkeypatch.setattr(text_extractor, "ocr_mosaico", ocr_mosaico)
+    monkeypatch.setattr(text_extractor, "image_to_string", image_to_string)
+    registros = []
+
+    class Votacao:
+        decidida = False
+
+        def registrar(self, texto, marca, config=None):
+            registros.append((texto, marca))
+
+    matricula = text_extractor.extrair_matricula_avancado(_roi_matricula(), mosaico=True, votacao=Votacao())
+    assert matricula == "20230001"
+    assert chamadas == [6]
+    assert [marca for _, marca in registros] == [
+        "avancado:padrao", "avancado:padrao", "avancado:dilatada", "avancado:erodida", "avancado:clahe",
+        "avancado:bilateral",
+    ]
+    assert registros[4] == ("223", "avancado:clahe")
@@ -0,0 +1,63 @@
+from modules.core.votacao import VotacaoMatricula
+
+
+def test_decide_com_o_quorum_de_fontes_distintas():
+    votacao = VotacaoMatricula(quorum=2)
+    assert not votacao.registrar("Matrícula: 12345", "recorte")
+    # A mesma fonte com outro modo de segmentação conta uma vez só
+    assert not votacao.registrar("12345", "recorte", marca="--psm 6")
+    assert votacao.registrar("1 2 3 4 5", "binaria")
+    assert votacao.melhor() == ("12345", "binaria")
+    # Depois de decidida, novas leituras não mudam a decisão
+    assert votacao.registrar("99999", "outra")
+    assert votacao.melhor() == ("12345", "binaria")
+    assert votacao.leituras == 4
+
+
+def test_leituras_invalidas_nao_votam():
+    votacao = VotacaoMatricula(quorum=2, validar=lambda numero: len(numero) == 5)
+    assert not votacao.registrar("", "a")
+    assert not votacao.registrar("sem dígitos", "b")
+    assert not votacao.registrar("1234", "c")
+    assert not votacao.registrar("1234", "d")
+    assert votacao.melhor() == ("", None)
+
+
+def test_sem_quorum_vence_o_numero_com_mais_fontes():
+    votacao = VotacaoMatricula(quorum=3)
+    votacao.registrar("111", "a")
+    votacao.registrar("222", "b")
+    votacao.registrar("222", "c")
+    assert not votacao.decidida
+    assert votacao.melhor() == ("222", "b")
+
+
+def test_empate_fica_com_o_registrado_primeiro():
+    votacao = VotacaoMatricula(quorum=3)
+    votacao.registrar("222", "a")
+    votacao.registrar("111", "b")
+    votacao.registrar("111", "c")
+    votacao.registrar("222", "d")
+    assert votacao.melhor() == ("222", "a")
+
+
+def test_quorum_de_uma_fonte():
+    votacao = VotacaoMatricula(quorum=0)
+    assert votacao.quorum == 1
+    assert votacao.registrar("42", "a")
+
+
+def test_acertos_por_etapa_e_marca():
+    votacao = VotacaoMatricula(quorum=2)
+    votacao.etapa = "rapida"
+    votacao.registrar("111", "a", marca="--psm 7")
+    votacao.registrar("123", "b", marca="--psm 6")
+    votacao.etapa = "completa"
+    votacao.registrar("123", "c", marca="--psm 7")
+    assert votacao.acertos() == {"rapida": True, "completa": True}
+    assert votacao.acertos("marca") == {"--psm 7": True, "--psm 6": True}
+
+    sem_decisao = VotacaoMatricula()
+    sem_decisao.etapa = "rapida"
+    sem_decisao.registrar("111", "a")
+    assert sem_decisao.acertos() == {"rapida": False}